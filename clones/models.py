@@ -2,6 +2,8 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import reverse
 from django.db import models
 
+from utils.references import cached_reference
+
 
 class Clone(models.Model):
     """An RNAi clone used in the screen."""
@@ -30,8 +32,13 @@ class Clone(models.Model):
         return self.clonetarget_set.all().select_related('gene')
 
     @classmethod
+    @cached_reference('clones.Clone')
     def get_l4440(cls):
-        """Get the L4440 control RNAi clone."""
+        """
+        Get the L4440 control RNAi clone.
+
+        The clone is cached per process (see utils.references).
+        """
         return cls.objects.get(pk='L4440')
 
     @classmethod
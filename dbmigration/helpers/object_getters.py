@@ -2,6 +2,13 @@
 This module contains methods for retrieving objects based on legacy values.
 
 These helpers are meant for use while syncing to the legacy database.
+
+Since they are called for every legacy row, their results are cached (see
+utils.references). Small tables are loaded whole on first use, while
+lookups into large tables keep only the most recently used results
+(legacy rows are mostly ordered by plate, so recent results are the
+likely ones to be needed again). Cached results are cleared whenever the
+tables change, including by the bulk saves in sync_helpers.
 """
 
 from django.contrib.auth.models import User
@@ -12,15 +19,20 @@ from experiments.models import Experiment, ExperimentPlate, ManualScoreCode
 from library.models import LibraryStock, LibraryPlate
 from library.helpers.naming import (generate_library_plate_name,
                                     generate_library_stock_name)
+from utils.references import cached_reference
 from utils.wells import get_three_character_well
 from worms.models import WormStrain
 
+# Number of most recently used results to cache for large tables
+LARGE_TABLE_CACHE_SIZE = 10000
+
 
 def get_missing_object_message(klass, **kwargs):
     return ('ERROR: {} with {} not found in the new database\n'
             .format(klass, str(kwargs)))
 
 
+@cached_reference('clones.Clone', maxsize=LARGE_TABLE_CACHE_SIZE)
 def get_clone(clone_name):
     """Get a clone from its clone name."""
     try:
@@ -31,6 +43,7 @@ def get_clone(clone_name):
             'Clone', id=clone_name))
 
 
+@cached_reference('library.LibraryPlate', maxsize=LARGE_TABLE_CACHE_SIZE)
 def get_library_plate(legacy_plate_name):
     """Get a library plate from a legacy library plate name."""
     legacy_plate_name = generate_library_plate_name(legacy_plate_name)
@@ -43,6 +56,7 @@ def get_library_plate(legacy_plate_name):
             'LibraryPlate', id=legacy_plate_name))
 
 
+@cached_reference('library.LibraryStock', maxsize=LARGE_TABLE_CACHE_SIZE)
 def get_library_stock(legacy_plate_name, well):
     """Get a library well from its legacy plate name and well."""
     library_stock_name = generate_library_stock_name(legacy_plate_name, well)
@@ -59,22 +73,27 @@ def get_worm_strain(mutant, mutantAllele):
     """Get a worm strain from its mutant gene and mutant allele."""
     try:
         if mutant == 'N2':
-            worm_strain = WormStrain.objects.get(id='N2')
-
-        else:
-            if mutantAllele == 'zc310':
-                mutantAllele = 'zu310'
+            return WormStrain.get_n2()
 
-            worm_strain = WormStrain.objects.get(gene=mutant,
-                                                 allele=mutantAllele)
+        if mutantAllele == 'zc310':
+            mutantAllele = 'zu310'
 
-        return worm_strain
+        return _get_worm_strains_by_gene_and_allele()[
+            (mutant, mutantAllele)]
 
-    except ObjectDoesNotExist:
+    except (ObjectDoesNotExist, KeyError):
         raise ObjectDoesNotExist(get_missing_object_message(
             'WormStrain', gene=mutant, allele=mutantAllele))
 
 
+@cached_reference('worms.WormStrain')
+def _get_worm_strains_by_gene_and_allele():
+    return {(worm.gene, worm.allele): worm
+            for worm in WormStrain.objects.all()}
+
+
+@cached_reference('experiments.ExperimentPlate',
+                  maxsize=LARGE_TABLE_CACHE_SIZE)
 def get_experiment_plate(experiment_plate_id):
     """Get an experiment plate from its id."""
     try:
@@ -85,6 +104,7 @@ def get_experiment_plate(experiment_plate_id):
             'ExperimentPlate', id=experiment_plate_id))
 
 
+@cached_reference('experiments.Experiment', maxsize=LARGE_TABLE_CACHE_SIZE)
 def get_experiment(experiment_plate_id, well):
     try:
         return Experiment.objects.get(
@@ -99,9 +119,9 @@ def get_experiment(experiment_plate_id, well):
 def get_score_code(score_code_id):
     """Get a score code from its id."""
     try:
-        return ManualScoreCode.objects.get(id=score_code_id)
+        return ManualScoreCode.get_codes_by_pk()[score_code_id]
 
-    except ObjectDoesNotExist:
+    except KeyError:
         raise ObjectDoesNotExist(get_missing_object_message(
             'ManualScoreCode', id=score_code_id))
 
@@ -114,7 +134,12 @@ def get_user(legacy_username):
         legacy_username = 'giselle'
 
     try:
-        return User.objects.get(username=legacy_username)
-    except ObjectDoesNotExist:
+        return _get_users_by_username()[legacy_username]
+    except KeyError:
         raise ObjectDoesNotExist(get_missing_object_message(
             'User', username=legacy_username))
+
+
+@cached_reference(User)
+def _get_users_by_username():
+    return {user.username: user for user in User.objects.all()}
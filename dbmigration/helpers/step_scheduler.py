@@ -0,0 +1,126 @@
+"""
+This module schedules the steps of the import_legacy_database command.
+
+Steps are done in order, or several at a time in separate processes,
+respecting their dependencies. Finished steps can be recorded in a
+checkpoint file, so that a later run can skip them.
+"""
+
+import json
+import os
+import time
+from multiprocessing import Process
+
+from django.db import connections
+
+# Seconds between checks on running steps, with jobs > 1
+POLL_INTERVAL = 1
+
+
+def do_steps(command, steps, dependencies, do_step, finish_step, jobs=1,
+             poll_interval=POLL_INTERVAL):
+    """
+    Do steps, respecting dependencies.
+
+    dependencies should map each step to the steps it depends on.
+    Dependencies not among steps are assumed to be done already.
+
+    do_step(step) does a step. finish_step(step, seconds) is called
+    (in this process) once a step has finished.
+
+    With jobs == 1, steps are done one at a time, in order, in this
+    process; an exception from do_step is raised as is. With jobs > 1,
+    up to jobs steps are done at a time, each in its own process, and a
+    step is started once all of its dependencies are done. A step that
+    raises an exception fails, and the steps depending (directly or not)
+    on it are skipped.
+
+    Returns the failed steps, not including those skipped.
+    """
+    if jobs > 1:
+        return _do_steps_in_parallel(command, steps, dependencies, do_step,
+                                     finish_step, jobs, poll_interval)
+
+    for step in steps:
+        start = time.time()
+        do_step(step)
+        finish_step(step, time.time() - start)
+
+    return []
+
+
+def _do_steps_in_parallel(command, steps, dependencies, do_step,
+                          finish_step, jobs, poll_interval):
+    pending = list(steps)
+    running = {}
+    done = set()
+    failed = []
+    blocked = []
+
+    # Child processes must not share the parent's connections
+    connections.close_all()
+
+    while pending or running:
+        for step in list(pending):
+            if len(running) >= jobs:
+                break
+
+            step_dependencies = [dependency
+                                 for dependency in dependencies[step]
+                                 if dependency in steps]
+
+            blocking = [dependency for dependency in step_dependencies
+                        if dependency in failed or dependency in blocked]
+
+            if blocking:
+                pending.remove(step)
+                blocked.append(step)
+                command.stderr.write('Skipping step {}, since step {} '
+                                     'was not done\n'.format(
+                                         step, blocking[0]))
+                continue
+
+            if all(dependency in done for dependency in step_dependencies):
+                pending.remove(step)
+                process = Process(target=do_step, args=(step,))
+                process.start()
+                running[step] = (process, time.time())
+                command.stdout.write('Started step {}\n'.format(step))
+
+        time.sleep(poll_interval)
+
+        for step, (process, start) in running.items():
+            if process.is_alive():
+                continue
+
+            process.join()
+            del running[step]
+
+            if process.exitcode == 0:
+                done.add(step)
+                finish_step(step, time.time() - start)
+            else:
+                failed.append(step)
+                command.stderr.write('Step {} failed after {:.0f} s\n'
+                                     .format(step, time.time() - start))
+
+    return sorted(failed)
+
+
+def read_checkpoint(path):
+    """Get the set of steps recorded as done in the checkpoint file."""
+    if not path or not os.path.exists(path):
+        return set()
+
+    with open(path, 'r') as f:
+        return set(json.load(f)['completed'])
+
+
+def write_checkpoint(path, completed):
+    """Record the completed steps in the checkpoint file."""
+    # Write to a temporary file first, so that an interruption never
+    # leaves a partial checkpoint
+    temporary_path = path + '.part'
+    with open(temporary_path, 'w') as f:
+        json.dump({'completed': sorted(completed)}, f)
+    os.rename(temporary_path, path)
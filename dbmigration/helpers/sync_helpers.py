@@ -1,111 +1,416 @@
 """
 This module contains helpers for the sync_legacy_database command.
 
-For example, there are functions to sync sets of rows, and to sync
-individual objects.
+For example, there are functions to sync sets of rows, a class to sync
+the objects made from those rows in bulk, and a class to remember which
+legacy rows have not changed since they were last synced.
 """
 
-from django.core.exceptions import ObjectDoesNotExist
+from __future__ import division
+
+import json
+import os
+import time
+
+from django.core.management.base import CommandError
+from django.db import transaction
+
 from utils.comparison import compare_values_for_equality
+from utils.references import invalidate_references
+from utils.sql import bulk_update, get_queryset_field_dictionary
+
+# Number of legacy rows to fetch at a time
+SYNC_CHUNK_SIZE = 10000
+
+# Number of consecutive partition_column values (e.g. experiment plate
+# ids) per checksummed partition
+PARTITION_SIZE = 1000
 
 
-def sync_rows(command, cursor, legacy_query, sync_row_function, **kwargs):
+def sync_rows(command, cursor, legacy_query, sync_row_function,
+              chunk_size=SYNC_CHUNK_SIZE, partition_column=None,
+              partition_size=PARTITION_SIZE, **kwargs):
     """
     Sync rows resulting from legacy database query to the new database.
 
     Syncs according to sync_row_function(single_legacy_row, **kwargs).
+
+    Rows are fetched chunk_size at a time, with progress printed after
+    each chunk. With a server-side cursor (e.g. MySQLdb's SSCursor), only
+    one chunk of rows is held in memory at once. Note that a server-side
+    cursor's rows must all be fetched before its connection can run
+    another query, so sync_row_function must not use the same
+    connection.
+
+    If command.checksums is a LegacyChecksums, the rows are first
+    checksummed in the legacy database, in partitions of partition_size
+    consecutive partition_column values (or as a single partition if
+    partition_column is None). Only the rows in partitions whose
+    checksums changed since they were last synced are then fetched.
+    This wraps legacy_query in a subquery, so its columns must have
+    distinct names (alias any expressions); if not, CommandError is
+    raised.
     """
-    cursor.execute(legacy_query)
-    legacy_rows = cursor.fetchall()
+    start = time.time()
+    num_rows = 0
     all_match = True
 
-    for legacy_row in legacy_rows:
-        matches = sync_row_function(legacy_row, **kwargs)
-        all_match &= matches
+    query = legacy_query
+    checksums = getattr(command, 'checksums', None)
+
+    if checksums:
+        legacy_checksums = get_legacy_checksums(
+            cursor, legacy_query, partition_column, partition_size)
+        changed = checksums.get_changed_partitions(legacy_query,
+                                                   legacy_checksums)
+
+        if not changed:
+            command.stdout.write(
+                'All {} rows from legacy query:\n\n\t{}\n\n'
+                'were unchanged since last synced (according to '
+                'checksums), so were skipped.\n\n'
+                .format(sum(checksum[0]
+                            for checksum in legacy_checksums.values()),
+                        legacy_query))
+            return
+
+        command.stdout.write('\t{} of {} partitions changed since last '
+                             'synced\n'.format(len(changed),
+                                                len(legacy_checksums)))
+
+        # Recorded once the step saves the checksums, after flushing
+        checksums.update(legacy_query, legacy_checksums)
+
+        if partition_column:
+            query = _get_partition_query(legacy_query, partition_column,
+                                         partition_size, changed)
+
+    cursor.execute(query)
+
+    while True:
+        legacy_rows = cursor.fetchmany(chunk_size)
+        if not legacy_rows:
+            break
+
+        for legacy_row in legacy_rows:
+            matches = sync_row_function(legacy_row, **kwargs)
+            all_match &= matches
+
+        num_rows += len(legacy_rows)
+
+        if len(legacy_rows) == chunk_size:
+            seconds = time.time() - start
+            command.stdout.write('\t{} rows synced in {:.0f} s '
+                                 '({:.0f} rows/s)\n'
+                                 .format(num_rows, seconds,
+                                         num_rows / max(seconds, .001)))
 
     if all_match:
         command.stdout.write(
-            'All objects from legacy query:\n\n\t{}\n\n'
+            'All {} rows from legacy query:\n\n\t{}\n\n'
             'were already represented in new database.\n\n'
-            .format(legacy_query))
+            .format(num_rows, legacy_query))
 
     else:
         command.stdout.write(
-            'Some objects from legacy query:\n\n\t{}\n\n'
+            'Some of {} rows from legacy query:\n\n\t{}\n\n'
             'were just added or updated in new database '
             '(individual changes and warnings printed to stderr.)\n\n'
-            .format(legacy_query))
+            .format(num_rows, legacy_query))
 
 
-def update_or_save_object(command, new_object, recorded_objects,
-                          fields_to_compare, alternate_pk=False):
+class BulkSyncer(object):
     """
-    Update the database to represent new_object.
+    Syncs many new objects to one table of the new database, in bulk.
 
-    If new_object is not present in the database, add it (and print
-    warning to syserr).
+    Instead of querying the new database once per new object, the
+    recorded objects' key_fields and fields_to_compare are read once, in
+    one query, when the first new object is synced. Each new object passed to
+    sync() is then compared in memory, with any addition or change
+    printed to stderr as it is found.
 
-    If new_object is already present in the database (according to
-    alternate_pk if specified, pk otherwise), compare the provided
-    fields_to_compare. If any of these fields do not match, update them
-    (and print updates to syserr).
+    The additions and changes are saved batch_size at a time (with
+    bulk_create and utils.sql.bulk_update, in a transaction), and when
+    flush() is called. Call flush() once all objects have been synced,
+    and before anything needs to read them from the database.
 
-    Returns True if new_object was already present and matched
-    on all provided fields. Returns False otherwise.
+    If the objects reference objects synced by another BulkSyncer, pass
+    that as depends_on, so that it is always flushed first.
     """
-    try:
-        if alternate_pk:
-            recorded_object = recorded_objects.get(**alternate_pk)
-        else:
-            recorded_object = recorded_objects.get(pk=new_object.pk)
 
-        if fields_to_compare:
-            return compare_fields(command, recorded_object, new_object,
-                                  fields_to_compare, update=True)
-        else:
+    def __init__(self, command, recorded_objects, fields_to_compare,
+                 key_fields=('pk',), depends_on=None, batch_size=1000):
+        self.command = command
+        self.model = recorded_objects.model
+        self.fields = tuple(fields_to_compare or ())
+        self.key_fields = tuple(key_fields)
+        self.depends_on = depends_on
+        self.batch_size = batch_size
+
+        self.attnames = {name: self._get_attname(name)
+                         for name in self.fields + self.key_fields}
+
+        # Read on the first sync, so that nothing is read if every
+        # legacy row is skipped (see sync_rows)
+        self.recorded_objects = recorded_objects
+        self.recorded = None
+
+        # Keys added without a known pk (e.g. with an auto-incrementing
+        # pk, which bulk_create does not set), to read again if synced
+        # again after being flushed
+        self.unread = set()
+
+        # Pending saves, by key
+        self.to_create = {}
+        self.to_update = {}
+
+        # Number of additions and changes saved so far
+        self.num_saved = 0
+
+    def _get_attname(self, name):
+        if name == 'pk':
+            return name
+        return self.model._meta.get_field(name).attname
+
+    def _get_key(self, new_object):
+        key = tuple(getattr(new_object, self.attnames[name])
+                    for name in self.key_fields)
+        if len(key) == 1:
+            return key[0]
+        return key
+
+    def sync(self, new_object):
+        """
+        Sync new_object, adding it or updating it if needed.
+
+        Returns True if new_object was already present (according to
+        key_fields) and matched on all fields_to_compare. Returns False
+        otherwise.
+        """
+        if self.recorded is None:
+            self.recorded = self._read(self.recorded_objects)
+
+        key = self._get_key(new_object)
+
+        if key in self.unread:
+            self.unread.remove(key)
+            self.recorded.update(self._read(self.recorded_objects.filter(
+                **self._get_key_filters(new_object))))
+
+        recorded_values = self.recorded.get(key)
+
+        if recorded_values is None:
+            recorded_values = {
+                name: getattr(new_object, self.attnames[name])
+                for name in self.fields}
+            recorded_values['pk'] = new_object.pk
+            self.recorded[key] = recorded_values
+            self.to_create[key] = new_object
+            self.command.stderr.write('Added new record {} to the database\n'
+                                      .format(str(new_object)))
+            self._save_if_full()
+            return False
+
+        differences = []
+
+        for name in self.fields:
+            old_value = recorded_values[name]
+            new_value = getattr(new_object, self.attnames[name])
+
+            if not compare_values_for_equality(old_value, new_value):
+                differences.append('{} previously recorded as {}, now {}'
+                                   .format(name, str(old_value),
+                                           str(new_value)))
+                recorded_values[name] = new_value
+
+        if not differences:
             return True
 
-    except ObjectDoesNotExist:
-        new_object.save()
-        command.stderr.write('Added new record {} to the database\n'
-                             .format(str(new_object)))
+        self.command.stderr.write(
+            'WARNING: Record {} had these changes: {}\n'
+            '\tThe database was updated to reflect the changes\n\n'
+            .format(str(new_object), str(differences)))
+
+        # Changes to an object not yet added go into the object itself
+        if key in self.to_create:
+            instance = self.to_create[key]
+        else:
+            instance = self.model(pk=recorded_values['pk'])
+            self.to_update[key] = instance
+
+        for name in self.fields:
+            setattr(instance, self.attnames[name], recorded_values[name])
+
+        self._save_if_full()
         return False
 
+    def _read(self, recorded_objects):
+        return get_queryset_field_dictionary(
+            recorded_objects, self.key_fields + ('pk',) + self.fields,
+            key_length=len(self.key_fields))
+
+    def _get_key_filters(self, new_object):
+        return {self.attnames[name]: getattr(new_object,
+                                             self.attnames[name])
+                for name in self.key_fields}
+
+    def _save_if_full(self):
+        if len(self.to_create) + len(self.to_update) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Save all pending additions and changes."""
+        if self.depends_on:
+            self.depends_on.flush()
+
+        if not self.to_create and not self.to_update:
+            return
+
+        with transaction.atomic():
+            self.model.objects.bulk_create(self.to_create.values(),
+                                           batch_size=self.batch_size)
+            bulk_update(self.to_update.values(), self.fields,
+                        batch_size=self.batch_size)
+
+        for key, new_object in self.to_create.iteritems():
+            if new_object.pk is None:
+                del self.recorded[key]
+                self.unread.add(key)
+
+        self.num_saved += len(self.to_create) + len(self.to_update)
+        self.to_create = {}
+        self.to_update = {}
+
+        # Bulk saves bypass the signals that keep references current
+        invalidate_references(self.model)
 
-def compare_fields(command, old_object, new_object, fields, update=False):
+
+class LegacyChecksums(object):
     """
-    Compare two objects on the provided fields.
+    Checksums of legacy query partitions, as of when they were last synced.
 
-    Any differences are printed to stderr.
+    The checksums are read from, and saved to, a JSON file at path,
+    keyed by legacy query and then by partition (see
+    get_legacy_checksums).
 
-    If 'update' is True, old_object is updated to match
-    new_object on these fields.
+    Since only the legacy side is checksummed, a partition is only
+    re-synced if its legacy rows change. If the new database is changed
+    by other means (or the sync code itself changes), delete the file to
+    re-sync everything.
     """
-    differences = []
-    for field in fields:
-        if not compare_values_for_equality(getattr(old_object, field),
-                                           getattr(new_object, field)):
-            differences.append('{} previously recorded as {}, '
-                               'now {}'
-                               .format(field,
-                                       str(getattr(old_object, field)),
-                                       str(getattr(new_object, field))))
-            if update:
-                setattr(old_object, field, getattr(new_object, field))
-                old_object.save()
-
-    if differences:
-        command.stderr.write(
-            'WARNING: Record {} had these changes: {}\n'
-            .format(str(new_object), str([d for d in differences])))
 
-        if update:
-            command.stderr.write(
-                '\tThe database was updated to reflect the changes\n\n')
+    def __init__(self, path):
+        self.path = path
+
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.checksums = json.load(f)
         else:
-            command.stderr.write(
-                '\tThe database was NOT updated to reflect the changes\n\n')
-        return False
+            self.checksums = {}
+
+    def get_changed_partitions(self, legacy_query, legacy_checksums):
+        """
+        Get the partitions whose checksums differ from those recorded.
+
+        legacy_checksums should be a dictionary of the current checksums,
+        as returned by get_legacy_checksums.
+
+        Returns a sorted list of partitions.
+        """
+        recorded = self.checksums.get(legacy_query, {})
+
+        return sorted(partition for partition, checksum
+                      in legacy_checksums.iteritems()
+                      if recorded.get(str(partition)) != list(checksum))
+
+    def update(self, legacy_query, legacy_checksums):
+        """Record legacy_checksums for legacy_query, until save()."""
+        self.checksums[legacy_query] = {
+            str(partition): list(checksum)
+            for partition, checksum in legacy_checksums.iteritems()}
 
+    def save(self):
+        """Save the recorded checksums."""
+        # Write to a temporary file first, so that an interruption never
+        # leaves partial checksums
+        temporary_path = self.path + '.part'
+        with open(temporary_path, 'w') as f:
+            json.dump(self.checksums, f)
+        os.rename(temporary_path, self.path)
+
+
+def get_legacy_checksums(cursor, legacy_query, partition_column=None,
+                         partition_size=PARTITION_SIZE):
+    """
+    Checksum the rows resulting from legacy_query, in the legacy database.
+
+    The rows are partitioned by partition_column, partition_size
+    consecutive values per partition, or are a single partition (0) if
+    partition_column is None.
+
+    The checksums are computed by MySQL, so that the rows themselves
+    are not transferred. Returns a dictionary of partition to 3-tuple of
+    the row count, the XOR of the 64-bit row hashes, and their sum
+    modulo 2^64. The sum catches changes that the XOR alone would miss,
+    since a pair of identical rows cancels out of the XOR (e.g. a
+    duplicated row changed to duplicate another row).
+
+    Raises CommandError if legacy_query's columns do not have distinct
+    names, since it is checksummed as a subquery.
+    """
+    # Get the query's column names, to hash each row's values
+    cursor.execute('SELECT * FROM ({}) AS legacy LIMIT 0'
+                   .format(legacy_query))
+    cursor.fetchall()
+    names = [description[0] for description in cursor.description]
+
+    duplicates = sorted(set(name for name in names if names.count(name) > 1))
+    if duplicates:
+        raise CommandError('Legacy query has duplicate column names {}, '
+                           'so cannot be checksummed (alias them): {}'
+                           .format(duplicates, legacy_query))
+
+    columns = [_quote_column(name) for name in names]
+
+    # QUOTE distinguishes NULL from 'NULL', and separates the values
+    row_hash = ('CAST(CONV(LEFT(MD5(CONCAT_WS(",", {})), 16), 16, 10) '
+                'AS UNSIGNED)'.format(
+                    ', '.join('QUOTE({})'.format(column)
+                              for column in columns)))
+
+    # SUM of BIGINT UNSIGNED is a DECIMAL, so cannot overflow
+    aggregates = 'COUNT(*), BIT_XOR({0}), MOD(SUM({0}), {1})'.format(
+        row_hash, 2 ** 64)
+
+    if partition_column:
+        partition = _get_partition_expression(partition_column,
+                                              partition_size)
+        cursor.execute('SELECT {0}, {1} FROM ({2}) AS legacy GROUP BY {0}'
+                       .format(partition, aggregates, legacy_query))
     else:
-        return True
+        cursor.execute('SELECT 0, {} FROM ({}) AS legacy'
+                       .format(aggregates, legacy_query))
+
+    return {int(row[0]): (int(row[1]), int(row[2]), int(row[3]))
+            for row in cursor.fetchall()}
+
+
+def _get_partition_query(legacy_query, partition_column, partition_size,
+                         partitions):
+    """Limit legacy_query to the rows in partitions."""
+    return ('SELECT * FROM ({}) AS legacy WHERE {} IN ({}) ORDER BY {}'
+            .format(legacy_query,
+                    _get_partition_expression(partition_column,
+                                              partition_size),
+                    ', '.join(str(int(partition))
+                              for partition in partitions),
+                    _quote_column(partition_column)))
+
+
+def _get_partition_expression(partition_column, partition_size):
+    return 'FLOOR({} / {})'.format(_quote_column(partition_column),
+                                   int(partition_size))
+
+
+def _quote_column(column):
+    return 'legacy.`{}`'.format(column)
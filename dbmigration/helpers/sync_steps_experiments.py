@@ -10,19 +10,24 @@ from django.core.management.base import CommandError
 
 
 from dbmigration.helpers.object_getters import (
-    get_experiment, get_experiment_plate,
-    get_worm_strain, get_library_stock, get_score_code, get_user)
-from dbmigration.helpers.sync_helpers import (
-    sync_rows, update_or_save_object)
+    get_experiment, get_worm_strain, get_library_stock, get_score_code,
+    get_user)
+from dbmigration.helpers.sync_helpers import BulkSyncer, sync_rows
 
 from experiments.helpers.naming import generate_experiment_id
-from experiments.models import (Experiment, ExperimentPlate, DevstarScore,
-                                ManualScoreCode, ManualScore)
+from experiments.helpers.secondary_scores import clear_secondary_scores
+from experiments.models import (Experiment, ExperimentPlate,
+                                ControlExperiment, DevstarScore,
+                                ManualScoreCode, ManualScore,
+                                ManualScoreSummary)
 from utils.comparison import compare_floats_for_equality
 from utils.plates import get_well_list
 from utils.time_conversion import get_timestamp, get_timestamp_from_ymd
 from utils.well_tile_conversion import tile_to_well
 
+# ManualScores have no legacy id, so are identified by these fields
+MANUAL_SCORE_KEY_FIELDS = ('experiment', 'score_code', 'scorer', 'timestamp')
+
 
 def update_Experiment_tables(command, cursor):
     """
@@ -41,19 +46,24 @@ def update_Experiment_tables(command, cursor):
     Also, experiments of Julie's (which were done with a line of spn-4 worms
     later deemed untrustworthy) are excluded.
     """
-    recorded_plates = ExperimentPlate.objects.all()
-    recorded_wells = Experiment.objects.all()
-
     plate_fields_to_compare = ('screen_stage', 'temperature', 'date',
                                'comment')
 
     well_fields_to_compare = ('plate', 'well', 'worm_strain',
                               'library_stock', 'is_junk')
 
+    plate_syncer = BulkSyncer(command, ExperimentPlate.objects.all(),
+                              plate_fields_to_compare)
+
+    well_syncer = BulkSyncer(command, Experiment.objects.all(),
+                             well_fields_to_compare,
+                             depends_on=plate_syncer)
+
     legacy_query = ('SELECT expID, mutant, mutantAllele, RNAiPlateID, '
                     'CAST(SUBSTRING_INDEX(temperature, "C", 1) '
-                    'AS DECIMAL(3,1)), '
-                    'CAST(recordDate AS DATE), ABS(isJunk), comment '
+                    'AS DECIMAL(3,1)) AS temperature, '
+                    'CAST(recordDate AS DATE) AS recordDate, '
+                    'ABS(isJunk) AS isJunk, comment '
                     'FROM RawData '
                     'WHERE (expID < 40000 OR expID >= 50000) '
                     'AND RNAiPlateID NOT LIKE "Julie%" '
@@ -82,27 +92,30 @@ def update_Experiment_tables(command, cursor):
             date=date,
             comment=comment)
 
-        all_match &= update_or_save_object(
-            command, new_plate, recorded_plates, plate_fields_to_compare)
-
-        experiment_plate = get_experiment_plate(experiment_plate_id)
+        all_match &= plate_syncer.sync(new_plate)
 
         for well in get_well_list():
             new_well = Experiment(
                 id=generate_experiment_id(experiment_plate_id, well),
-                plate=experiment_plate, well=well,
+                plate_id=experiment_plate_id, well=well,
                 worm_strain=worm_strain,
                 library_stock=get_library_stock(
                     legacy_library_plate_name, well),
                 is_junk=is_junk)
 
-            all_match &= update_or_save_object(
-                command, new_well, recorded_wells,
-                well_fields_to_compare)
+            all_match &= well_syncer.sync(new_well)
 
         return all_match
 
-    sync_rows(command, cursor, legacy_query, sync_experiment_row)
+    sync_rows(command, cursor, legacy_query, sync_experiment_row,
+              partition_column='expID')
+    well_syncer.flush()
+
+    # Bulk saves bypass the signals that keep the control index and the
+    # cached secondary scores current
+    if plate_syncer.num_saved or well_syncer.num_saved:
+        ControlExperiment.rebuild()
+        clear_secondary_scores()
 
 
 def update_DevstarScore_table(command, cursor):
@@ -126,8 +139,6 @@ def update_DevstarScore_table(command, cursor):
           adult=0 we DO now calculate survival and lethality
         - machineCall becomes a Boolean
     """
-    recorded_scores = DevstarScore.objects.all()
-
     fields_to_compare = ('area_adult', 'area_larva', 'area_embryo',
                          'count_adult', 'count_larva', 'is_bacteria_present',
                          'count_embryo', 'larva_per_adult',
@@ -135,6 +146,9 @@ def update_DevstarScore_table(command, cursor):
                          'selected_for_scoring', 'gi_score_larva_per_adult',
                          'gi_score_survival')
 
+    syncer = BulkSyncer(command, DevstarScore.objects.all(),
+                        fields_to_compare, key_fields=('experiment',))
+
     legacy_query = ('SELECT expID, 96well, '
                     'mutantAllele, targetRNAiClone, RNAiPlateID, '
                     'areaWorm, areaLarvae, areaEmbryo, '
@@ -243,11 +257,11 @@ def update_DevstarScore_table(command, cursor):
                 'DevstarScore for {}:{} had these errors: {}'
                 .format(legacy_row[0], legacy_row[1], errors))
 
-        return update_or_save_object(
-            command, new_score, recorded_scores, fields_to_compare,
-            alternate_pk={'experiment': new_score.experiment})
+        return syncer.sync(new_score)
 
-    sync_rows(command, cursor, legacy_query, sync_score_row)
+    sync_rows(command, cursor, legacy_query, sync_score_row,
+              partition_column='expID')
+    syncer.flush()
 
 
 def update_ManualScoreCode_table(command, cursor):
@@ -270,8 +284,8 @@ def update_ManualScoreCode_table(command, cursor):
     - Migrate these antiquated codes, but do not show in interface:
         -5: IA Error
     """
-    recorded_score_codes = ManualScoreCode.objects.all()
-    fields_to_compare = ('legacy_description',)
+    syncer = BulkSyncer(command, ManualScoreCode.objects.all(),
+                        ('legacy_description',))
 
     legacy_query = ('SELECT code, definition FROM ManualScoreCode '
                     'WHERE code != -8 AND code != -1 AND code != 4 '
@@ -282,10 +296,10 @@ def update_ManualScoreCode_table(command, cursor):
             id=legacy_row[0],
             legacy_description=legacy_row[1].decode('utf8'))
 
-        return update_or_save_object(
-            command, new_score_code, recorded_score_codes, fields_to_compare)
+        return syncer.sync(new_score_code)
 
     sync_rows(command, cursor, legacy_query, sync_score_code_row)
+    syncer.flush()
 
 
 def update_ManualScore_table_primary(command, cursor):
@@ -326,8 +340,8 @@ def update_ManualScore_table_primary(command, cursor):
         - for sherly and patricia's ENH scores, ensure that any medium or
           strong enhancers were caught by official scorers
     """
-    recorded_scores = ManualScore.objects.all()
-    fields_to_compare = None
+    syncer = BulkSyncer(command, ManualScore.objects.all(), None,
+                        key_fields=MANUAL_SCORE_KEY_FIELDS)
 
     legacy_query = ('SELECT ManualScore.expID, ImgName, score, scoreBy, '
                     'scoreYMD, ScoreYear, ScoreMonth, ScoreDate, '
@@ -389,19 +403,22 @@ def update_ManualScore_table_primary(command, cursor):
             scorer=scorer,
             timestamp=timestamp)
 
-        return update_or_save_object(
-            command, new_score, recorded_scores, fields_to_compare,
-            alternate_pk={'experiment': new_score.experiment,
-                          'score_code': new_score.score_code,
-                          'scorer': new_score.scorer,
-                          'timestamp': new_score.timestamp})
+        return syncer.sync(new_score)
 
-    sync_rows(command, cursor, legacy_query, sync_score_row)
+    sync_rows(command, cursor, legacy_query, sync_score_row,
+              partition_column='expID')
+    syncer.flush()
+
+    # Bulk saves bypass ManualScore.save_new_scores and the signals,
+    # which keep the summaries and cached secondary scores current
+    if syncer.num_saved:
+        ManualScoreSummary.rebuild()
+        clear_secondary_scores()
 
 
 def update_ManualScore_table_secondary(command, cursor):
-    recorded_scores = ManualScore.objects.all()
-    fields_to_compare = None
+    syncer = BulkSyncer(command, ManualScore.objects.all(), None,
+                        key_fields=MANUAL_SCORE_KEY_FIELDS)
     legacy_query = ('SELECT expID, ImgName, score, '
                     'scoreBy, scoreYMD, ScoreTime '
                     'FROM ScoreResultsManual '
@@ -427,11 +444,14 @@ def update_ManualScore_table_secondary(command, cursor):
             scorer=scorer,
             timestamp=timestamp)
 
-        return update_or_save_object(
-            command, new_score, recorded_scores, fields_to_compare,
-            alternate_pk={'experiment': new_score.experiment,
-                          'score_code': new_score.score_code,
-                          'scorer': new_score.scorer,
-                          'timestamp': new_score.timestamp})
+        return syncer.sync(new_score)
+
+    sync_rows(command, cursor, legacy_query, sync_score_row,
+              partition_column='expID')
+    syncer.flush()
 
-    sync_rows(command, cursor, legacy_query, sync_score_row)
+    # Bulk saves bypass ManualScore.save_new_scores and the signals,
+    # which keep the summaries and cached secondary scores current
+    if syncer.num_saved:
+        ManualScoreSummary.rebuild()
+        clear_secondary_scores()
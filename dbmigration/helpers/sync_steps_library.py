@@ -14,8 +14,7 @@ from clones.helpers.naming import generate_vidal_clone_name
 from clones.models import Clone
 from dbmigration.helpers.object_getters import (
     get_clone, get_library_stock, get_library_plate)
-from dbmigration.helpers.sync_helpers import (
-    sync_rows, update_or_save_object)
+from dbmigration.helpers.sync_helpers import BulkSyncer, sync_rows
 from library.helpers.naming import (
     generate_ahringer_384_plate_name, generate_library_plate_name,
     generate_library_stock_name)
@@ -36,16 +35,14 @@ def update_Clone_table(command, cursor):
     (note that we are no longer using the 'mv_X'-style Vidal clone names,
     and our PK for Vidal clones will now be in 'GHR-X@X' style).
     """
-    recorded_clones = Clone.objects.all()
-    fields_to_compare = None
+    syncer = BulkSyncer(command, Clone.objects.all(), None)
 
     legacy_query = ('SELECT DISTINCT clone FROM RNAiPlate '
                     'WHERE clone LIKE "sjj%" OR clone = "L4440"')
 
     def sync_clone_row(legacy_row):
         new_clone = Clone(id=legacy_row[0])
-        return update_or_save_object(command, new_clone, recorded_clones,
-                                     fields_to_compare)
+        return syncer.sync(new_clone)
 
     legacy_query_vidal = ('SELECT DISTINCT 384PlateID, 384Well FROM RNAiPlate '
                           'WHERE clone LIKE "mv%"')
@@ -54,11 +51,11 @@ def update_Clone_table(command, cursor):
         vidal_clone_name = generate_vidal_clone_name(legacy_row[0],
                                                      legacy_row[1])
         new_clone = Clone(id=vidal_clone_name)
-        return update_or_save_object(command, new_clone, recorded_clones,
-                                     fields_to_compare)
+        return syncer.sync(new_clone)
 
     sync_rows(command, cursor, legacy_query, sync_clone_row)
     sync_rows(command, cursor, legacy_query_vidal, sync_clone_row_vidal)
+    syncer.flush()
 
 
 def update_LibraryPlate_table(command, cursor):
@@ -84,8 +81,8 @@ def update_LibraryPlate_table(command, cursor):
     separating the primary and secondary screens into two tables, we have
     the same L4440 plate listed in both tables in the legacy database).
     """
-    recorded_plates = LibraryPlate.objects.all()
-    fields_to_compare = ('screen_stage', 'number_of_wells')
+    syncer = BulkSyncer(command, LibraryPlate.objects.all(),
+                        ('screen_stage', 'number_of_wells'))
 
     legacy_query_384_plates = ('SELECT DISTINCT chromosome, 384PlateID '
                                'FROM RNAiPlate '
@@ -123,8 +120,7 @@ def update_LibraryPlate_table(command, cursor):
         new_plate = LibraryPlate(id=plate_name, screen_stage=screen_stage,
                                  number_of_wells=number_of_wells)
 
-        return update_or_save_object(command, new_plate, recorded_plates,
-                                     fields_to_compare)
+        return syncer.sync(new_plate)
 
     # Sync the 384-well Ahringer plates from which our 96-well Ahringer plates
     # were arrayed
@@ -155,6 +151,8 @@ def update_LibraryPlate_table(command, cursor):
     sync_rows(command, cursor, legacy_query_secondary_plates,
               sync_library_plate_row, screen_stage=2)
 
+    syncer.flush()
+
 
 def update_LibraryStock_table(command, cursor):
     """
@@ -164,9 +162,8 @@ def update_LibraryStock_table(command, cursor):
     primarily according to legacy tables RNAiPlate and CherryPickRNAiPlate.
     Detailed comments inline.
     """
-    recorded_wells = LibraryStock.objects.all()
-    fields_to_compare = ('plate', 'well', 'parent_stock',
-                         'intended_clone')
+    syncer = BulkSyncer(command, LibraryStock.objects.all(),
+                        ('plate', 'well', 'parent_stock', 'intended_clone'))
 
     # 'Source' plates are Ahringer 384 plates and original Orfeome
     # plates (e.g. GHR-10001). Plate names are captured as they
@@ -199,8 +196,7 @@ def update_LibraryStock_table(command, cursor):
             plate=get_library_plate(plate_name), well=well_proper,
             parent_stock=None, intended_clone=get_clone(clone_name))
 
-        return update_or_save_object(command, new_well, recorded_wells,
-                                     fields_to_compare)
+        return syncer.sync(new_well)
 
     # Primary well layout captured in RNAiPlate table (fields RNAiPlateID
     # and 96well). Clone is determined the same way as described in
@@ -247,8 +243,7 @@ def update_LibraryStock_table(command, cursor):
             parent_stock=parent_stock,
             intended_clone=intended_clone)
 
-        return update_or_save_object(command, new_well, recorded_wells,
-                                     fields_to_compare)
+        return syncer.sync(new_well)
 
     # L4440 wells from secondary screen are treated specially (since
     # the complicated join used to resolve parents below complicates things
@@ -266,8 +261,7 @@ def update_LibraryStock_table(command, cursor):
             plate=get_library_plate(plate_name), well=well,
             parent_stock=None, intended_clone=get_clone('L4440'))
 
-        return update_or_save_object(command, new_well, recorded_wells,
-                                     fields_to_compare)
+        return syncer.sync(new_well)
 
     # Secondary well layout is captured in CherryPickRNAiPlate table (fields
     # RNAiPlate and 96well). However, there are no columns in this table
@@ -370,8 +364,7 @@ def update_LibraryStock_table(command, cursor):
             parent_stock=parent_stock,
             intended_clone=intended_clone)
 
-        return update_or_save_object(command, new_well, recorded_wells,
-                                     fields_to_compare)
+        return syncer.sync(new_well)
 
     legacy_query_eliana = (
         'SELECT RNAiPlateID, 96well, OldPlateID, OldWellPosition '
@@ -399,12 +392,15 @@ def update_LibraryStock_table(command, cursor):
             parent_stock=parent_stock,
             intended_clone=intended_clone)
 
-        return update_or_save_object(command, new_well, recorded_wells,
-                                     fields_to_compare)
-
-    sync_rows(command, cursor, legacy_query_source, sync_source_row)
-    sync_rows(command, cursor, legacy_query_primary, sync_primary_row)
-    sync_rows(command, cursor, legacy_query_eliana, sync_eliana_row)
-    sync_rows(command, cursor, legacy_query_secondary_L4440,
-              sync_secondary_L4440_row)
-    sync_rows(command, cursor, legacy_query_secondary, sync_secondary_row)
+        return syncer.sync(new_well)
+
+    # Flush after each query, since later queries look up the stocks
+    # synced by earlier ones as parents
+    for legacy_query, sync_row_function in (
+            (legacy_query_source, sync_source_row),
+            (legacy_query_primary, sync_primary_row),
+            (legacy_query_eliana, sync_eliana_row),
+            (legacy_query_secondary_L4440, sync_secondary_L4440_row),
+            (legacy_query_secondary, sync_secondary_row)):
+        sync_rows(command, cursor, legacy_query, sync_row_function)
+        syncer.flush()
@@ -1,7 +1,13 @@
+import os
+
 import MySQLdb
+import MySQLdb.cursors
 
 from django.core.management.base import BaseCommand, CommandError
 
+from dbmigration.helpers.step_scheduler import (
+    do_steps, read_checkpoint, write_checkpoint)
+from dbmigration.helpers.sync_helpers import LegacyChecksums
 from dbmigration.helpers.sync_steps_library import (
     update_Clone_table, update_LibraryPlate_table, update_LibraryStock_table)
 
@@ -11,6 +17,7 @@ from dbmigration.helpers.sync_steps_experiments import (
     update_ManualScore_table_secondary)
 
 from eegi.localsettings import LEGACY_DATABASE, LEGACY_DATABASE_2
+from utils.references import get_reference_stats
 from utils.scripting import require_db_write_acknowledgement
 
 STEPS = (
@@ -26,17 +33,39 @@ STEPS = (
 
 LAST_STEP = len(STEPS) - 1
 
+# The steps each step depends on. Step 3 looks up library stocks, so
+# depends on step 2 (and thereby on step 1). Steps 6 and 7 both add
+# ManualScores, each comparing against the ManualScores recorded when it
+# starts, so are not done at the same time
+DEPENDENCIES = {
+    0: (),
+    1: (),
+    2: (0, 1),
+    3: (2,),
+    4: (3,),
+    5: (),
+    6: (3, 5),
+    7: (3, 5, 6),
+}
+
+# The step that syncs from LEGACY_DATABASE_2, rather than LEGACY_DATABASE
+LEGACY_DATABASE_2_STEP = 7
+
+# Seconds the legacy database server may wait on this process to fetch
+# more rows
+NET_WRITE_TIMEOUT = 60 * 60
+
 ARG_HELP = '''
     Step to {} with, inclusive. If not provided, defaults to {}.
     The steps are (dependencies in parentheses):
         [0: Clone;
         1: LibraryPlate;
         2: LibraryStock (0,1);
-        3: ExperimentWell&Experiment (WormStrain,1);
+        3: ExperimentWell&Experiment (WormStrain,2);
         4: DevstarScore (3);
         5: ManualScoreCode;
         6: ManualScore primary (3,5);
-        7: ManualScore secondary (3,5);]
+        7: ManualScore secondary (3,5,6);]
 '''
 
 
@@ -59,11 +88,11 @@ class Command(BaseCommand):
         0: Clone;
         1: LibraryPlate;
         2: LibraryStock (0,1);
-        3: ExperimentPlate&Experiment (WormStrain,1);
+        3: ExperimentPlate&Experiment (WormStrain,2);
         4: DevstarScore (3);
         5: ManualScoreCode;
         6: ManualScore primary (3,5);
-        7: ManualScore secondary (3,5);
+        7: ManualScore secondary (3,5,6);
 
     Requirements:
 
@@ -77,9 +106,37 @@ class Command(BaseCommand):
         Step 7 requires that LEGACY_DATABASE_2 be defined in localsettings,
         to connect to the GWGI2 database.
 
+    Scheduling:
+
+        By default, the steps are done one at a time, in order. With
+        --jobs, steps whose dependencies are done (or outside the range
+        of steps being done) run at the same time, each in its own
+        process with its own database connections.
+
+        With --checkpoint, each step that finishes is recorded in the
+        checkpoint file, and steps already recorded there are skipped.
+        So after a failure, running again with the same checkpoint file
+        resumes with the steps not yet done. Delete the file to start
+        over.
+
+    Skipping unchanged rows:
+
+        With --checksum-dir, each legacy query's rows are checksummed in
+        the legacy database (the experiment tables per range of
+        experiment plate ids; the smaller tables as a whole), and only
+        the rows whose checksums changed since they were last synced
+        are fetched and compared (see sync_helpers.sync_rows). Each
+        step's checksums are saved in the directory once the step
+        finishes.
+
+        Since only the legacy side is checksummed, clear the directory
+        after changing the new database by other means (e.g.
+        add_empty_LibraryStocks) or changing the sync code.
+
     Output:
 
-        Stdout reports whether or not a particular step had changes.
+        Stdout reports whether or not a particular step had changes,
+        and how often each step's object lookups were served from cache.
 
         Stderr reports every change (such as an added row), so can get
         quite long; consider redirecting with 2> stderr.out.
@@ -93,6 +150,23 @@ class Command(BaseCommand):
         parser.add_argument('end', type=int, nargs='?', default=LAST_STEP,
                             help=(ARG_HELP.format('end', LAST_STEP)))
 
+        parser.add_argument('--jobs',
+                            dest='jobs',
+                            type=int,
+                            default=1,
+                            help='Number of steps to run at the same time')
+
+        parser.add_argument('--checkpoint',
+                            dest='checkpoint',
+                            help='File in which to record finished steps, '
+                                 'to skip them when run again')
+
+        parser.add_argument('--checksum-dir',
+                            dest='checksum_dir',
+                            help='Directory in which to record checksums '
+                                 'of the legacy rows synced, to skip '
+                                 'unchanged rows when run again')
+
     def handle(self, **options):
         start = options['start']
         end = options['end']
@@ -104,31 +178,92 @@ class Command(BaseCommand):
             raise CommandError('Start and end must be in range 0-{}'
                                .format(LAST_STEP))
 
-        if end == LAST_STEP:
-            do_last_step = True
-            end = LAST_STEP - 1
+        require_db_write_acknowledgement()
+
+        self.checkpoint = options['checkpoint']
+        self.completed = read_checkpoint(self.checkpoint)
+
+        self.checksum_dir = options['checksum_dir']
+        if self.checksum_dir and not os.path.isdir(self.checksum_dir):
+            os.makedirs(self.checksum_dir)
+
+        steps = [step for step in range(start, end + 1)
+                 if step not in self.completed]
+        skipped = sorted(self.completed.intersection(range(start, end + 1)))
+
+        if skipped:
+            self.stdout.write('Skipping steps {} (already done according '
+                              'to {})\n'.format(skipped, self.checkpoint))
+
+        failed = do_steps(self, steps, DEPENDENCIES, self._do_step,
+                          self._finish_step, jobs=options['jobs'])
 
+        if failed:
+            raise CommandError('Steps {} failed; see above for the steps '
+                               'skipped as a result'.format(failed))
+
+    def _do_step(self, step):
+        """Do one step, then report its lookup cache hits and misses."""
+        previous_stats = get_reference_stats()
+
+        # Read by sync_rows
+        if self.checksum_dir:
+            self.checksums = LegacyChecksums(os.path.join(
+                self.checksum_dir, 'step{}.json'.format(step)))
         else:
-            do_last_step = False
+            self.checksums = None
 
-        require_db_write_acknowledgement()
+        STEPS[step](self, _get_streaming_cursor(_connect_to_legacy(step)))
+
+        if self.checksums:
+            self.checksums.save()
+
+        for name, (hits, misses) in sorted(get_reference_stats().items()):
+            previous_hits, previous_misses = previous_stats.get(name, (0, 0))
+            hits -= previous_hits
+            misses -= previous_misses
+
+            if hits or misses:
+                self.stdout.write('Step {} lookup cache for {}: {} hits, '
+                                  '{} misses\n'.format(
+                                      step, name.split('.')[-1],
+                                      hits, misses))
+
+    def _finish_step(self, step, seconds):
+        """Record that step is done, in the checkpoint file if any."""
+        self.completed.add(step)
+        self.stdout.write('Step {} ({}) done in {:.0f} s\n'
+                          .format(step, STEPS[step].__name__, seconds))
+
+        if self.checkpoint:
+            write_checkpoint(self.checkpoint, self.completed)
+
+
+def _connect_to_legacy(step):
+    """Connect to the legacy database that step syncs from."""
+    if step == LEGACY_DATABASE_2_STEP:
+        # Kris's legacy_db_2
+        database = LEGACY_DATABASE_2
+    else:
+        # Huey-Ling's legacy_db
+        database = LEGACY_DATABASE
+
+    return MySQLdb.connect(host=database['HOST'], user=database['USER'],
+                           passwd=database['PASSWORD'], db=database['NAME'])
+
+
+def _get_streaming_cursor(connection):
+    """
+    Get a server-side cursor for connection.
+
+    Legacy rows are then streamed from the server as they are fetched
+    (see sync_rows), rather than all read into memory by execute.
+    """
+    cursor = connection.cursor(MySQLdb.cursors.SSCursor)
+
+    # While rows are being streamed, the server waits on this process
+    # to sync each chunk; allow it to wait long enough
+    cursor.execute('SET SESSION net_write_timeout = {}'
+                   .format(NET_WRITE_TIMEOUT))
 
-        # Do the steps that involve connecting to Huey-Ling's legacy_db
-        legacy_db = MySQLdb.connect(host=LEGACY_DATABASE['HOST'],
-                                    user=LEGACY_DATABASE['USER'],
-                                    passwd=LEGACY_DATABASE['PASSWORD'],
-                                    db=LEGACY_DATABASE['NAME'])
-
-        cursor = legacy_db.cursor()
-
-        for step in range(start, end + 1):
-            STEPS[step](self, cursor)
-
-        # This step requires connecting to Kris's legacy_db_2
-        if do_last_step:
-            legacy_db_2 = MySQLdb.connect(host=LEGACY_DATABASE_2['HOST'],
-                                          user=LEGACY_DATABASE_2['USER'],
-                                          passwd=LEGACY_DATABASE_2['PASSWORD'],
-                                          db=LEGACY_DATABASE_2['NAME'])
-            cursor = legacy_db_2.cursor()
-            STEPS[LAST_STEP](self, cursor)
+    return cursor
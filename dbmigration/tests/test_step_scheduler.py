@@ -0,0 +1,160 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+from StringIO import StringIO
+
+from django.test import SimpleTestCase
+
+from dbmigration.helpers.step_scheduler import (
+    do_steps, read_checkpoint, write_checkpoint)
+
+DEPENDENCIES = {
+    0: (),
+    1: (0,),
+    2: (1,),
+    3: (),
+}
+
+
+class FakeCommand(object):
+    def __init__(self):
+        self.stdout = StringIO()
+        self.stderr = StringIO()
+
+
+class FakeSteps(object):
+    """
+    Steps that leave a marker file once done.
+
+    A step fails if a dependency's marker file is missing, or if the
+    step is among those told to fail.
+    """
+
+    def __init__(self, directory, failing=()):
+        self.directory = directory
+        self.failing = failing
+        self.finished = []
+        self.pid = os.getpid()
+
+    def is_done(self, step):
+        return os.path.exists(os.path.join(self.directory, str(step)))
+
+    def do_step(self, step):
+        # Give a step started too early the chance to overtake
+        time.sleep(.05 * (len(DEPENDENCIES) - step))
+
+        if step in self.failing or not all(
+                self.is_done(dependency)
+                for dependency in DEPENDENCIES[step]):
+            # In a child process, exit rather than raise, to keep the
+            # traceback out of the test output
+            if os.getpid() != self.pid:
+                sys.exit(1)
+            raise ValueError('Step {} failed'.format(step))
+
+        open(os.path.join(self.directory, str(step)), 'w').close()
+
+    def finish_step(self, step, seconds):
+        self.finished.append(step)
+
+
+class DoStepsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.command = FakeCommand()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def do_steps(self, steps, failing=(), jobs=2):
+        fake = FakeSteps(self.directory, failing)
+        failed = do_steps(self.command, steps, DEPENDENCIES, fake.do_step,
+                          fake.finish_step, jobs=jobs, poll_interval=.01)
+        return fake, failed
+
+    def test_in_order(self):
+        fake, failed = self.do_steps([0, 1, 2, 3], jobs=1)
+        self.assertEqual(failed, [])
+        self.assertEqual(fake.finished, [0, 1, 2, 3])
+
+    def test_in_order_failure_raises(self):
+        with self.assertRaises(ValueError):
+            self.do_steps([0, 1, 2, 3], failing=(1,), jobs=1)
+
+    def test_in_parallel(self):
+        fake, failed = self.do_steps([0, 1, 2, 3])
+        self.assertEqual(failed, [])
+        self.assertEqual(sorted(fake.finished), [0, 1, 2, 3])
+
+        # Each step finishes only after its dependencies
+        self.assertLess(fake.finished.index(0), fake.finished.index(1))
+        self.assertLess(fake.finished.index(1), fake.finished.index(2))
+
+        # Step 3 depends on nothing, so does not wait for the others
+        self.assertLess(fake.finished.index(3), fake.finished.index(1))
+
+    def test_dependency_outside_steps(self):
+        # Step 0 is assumed done, as by an earlier run
+        open(os.path.join(self.directory, '0'), 'w').close()
+        fake, failed = self.do_steps([1, 2])
+        self.assertEqual(failed, [])
+        self.assertEqual(fake.finished, [1, 2])
+
+    def test_failure_skips_dependents(self):
+        fake, failed = self.do_steps([0, 1, 2, 3], failing=(0,))
+        self.assertEqual(failed, [0])
+        self.assertEqual(fake.finished, [3])
+        self.assertFalse(any(fake.is_done(step) for step in (0, 1, 2)))
+        self.assertIn('Skipping step 1, since step 0 was not done',
+                      self.command.stderr.getvalue())
+        self.assertIn('Skipping step 2, since step 1 was not done',
+                      self.command.stderr.getvalue())
+
+
+class CheckpointTestCase(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'checkpoint.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_no_checkpoint(self):
+        self.assertEqual(read_checkpoint(None), set())
+        self.assertEqual(read_checkpoint(self.path), set())
+
+    def test_write_and_read(self):
+        write_checkpoint(self.path, {3, 0, 1})
+        self.assertEqual(read_checkpoint(self.path), {0, 1, 3})
+        self.assertFalse(os.path.exists(self.path + '.part'))
+
+        write_checkpoint(self.path, {0})
+        self.assertEqual(read_checkpoint(self.path), {0})
+
+    def test_resume(self):
+        completed = set()
+        fake = FakeSteps(self.directory, failing=(1,))
+
+        def finish_step(step, seconds):
+            fake.finish_step(step, seconds)
+            completed.add(step)
+            write_checkpoint(self.path, completed)
+
+        command = FakeCommand()
+        failed = do_steps(command, [0, 1, 2, 3], DEPENDENCIES, fake.do_step,
+                          finish_step, jobs=2, poll_interval=.01)
+        self.assertEqual(failed, [1])
+        self.assertEqual(read_checkpoint(self.path), {0, 3})
+
+        # Run again, skipping the steps recorded as done
+        completed = read_checkpoint(self.path)
+        fake.failing = ()
+        steps = [step for step in range(4) if step not in completed]
+        self.assertEqual(steps, [1, 2])
+
+        failed = do_steps(command, steps, DEPENDENCIES, fake.do_step,
+                          finish_step, jobs=2, poll_interval=.01)
+        self.assertEqual(failed, [])
+        self.assertEqual(read_checkpoint(self.path), {0, 1, 2, 3})
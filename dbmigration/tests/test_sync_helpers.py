@@ -0,0 +1,376 @@
+import datetime
+import os
+import shutil
+import sqlite3
+import tempfile
+from decimal import Decimal
+from StringIO import StringIO
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from dbmigration.helpers.sync_helpers import (
+    BulkSyncer, LegacyChecksums, _get_partition_query, get_legacy_checksums,
+    sync_rows)
+from dbmigration.helpers.sync_steps_experiments import (
+    MANUAL_SCORE_KEY_FIELDS)
+from experiments.models import Experiment, ExperimentPlate, ManualScore
+from experiments.tests.base import ScoresTestCase
+
+PLATE_FIELDS = ('screen_stage', 'temperature', 'date', 'comment')
+
+
+class BulkSyncerTestCase(ScoresTestCase):
+    def setUp(self):
+        super(BulkSyncerTestCase, self).setUp()
+        self.command = BaseCommand(stdout=StringIO(), stderr=StringIO())
+        self.date = datetime.date(2016, 1, 1)
+
+    def get_plate_syncer(self, **kwargs):
+        return BulkSyncer(self.command, ExperimentPlate.objects.all(),
+                          PLATE_FIELDS, **kwargs)
+
+    def make_plate(self, plate_id, comment=''):
+        return ExperimentPlate(id=plate_id, screen_stage=2,
+                               temperature=Decimal('22.5'), date=self.date,
+                               comment=comment)
+
+    def test_unchanged(self):
+        syncer = self.get_plate_syncer()
+        self.assertTrue(syncer.sync(self.make_plate(40000)))
+
+        with self.assertNumQueries(0):
+            syncer.flush()
+
+        self.assertEqual(syncer.num_saved, 0)
+
+    def test_add(self):
+        syncer = self.get_plate_syncer()
+        self.assertFalse(syncer.sync(self.make_plate(1, 'new')))
+        self.assertFalse(ExperimentPlate.objects.filter(id=1).exists())
+
+        syncer.flush()
+        self.assertEqual(ExperimentPlate.objects.get(id=1).comment, 'new')
+        self.assertEqual(syncer.num_saved, 1)
+
+        # Now recorded, so matches
+        self.assertTrue(syncer.sync(self.make_plate(1, 'new')))
+
+    def test_change(self):
+        syncer = self.get_plate_syncer()
+        self.assertFalse(syncer.sync(self.make_plate(40000, 'changed')))
+        syncer.flush()
+
+        plate = ExperimentPlate.objects.get(id=40000)
+        self.assertEqual(plate.comment, 'changed')
+        self.assertEqual(plate.date, self.date)
+        self.assertIn('previously recorded', self.command.stderr.getvalue())
+
+    def test_change_to_pending_add(self):
+        syncer = self.get_plate_syncer()
+        syncer.sync(self.make_plate(1, 'first'))
+        self.assertFalse(syncer.sync(self.make_plate(1, 'second')))
+        syncer.flush()
+
+        self.assertEqual(ExperimentPlate.objects.get(id=1).comment, 'second')
+        self.assertEqual(syncer.num_saved, 1)
+
+    def test_change_after_flush(self):
+        syncer = self.get_plate_syncer()
+        syncer.sync(self.make_plate(1, 'first'))
+        syncer.flush()
+
+        self.assertFalse(syncer.sync(self.make_plate(1, 'second')))
+        syncer.flush()
+        self.assertEqual(ExperimentPlate.objects.get(id=1).comment, 'second')
+
+    def test_change_after_flush_auto_pk(self):
+        syncer = BulkSyncer(self.command, ManualScore.objects.all(),
+                            ('timestamp',),
+                            key_fields=('experiment', 'scorer'))
+        experiment = Experiment.objects.get(pk='40000_A01')
+        scorer = self.scorers[0]
+        ManualScore.objects.filter(experiment=experiment,
+                                   scorer=scorer).delete()
+        timestamp = timezone.now()
+
+        def make_score(timestamp):
+            return ManualScore(experiment=experiment, score_code_id=3,
+                               scorer=scorer, timestamp=timestamp)
+
+        syncer.sync(make_score(timestamp))
+        syncer.flush()
+
+        later = timestamp + datetime.timedelta(hours=1)
+        self.assertFalse(syncer.sync(make_score(later)))
+        self.assertTrue(syncer.sync(make_score(later)))
+        syncer.flush()
+
+        self.assertEqual(
+            ManualScore.objects.get(experiment=experiment,
+                                    scorer=scorer).timestamp, later)
+
+    def test_batch_flushes(self):
+        syncer = self.get_plate_syncer(batch_size=2)
+        syncer.sync(self.make_plate(1))
+        self.assertFalse(ExperimentPlate.objects.filter(id=1).exists())
+
+        syncer.sync(self.make_plate(40000, 'changed'))
+        self.assertTrue(ExperimentPlate.objects.filter(id=1).exists())
+        self.assertEqual(ExperimentPlate.objects.get(id=40000).comment,
+                         'changed')
+
+        syncer.sync(self.make_plate(2))
+        self.assertFalse(ExperimentPlate.objects.filter(id=2).exists())
+        syncer.flush()
+        self.assertTrue(ExperimentPlate.objects.filter(id=2).exists())
+
+    def test_depends_on_flushed_first(self):
+        plate_syncer = self.get_plate_syncer()
+        well_syncer = BulkSyncer(
+            self.command, Experiment.objects.all(),
+            ('plate', 'well', 'worm_strain', 'library_stock'),
+            depends_on=plate_syncer)
+
+        plate = self.make_plate(1)
+        plate_syncer.sync(plate)
+        well_syncer.sync(Experiment(
+            id='1_A01', plate=plate, well='A01',
+            worm_strain=self.sup_worm, library_stock=self.stocks[0]))
+
+        well_syncer.flush()
+        self.assertEqual(Experiment.objects.get(id='1_A01').plate_id, 1)
+        self.assertEqual(plate_syncer.num_saved, 1)
+
+    def test_composite_keys(self):
+        syncer = BulkSyncer(self.command, ManualScore.objects.all(), None,
+                            key_fields=MANUAL_SCORE_KEY_FIELDS)
+        recorded = ManualScore.objects.first()
+
+        def make_score(timestamp):
+            return ManualScore(experiment=recorded.experiment,
+                               score_code=recorded.score_code,
+                               scorer=recorded.scorer, timestamp=timestamp)
+
+        self.assertTrue(syncer.sync(make_score(recorded.timestamp)))
+
+        later = recorded.timestamp + datetime.timedelta(hours=1)
+        self.assertTrue(timezone.is_aware(later))
+        self.assertFalse(syncer.sync(make_score(later)))
+        syncer.flush()
+
+        self.assertEqual(
+            ManualScore.objects.filter(experiment=recorded.experiment,
+                                       scorer=recorded.scorer,
+                                       score_code=recorded.score_code)
+            .count(), 2)
+
+
+class FakeLegacyCursor(object):
+    """
+    Stands in for a legacy database cursor.
+
+    Returns columns as the description of any query, checksums for the
+    checksum query, and rows for any other query. Records the queries.
+    """
+
+    def __init__(self, columns, checksums, rows):
+        self.description = [(column,) for column in columns]
+        self.checksums = checksums
+        self.rows = rows
+        self.queries = []
+        self.results = []
+
+    def execute(self, query):
+        self.queries.append(query)
+
+        if query.endswith('LIMIT 0'):
+            self.results = []
+        elif 'BIT_XOR' in query:
+            self.results = list(self.checksums)
+        else:
+            self.results = list(self.rows)
+
+    def fetchall(self):
+        results, self.results = self.results, []
+        return results
+
+    def fetchmany(self, size):
+        results = self.results[:size]
+        self.results = self.results[size:]
+        return results
+
+
+class LegacyChecksumsTestCase(SimpleTestCase):
+    query = 'SELECT expID, 96well FROM RawData'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'step3.json')
+        self.command = BaseCommand(stdout=StringIO(), stderr=StringIO())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_changed_partitions(self):
+        checksums = LegacyChecksums(self.path)
+        current = {0: (3, 11, 19), 40: (2, 2 ** 63 + 5, 2 ** 63 + 9)}
+        self.assertEqual(checksums.get_changed_partitions(self.query,
+                                                          current),
+                         [0, 40])
+
+        checksums.update(self.query, current)
+        self.assertEqual(checksums.get_changed_partitions(self.query,
+                                                          current), [])
+
+        changed = {0: (3, 11, 19), 40: (3, 7, 12), 41: (1, 1, 1)}
+        self.assertEqual(checksums.get_changed_partitions(self.query,
+                                                          changed),
+                         [40, 41])
+
+        # Same count and XOR (as when one of two identical rows changes
+        # to match another pair), but a different sum
+        changed = {0: (3, 11, 23), 40: (2, 2 ** 63 + 5, 2 ** 63 + 9)}
+        self.assertEqual(checksums.get_changed_partitions(self.query,
+                                                          changed),
+                         [0])
+
+        # Another query's checksums are separate
+        self.assertEqual(
+            checksums.get_changed_partitions('SELECT 1', current), [0, 40])
+
+    def test_save_and_reload(self):
+        checksums = LegacyChecksums(self.path)
+        current = {0: (3, 11, 19), 40: (2, 2 ** 63 + 5, 2 ** 63 + 9)}
+        checksums.update(self.query, current)
+
+        # Not recorded until saved
+        self.assertEqual(
+            LegacyChecksums(self.path).get_changed_partitions(
+                self.query, current),
+            [0, 40])
+
+        checksums.save()
+        self.assertFalse(os.path.exists(self.path + '.part'))
+        self.assertEqual(
+            LegacyChecksums(self.path).get_changed_partitions(
+                self.query, current),
+            [])
+
+    def test_partition_query(self):
+        self.assertEqual(
+            _get_partition_query(self.query, 'expID', 1000, [0, 40]),
+            'SELECT * FROM (SELECT expID, 96well FROM RawData) AS legacy '
+            'WHERE FLOOR(legacy.`expID` / 1000) IN (0, 40) '
+            'ORDER BY legacy.`expID`')
+
+    def test_checksum_query(self):
+        cursor = FakeLegacyCursor(['expID', '96well'],
+                                  [(0, 3, 11, 19), (40, 2, 5, 9)], [])
+        self.assertEqual(
+            get_legacy_checksums(cursor, self.query, 'expID', 1000),
+            {0: (3, 11, 19), 40: (2, 5, 9)})
+        self.assertIn('QUOTE(legacy.`96well`)', cursor.queries[-1])
+        self.assertIn('MOD(SUM(', cursor.queries[-1])
+        self.assertTrue(cursor.queries[-1].endswith(
+            'GROUP BY FLOOR(legacy.`expID` / 1000)'))
+
+    def test_duplicate_column_names(self):
+        cursor = FakeLegacyCursor(['expID', 'expID'], [], [])
+        with self.assertRaises(CommandError):
+            get_legacy_checksums(cursor, self.query)
+
+    def test_sync_rows_skips_unchanged_partitions(self):
+        self.command.checksums = LegacyChecksums(self.path)
+        synced = []
+
+        def sync_row(legacy_row):
+            synced.append(legacy_row)
+            return True
+
+        cursor = FakeLegacyCursor(['expID', '96well'],
+                                  [(0, 1, 11, 11), (40, 1, 5, 5)],
+                                  [(1, 'A01'), (40001, 'A01')])
+        sync_rows(self.command, cursor, self.query, sync_row,
+                  partition_column='expID')
+        self.assertEqual(len(synced), 2)
+        self.command.checksums.save()
+
+        # Unchanged, so nothing fetched
+        cursor = FakeLegacyCursor(['expID', '96well'],
+                                  [(0, 1, 11, 11), (40, 1, 5, 5)], [])
+        sync_rows(self.command, cursor, self.query, sync_row,
+                  partition_column='expID')
+        self.assertEqual(len(cursor.queries), 2)
+
+        # Only the changed partition fetched
+        cursor = FakeLegacyCursor(['expID', '96well'],
+                                  [(0, 1, 11, 11), (40, 1, 6, 6)],
+                                  [(40001, 'A02')])
+        sync_rows(self.command, cursor, self.query, sync_row,
+                  partition_column='expID')
+        self.assertIn('IN (40)', cursor.queries[-1])
+        self.assertEqual(synced[-1], (40001, 'A02'))
+
+
+class SyncRowsTestCase(SimpleTestCase):
+    """Test sync_rows against an in-memory sqlite3 legacy table."""
+
+    query = 'SELECT expID, score FROM Scores ORDER BY expID'
+
+    def setUp(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.execute(
+            'CREATE TABLE Scores (expID INTEGER, score INTEGER)')
+        self.connection.executemany(
+            'INSERT INTO Scores VALUES (?, ?)',
+            [(i, i % 3) for i in range(7)])
+        self.command = BaseCommand(stdout=StringIO(), stderr=StringIO())
+        self.synced = []
+
+    def tearDown(self):
+        self.connection.close()
+
+    def sync_row(self, legacy_row, offset=0):
+        self.synced.append((legacy_row[0] + offset, legacy_row[1]))
+        return legacy_row[1] != 2
+
+    def sync_rows(self, chunk_size, **kwargs):
+        sync_rows(self.command, self.connection.cursor(), self.query,
+                  self.sync_row, chunk_size=chunk_size, **kwargs)
+        return self.command.stdout.getvalue()
+
+    def get_progress_counts(self, output):
+        return [int(line.split()[0]) for line in output.splitlines()
+                if 'rows synced' in line]
+
+    def test_final_partial_chunk(self):
+        output = self.sync_rows(3)
+        self.assertEqual(self.synced, [(i, i % 3) for i in range(7)])
+
+        # Progress after each full chunk only
+        self.assertEqual(self.get_progress_counts(output), [3, 6])
+        self.assertIn('Some of 7 rows', output)
+
+    def test_chunk_boundary(self):
+        self.connection.execute('DELETE FROM Scores WHERE expID = 6')
+        output = self.sync_rows(3)
+        self.assertEqual(len(self.synced), 6)
+        self.assertEqual(self.get_progress_counts(output), [3, 6])
+
+    def test_single_chunk(self):
+        output = self.sync_rows(100)
+        self.assertEqual(len(self.synced), 7)
+        self.assertEqual(self.get_progress_counts(output), [])
+
+    def test_all_match(self):
+        self.connection.execute('DELETE FROM Scores WHERE score = 2')
+        output = self.sync_rows(2)
+        self.assertIn('All 5 rows', output)
+        self.assertIn('were already represented', output)
+
+    def test_kwargs_passed_through(self):
+        self.sync_rows(3, offset=100)
+        self.assertEqual(self.synced[0], (100, 0))
+        self.assertEqual(self.synced[-1], (106, 0))
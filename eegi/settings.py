@@ -10,6 +10,7 @@ https://docs.djangoproject.com/en/dev/ref/settings/
 
 # Import local configuration
 
+import localsettings
 from localsettings import (
     DEBUG, SECRET_KEY, LOCKDOWN_PASSWORDS, DATABASES, STATIC_ROOT,
     BASE_DIR_DEVSTAR_OUTPUT, BASE_DIR_IMAGE_CATEGORIES, BASE_DIR_SCORING_LISTS,
@@ -17,12 +18,34 @@ from localsettings import (
     GOOGLE_ANALYTICS_ID, GOOGLE_API_KEY,
     BATCH_DATA_ENTRY_GDOC_NAME, BATCH_DATA_ENTRY_GDOC_URL)
 
+# Optional, for the image pyramid (see experiments.helpers.image_pyramid);
+# without them, pyramid images are replaced by thumbnails
+BASE_DIR_IMG = getattr(localsettings, 'BASE_DIR_IMG', None)
+BASE_DIR_PYRAMID = getattr(localsettings, 'BASE_DIR_PYRAMID', None)
+BASE_URL_PYRAMID = getattr(localsettings, 'BASE_URL_PYRAMID', None)
+
+# Optional, for the file-based caches (see CACHES); without them, the
+# caches are kept in the system's temporary directory
+BASE_DIR_SECONDARY_SCORES_CACHE = getattr(
+    localsettings, 'BASE_DIR_SECONDARY_SCORES_CACHE', None)
+BASE_DIR_IMAGE_AVAILABILITY_CACHE = getattr(
+    localsettings, 'BASE_DIR_IMAGE_AVAILABILITY_CACHE', None)
+
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 
 import os
+import tempfile
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 
+if not BASE_DIR_SECONDARY_SCORES_CACHE:
+    BASE_DIR_SECONDARY_SCORES_CACHE = os.path.join(
+        tempfile.gettempdir(), 'eegi_secondary_scores')
+
+if not BASE_DIR_IMAGE_AVAILABILITY_CACHE:
+    BASE_DIR_IMAGE_AVAILABILITY_CACHE = os.path.join(
+        tempfile.gettempdir(), 'eegi_image_availability')
+
 
 # Security
 
@@ -121,6 +144,42 @@ TEMPLATES = [
 ]
 
 
+# Caching
+# https://docs.djangoproject.com/en/dev/topics/cache/
+#
+# 'secondary_scores' holds the computed secondary scores pages (see
+# experiments.helpers.secondary_scores). It is file-based so that an
+# invalidation in one web server process is seen by all of them, and
+# pages expire after TIMEOUT in case scores change without invalidating
+# them (e.g. by a direct database update).
+#
+# 'image_availability' holds whether each experiment image exists on the
+# image server (see experiments.helpers.image_availability). It is
+# file-based so that the probe_image_availability command can fill it
+# for the web server processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'secondary_scores': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR_SECONDARY_SCORES_CACHE,
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+    'image_availability': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR_IMAGE_AVAILABILITY_CACHE,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+
+
 # Login
 
 LOGIN_URL = 'login_url'
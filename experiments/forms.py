@@ -119,7 +119,7 @@ class SingleScoreField(forms.TypedChoiceField):
         choices.append((IMPOSSIBLE, 'Impossible to judge'))
         kwargs['choices'] = choices
 
-        kwargs['coerce'] = _coerce_to_manualscorecode
+        kwargs['coerce'] = _coerce_to_score_code_pk
 
         if 'required' not in kwargs:
             kwargs['required'] = True
@@ -130,11 +130,21 @@ class SingleScoreField(forms.TypedChoiceField):
         super(SingleScoreField, self).__init__(**kwargs)
 
 
-class MultiScoreField(forms.ModelMultipleChoiceField):
-    """Field for selecting auxiliary scores."""
+class MultiScoreField(forms.TypedMultipleChoiceField):
+    """Field for selecting auxiliary scores.
+
+    Like SingleScoreField, cleans to score code pks rather than
+    ManualScoreCode instances, so that validating does not query the
+    database.
+    """
 
     def __init__(self, key, **kwargs):
-        kwargs['queryset'] = ManualScoreCode.get_codes(key)
+        choices = []
+        for code in ManualScoreCode.get_codes(key):
+            choices.append((code.pk, str(code)))
+
+        kwargs['choices'] = choices
+        kwargs['coerce'] = int
 
         if 'widget' not in kwargs:
             kwargs['widget'] = forms.CheckboxSelectMultiple(
@@ -143,11 +153,11 @@ class MultiScoreField(forms.ModelMultipleChoiceField):
         super(MultiScoreField, self).__init__(**kwargs)
 
 
-def _coerce_to_manualscorecode(value):
+def _coerce_to_score_code_pk(value):
     if value == IMPOSSIBLE:
         return IMPOSSIBLE
 
-    return ManualScoreCode.objects.get(pk=value)
+    return int(value)
 
 
 ##############
@@ -289,7 +299,6 @@ class FilterExperimentWellsForm(_FilterExperimentsBaseForm):
             experiments = experiments.exclude(
                 library_stock__intended_clone='L4440')
 
-        # Must be done last, since it post-processes the query
         if screen_type:
             experiments = _limit_to_screen_type(experiments, screen_type)
 
@@ -373,6 +382,9 @@ class FilterExperimentWellsToScoreForm(_FilterExperimentsBaseForm):
             experiments = experiments.exclude(
                 library_stock__intended_clone='L4440')
 
+        if screen_type:
+            experiments = _limit_to_screen_type(experiments, screen_type)
+
         if unscored_by_user:
             score_ids = (
                 ManualScore.objects
@@ -392,21 +404,12 @@ class FilterExperimentWellsToScoreForm(_FilterExperimentsBaseForm):
                     experiments = experiments.filter(
                         library_stock__in=scoring_list)
 
-        if randomize_order:
-            # Warning: Django docs mentions that `order_by(?)` may be
-            # expensive and slow. If performance becomes an issue, switch
-            # to another way
-            experiments = experiments.order_by('?')
-
-        # Must be done last, since it post-processes the query
-        if screen_type:
-            experiments = _limit_to_screen_type(experiments, screen_type)
-
         return {
             'experiments': experiments,
             'score_form': get_score_form(score_form_key),
             'images_per_page': images_per_page,
             'unscored_by_user': unscored_by_user,
+            'randomize_order': randomize_order,
         }
 
 
@@ -424,7 +427,7 @@ def _remove_empties_and_none(d):
 
 def _limit_to_screen_type(experiments, screen_type):
     '''
-    Post-process experiments QuerySet such that each experiment was done at its
+    Limit experiments QuerySet such that each experiment was done at its
     worm's SUP or ENH temperature. Since N2 does not have a SUP or ENH
     temperature, N2 will not be in this result.
 
@@ -438,29 +441,13 @@ def _limit_to_screen_type(experiments, screen_type):
     with different SUP/ENH temperatures (e.g. maybe Noah wants to see all
     experiments from one date).
 
-    Question: Why not just join between ExperimentPlate.temperature and
-    WormStrain.permissive_temperature / .restrictive_temperature?
-
-    This would involve joining WormStrain on a second field. While easy with
-    raw SQL, this is not easy with Django, requiring either 1) soon-to-
-    be-deprecated `empty()`, 2) overriding low level query processing in ways
-    that are subject to syntax changes, or 3) using `raw()` to write raw SQL.
-    While I was tempted to do 3), since these filtering forms are meant to be
-    generic and applicable (able to take dozens of possible keys to filter on),
-    this one case doesn't warrant losing the readability and protections
-    against SQL injection attacks that Django QuerySets provide.
+    So instead, this filters on the union of (worm, temperature) pairs for
+    all worms in screen_type (see WormStrain.get_screen_type_q). There are
+    only a few dozen worm strains, so this stays a small WHERE clause,
+    and the result is still a lazy QuerySet (so it can be paginated and
+    sliced without fetching every matching experiment).
     '''
-    # Create a dictionary
-    to_temperature = WormStrain.get_worm_to_temperature_dictionary(screen_type)
-    filtered = []
-
-    for experiment in experiments.prefetch_related('worm_strain', 'plate'):
-        temperature = experiment.plate.temperature
-
-        if temperature == to_temperature[experiment.worm_strain]:
-            filtered.append(experiment)
-
-    return filtered
+    return experiments.filter(WormStrain.get_screen_type_q(screen_type))
 
 
 ###################
@@ -534,11 +521,57 @@ def get_score_form(key):
 
 
 class ScoreForm(forms.Form):
+    """
+    Base form for scoring a single experiment.
+
+    The form prefix must be the experiment's pk.
+
+    Optionally supply experiment (to avoid querying for it), and
+    score_codes, a dictionary of ManualScoreCode instances keyed on pk
+    (to avoid querying for the chosen score codes). Both are handy when
+    handling many forms at once (see get_scores).
+    """
 
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop('user', None)
+        self.experiment = kwargs.pop('experiment', None)
+        self.score_codes = kwargs.pop('score_codes', None)
         super(ScoreForm, self).__init__(*args, **kwargs)
 
+    def get_scores(self, timestamp=None):
+        """
+        Get the new, unsaved scores represented by this form.
+
+        The scores are those chosen in the form's SingleScoreFields and
+        MultiScoreFields, in field order. Scores from the same form
+        should get the same timestamp (defaults to now).
+        """
+        if self.experiment is None:
+            self.experiment = Experiment.objects.get(pk=self.prefix)
+
+        pks = []
+        for name, field in self.fields.iteritems():
+            value = self.cleaned_data.get(name)
+
+            if isinstance(field, MultiScoreField):
+                pks.extend(value or [])
+            elif isinstance(field, SingleScoreField) and value != IMPOSSIBLE:
+                pks.append(value)
+
+        if self.score_codes is None:
+            self.score_codes = ManualScoreCode.get_codes_by_pk()
+
+        if timestamp is None:
+            timestamp = timezone.now()
+
+        return [ManualScore(experiment=self.experiment,
+                            score_code=self.score_codes[pk],
+                            scorer=self.user, timestamp=timestamp)
+                for pk in pks]
+
+    def process(self):
+        ManualScore.save_new_scores(self.get_scores())
+
 
 class SuppressorScoreForm(ScoreForm):
 
@@ -555,15 +588,6 @@ class SuppressorScoreForm(ScoreForm):
                                         'some auxiliary score')
         return cleaned_data
 
-    def process(self):
-        cleaned_data = self.cleaned_data
-        save_score = _get_save_score(self)
-
-        save_score(cleaned_data.get('sup_score'))
-
-        for code in cleaned_data.get('auxiliary_scores'):
-            save_score(code)
-
 
 class LevelsScoreForm(ScoreForm):
 
@@ -582,35 +606,6 @@ class LevelsScoreForm(ScoreForm):
                                         'some auxiliary score')
         return cleaned_data
 
-    def process(self):
-        cleaned_data = self.cleaned_data
-        save_score = _get_save_score(self)
-
-        save_score(cleaned_data.get('emb_score'))
-        save_score(cleaned_data.get('ste_score'))
-
-        for code in cleaned_data.get('auxiliary_scores'):
-            save_score(code)
-
-
-def _get_save_score(form):
-    experiment = Experiment.objects.get(pk=form.prefix)
-
-    # Each simultaneously-scored score for this image should get the same
-    # timestamp
-    time = timezone.now()
-
-    def save_score(score_code):
-        if score_code == IMPOSSIBLE:
-            return
-
-        score = ManualScore(
-            experiment=experiment, score_code=score_code,
-            scorer=form.user, timestamp=time)
-        score.save()
-
-    return save_score
-
 
 ##################################
 # Other database-modifying forms #
@@ -682,15 +677,22 @@ def process_ChangeExperimentPlatesForm_data(experiment_plate, data):
 
     data should be the cleaned_data from a ChangeExperimentPlatesForm.
     """
-    # First update straightforward plate fields
+    # First update straightforward plate fields, saving once (each save
+    # updates the plate's control experiments; see
+    # update_control_experiments)
+    changed = False
     for key in ('screen_stage', 'date', 'temperature', 'comment',):
         value = data.get(key)
 
         if value:
             setattr(experiment_plate, key, value)
-            experiment_plate.save()
+            changed = True
+
+    if changed:
+        experiment_plate.save()
 
-    # Next update plate methods
+    # Next update plate methods (which update the control experiments
+    # themselves)
     if data.get('worm_strain'):
         experiment_plate.set_worm_strain(data.get('worm_strain'))
 
@@ -0,0 +1,100 @@
+"""
+Compact integer representation of manual score categories.
+
+Each ManualScoreCode falls into one general category (strong, medium,
+weak, negative, or other; see ManualScore.get_category). Resolving that
+category through ManualScore and ManualScoreCode methods is convenient
+for a handful of scores, but costly when evaluating a whole screen.
+
+This module instead represents each category as a small integer code:
+its index in ManualScore.RELEVANCE_PER_REPLICATE. Since the codes are
+ordered by relevance, the most relevant score for a replicate is simply
+the one with the maximum code.
+
+A set of scores can then be boiled down to a "counts" list, indexed by
+category code, which is all that the criteria in
+experiments.helpers.criteria need to look at.
+"""
+
+from __future__ import division
+
+from experiments.models import ManualScore, ManualScoreCode
+
+CATEGORIES = ManualScore.RELEVANCE_PER_REPLICATE
+NUM_CATEGORIES = len(CATEGORIES)
+
+OTHER = CATEGORIES.index(ManualScore.OTHER)
+NEGATIVE = CATEGORIES.index(ManualScore.NEGATIVE)
+WEAK = CATEGORIES.index(ManualScore.WEAK)
+MEDIUM = CATEGORIES.index(ManualScore.MEDIUM)
+STRONG = CATEGORIES.index(ManualScore.STRONG)
+
+
+def _get_category_by_score_code():
+    """Map score code pks to category codes (omitting category OTHER)."""
+    d = {}
+    for codes, category in ((ManualScoreCode.STRONG_CODES, STRONG),
+                            (ManualScoreCode.MEDIUM_CODES, MEDIUM),
+                            (ManualScoreCode.WEAK_CODES, WEAK),
+                            (ManualScoreCode.NEGATIVE_CODES, NEGATIVE)):
+        for code in codes:
+            d[code] = category
+    return d
+
+
+_CATEGORY_BY_SCORE_CODE = _get_category_by_score_code()
+
+_WEIGHTS = [ManualScore.WEIGHTS[category] for category in CATEGORIES]
+
+
+def get_category_code(score_code_id):
+    """Get the integer category code for a ManualScoreCode pk."""
+    return _CATEGORY_BY_SCORE_CODE.get(score_code_id, OTHER)
+
+
+def count_categories(scores):
+    """
+    Count ManualScore instances per category.
+
+    Returns a list indexed by category code. Only each score's
+    score_code_id is looked at, so the score codes themselves
+    need not be fetched.
+    """
+    counts = [0] * NUM_CATEGORIES
+    for score in scores:
+        counts[get_category_code(score.score_code_id)] += 1
+    return counts
+
+
+def count_categories_by_key(pairs):
+    """
+    Count category codes per key.
+
+    pairs should be an iterable of (key, category_code) pairs,
+    e.g. one (library_stock_pk, category_code) pair per replicate.
+
+    Returns a dictionary keyed on key, the values being lists indexed by
+    category code.
+    """
+    counts = {}
+    for key, category in pairs:
+        if key not in counts:
+            counts[key] = [0] * NUM_CATEGORIES
+        counts[key][category] += 1
+    return counts
+
+
+def get_average_weight(counts):
+    """
+    Get the average ManualScore weight represented by counts.
+
+    Scores in category OTHER are not countable, and therefore ignored.
+    Returns 0 if there are no countable scores.
+    """
+    num_countable = sum(counts) - counts[OTHER]
+    if not num_countable:
+        return 0
+
+    total_weight = sum(weight * count
+                       for weight, count in zip(_WEIGHTS, counts))
+    return total_weight / num_countable
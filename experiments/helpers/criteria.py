@@ -1,15 +1,50 @@
+"""
+Criteria for deciding whether a library stock is positive in a screen.
+
+Each criteria function takes the scores for a particular worm /
+library_stock combo. The decision itself is made by the criteria's
+kernel, which looks only at the number of scores per category (see
+experiments.helpers.categories). The kernel is attached to each criteria
+function as criteria.kernel, with signature:
+
+    kernel(counts, library_stock_pk, **kwargs)
+
+so that a whole screen can be evaluated without instantiating scores
+(see experiments.helpers.scores.get_positives_by_worm).
+"""
+
 from __future__ import division
 
+from experiments.helpers.categories import (
+    count_categories, STRONG, MEDIUM, WEAK, OTHER)
+from library.models import LibraryStock
+
+
+def _with_kernel(kernel):
+    """Attach kernel to the decorated criteria function."""
+    def decorator(criteria):
+        criteria.kernel = kernel
+        return criteria
+    return decorator
 
+
+def _shows_any_suppression(counts, library_stock_pk=None):
+    return counts[STRONG] + counts[MEDIUM] + counts[WEAK] > 0
+
+
+@_with_kernel(_shows_any_suppression)
 def shows_any_suppression(scores):
     """Check if scores contains at least a single suppression score."""
-    for score in scores:
-        if score.is_strong() or score.is_medium() or score.is_weak():
-            return True
+    return _shows_any_suppression(count_categories(scores))
 
-    return False
+
+def _passes_sup_secondary_stringent(counts, library_stock_pk=None):
+    total = sum(counts)
+    yes = counts[STRONG] + counts[MEDIUM]
+    return (yes / total) >= .375
 
 
+@_with_kernel(_passes_sup_secondary_stringent)
 def passes_sup_secondary_stringent(scores):
     """
     Check if scores passes stringent criteria for a positive suppressor.
@@ -18,15 +53,27 @@ def passes_sup_secondary_stringent(scores):
     and include all replicates for a particular worm / library_stock combo
     in the suppressor secondary.
     """
-    total = len(scores)
-    yes = 0
-    for score in scores:
-        if score.is_strong() or score.is_medium():
-            yes += 1
+    return _passes_sup_secondary_stringent(count_categories(scores))
 
-    return (yes / total) >= .375
+
+def _passes_sup_secondary_percent(counts, library_stock_pk=None):
+    total = sum(counts) - counts[OTHER]
+
+    if not total:
+        return False
+
+    if total < 8:
+        return _passes_sup_secondary_count(counts)
+
+    yes = (counts[STRONG] + counts[MEDIUM]) / total
+    maybe = counts[WEAK] / total
+
+    return (yes >= .375 or
+            (yes >= .125 and yes + maybe >= .5) or
+            yes + maybe >= .625)
 
 
+@_with_kernel(_passes_sup_secondary_percent)
 def passes_sup_secondary_percent(scores):
     """
     Check if scores passes percent-based criteria for a positive suppressor.
@@ -35,32 +82,19 @@ def passes_sup_secondary_percent(scores):
     and include all replicates for a particular worm / library_stock combo
     in the suppressor secondary.
     """
-    total = 0
-    yes = 0
-    maybe = 0
-    for score in scores:
-        if not score.is_other():
-            total += 1
-
-        if score.is_strong() or score.is_medium():
-            yes += 1
-        elif score.is_weak():
-            maybe += 1
-
-    if not total:
-        return False
+    return _passes_sup_secondary_percent(count_categories(scores))
 
-    if total < 8:
-        return passes_sup_secondary_count(scores)
 
-    yes = yes / total
-    maybe = maybe / total
+def _passes_sup_secondary_count(counts, library_stock_pk=None):
+    yes = counts[STRONG] + counts[MEDIUM]
+    maybe = counts[WEAK]
 
-    return (yes >= .375 or
-            (yes >= .125 and yes + maybe >= .5) or
-            yes + maybe >= .625)
+    return (yes >= 3 or
+            (yes >= 1 and yes + maybe >= 4) or
+            yes + maybe >= 5)
 
 
+@_with_kernel(_passes_sup_secondary_count)
 def passes_sup_secondary_count(scores):
     """
     Check if scores passes count-based criteria for a positive suppressor.
@@ -69,19 +103,23 @@ def passes_sup_secondary_count(scores):
     and include all replicates for a particular worm / library_stock combo
     in the suppressor secondary.
     """
-    yes = 0
-    maybe = 0
-    for score in scores:
-        if score.is_strong() or score.is_medium():
-            yes += 1
-        elif score.is_weak():
-            maybe += 1
+    return _passes_sup_secondary_count(count_categories(scores))
 
-    return (yes >= 3 or
-            (yes >= 1 and yes + maybe >= 4) or
-            yes + maybe >= 5)
 
+def _passes_enh_primary(counts, library_stock_pk=None, singles=[]):
+    if counts[STRONG] or counts[MEDIUM]:
+        return True
+
+    if counts[WEAK] >= 2:
+        return True
+
+    if counts[WEAK] == 1:
+        return LibraryStock(pk=library_stock_pk) in singles
 
+    return False
+
+
+@_with_kernel(_passes_enh_primary)
 def passes_enh_primary(scores, singles=[]):
     """
     Check if scores qualifies for the enhancer secondary screen.
@@ -98,19 +136,11 @@ def passes_enh_primary(scores, singles=[]):
     that we only tested one copy, we do not presume anything about the
     other copy.
     """
-    is_positive = False
-    num_weaks = 0
-    for score in scores:
-        if score.is_strong() or score.is_medium():
-            is_positive = True
-            break
-        if score.is_weak():
-            num_weaks += 1
-
-    if num_weaks >= 2:
-        is_positive = True
-
-    if num_weaks == 1 and scores[0].experiment.library_stock in singles:
-        is_positive = True
-
-    return is_positive
+    counts = count_categories(scores)
+
+    if counts[WEAK] == 1:
+        library_stock_pk = scores[0].experiment.library_stock_id
+    else:
+        library_stock_pk = None
+
+    return _passes_enh_primary(counts, library_stock_pk, singles=singles)
@@ -5,7 +5,8 @@ from itertools import izip_longest
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 
-from experiments.models import Experiment, ExperimentPlate
+from experiments.models import (ControlExperiment, Experiment,
+                                ExperimentPlate)
 from library.helpers.naming import generate_library_plate_name
 from library.models import LibraryPlate
 from utils.google import connect_to_google_spreadsheets
@@ -148,5 +149,7 @@ def _parse_gdoc_experiment_rows(rows, screen_stage, date, worms,
 
     ExperimentPlate.objects.bulk_create(all_new_plates)
     Experiment.objects.bulk_create(all_new_wells)
+    ControlExperiment.rebuild(experiments=Experiment.objects.filter(
+        plate__in=[plate.pk for plate in all_new_plates]))
 
     return len(all_new_plates)
@@ -0,0 +1,216 @@
+"""
+Genetic interaction (GI) scores, computed from DevStaR survival.
+
+The GI score of a mutant + RNAi well compares its survival to the
+survival expected if the mutation and the RNAi knockdown acted
+independently (a multiplicative model):
+
+    gi_score = survival(mutant + RNAi)
+               - survival(mutant + L4440) * survival(N2 + RNAi)
+
+where each control survival is the mean over the control wells, found
+by the same rules as Experiment.get_l4440_control_filters (same date,
+temperature, and worm) and Experiment.get_n2_control_filters (same
+date and library stock, closest temperature).
+
+A negative score means the well is sicker than expected (a candidate
+enhancer), and a positive score means it is healthier than expected (a
+candidate suppressor). A well is selected for manual scoring if its
+score passes the threshold in the direction of its screen: below
+-threshold at the worm's ENH temperature, or above threshold at the
+worm's SUP temperature.
+
+Since controls always come from the same date, the screen is processed
+one date at a time: each date's survivals are read in one query, the
+control means are aggregated per date / worm / temperature and per
+date / library stock / temperature, and every well of that date is
+scored against them (see compute_gi_scores_for_date).
+"""
+
+from __future__ import division
+
+from collections import defaultdict
+
+from clones.models import Clone
+from experiments.models import DevstarScore, ExperimentPlate
+from utils.comparison import get_closest_candidate
+from utils.sql import bulk_update
+from worms.models import WormStrain
+
+DEFAULT_THRESHOLD = 0.25
+
+
+def compute_gi_scores_for_date(rows, n2_pk, l4440_pk, screen_types,
+                               threshold=DEFAULT_THRESHOLD):
+    """
+    Compute the GI scores for the wells of one date.
+
+    rows should be an iterable of (devstar_pk, worm_pk, library_stock_pk,
+    clone_pk, temperature, survival) tuples, one per DevstarScore of
+    a non-junk experiment from this date. Temperatures should be floats
+    rather than Decimals, since every row's temperature is hashed, and
+    hashing a Decimal is slow.
+
+    screen_types should map (worm_pk, temperature) to 'ENH' or 'SUP' (see
+    get_screen_types).
+
+    Returns a dictionary mapping devstar_pk to a (gi_score,
+    selected_for_scoring) tuple for every mutant + RNAi well (mutant
+    wells without a clone are left out). Both are None if the well or
+    its controls lack survival; selected_for_scoring is also None at
+    temperatures that are not a screen temperature for the worm.
+    """
+    # Sums and counts of control survivals, for the means
+    l4440_totals = defaultdict(lambda: [0, 0])
+    n2_totals = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    wells = []
+
+    for row in rows:
+        devstar_pk, worm_pk, stock_pk, clone_pk, temperature, survival = row
+
+        if clone_pk == l4440_pk:
+            totals = l4440_totals[(worm_pk, temperature)]
+        elif worm_pk == n2_pk:
+            # Added even without survival, since any N2 well counts
+            # toward finding the closest temperature
+            totals = n2_totals[stock_pk][temperature]
+        elif clone_pk is None:
+            # Empty well, with no RNAi to score
+            continue
+        else:
+            wells.append(row)
+            continue
+
+        if survival is not None:
+            totals[0] += survival
+            totals[1] += 1
+
+    l4440_means = {key: _get_mean(totals)
+                   for key, totals in l4440_totals.iteritems()}
+
+    # Mean N2 survival at the closest temperature, per (library stock,
+    # temperature)
+    n2_means = {}
+
+    results = {}
+
+    for (devstar_pk, worm_pk, stock_pk, clone_pk, temperature,
+         survival) in wells:
+        l4440_mean = l4440_means.get((worm_pk, temperature))
+
+        n2_key = (stock_pk, temperature)
+        if n2_key not in n2_means:
+            by_temperature = n2_totals.get(stock_pk, {})
+            closest = get_closest_candidate(
+                temperature, sorted(by_temperature))
+            n2_means[n2_key] = _get_mean(by_temperature.get(closest))
+        n2_mean = n2_means[n2_key]
+
+        if survival is None or l4440_mean is None or n2_mean is None:
+            results[devstar_pk] = (None, None)
+            continue
+
+        gi_score = survival - l4440_mean * n2_mean
+        screen_type = screen_types.get((worm_pk, temperature))
+
+        if screen_type == 'ENH':
+            selected = gi_score <= -threshold
+        elif screen_type == 'SUP':
+            selected = gi_score >= threshold
+        else:
+            selected = None
+
+        results[devstar_pk] = (gi_score, selected)
+
+    return results
+
+
+def _get_mean(totals):
+    """Get the mean from a [total, count] pair, or None if no count."""
+    if not totals or not totals[1]:
+        return None
+    return totals[0] / totals[1]
+
+
+def get_screen_types():
+    """
+    Get a dictionary mapping (worm_pk, temperature) to screen type.
+
+    Temperatures are floats, as compute_gi_scores_for_date expects.
+    """
+    screen_types = {}
+
+    for worm in WormStrain.objects.all():
+        for screen_type in ('ENH', 'SUP'):
+            temperature = worm.get_screen_temperature(screen_type)
+            if temperature is not None:
+                screen_types[(worm.pk, float(temperature))] = screen_type
+
+    return screen_types
+
+
+def update_gi_scores(screen_stage=None, threshold=DEFAULT_THRESHOLD,
+                     dry_run=False):
+    """
+    Compute and save the GI scores for a whole screen.
+
+    Optionally supply screen_stage to limit to the primary (1) or
+    secondary (2) screen (defaults to both).
+
+    Only the DevstarScores whose gi_score or selected_for_scoring change
+    are saved. Set dry_run=True to compute without saving.
+
+    Returns a 2-tuple of the number of wells scored and the number of
+    DevstarScores changed.
+    """
+    n2_pk = WormStrain.get_n2().pk
+    l4440_pk = Clone.get_l4440().pk
+    screen_types = get_screen_types()
+
+    plates = ExperimentPlate.objects.all()
+    if screen_stage is not None:
+        plates = plates.filter(screen_stage=screen_stage)
+
+    temperatures = {pk: float(temperature) for pk, temperature
+                    in plates.values_list('pk', 'temperature')}
+    dates = plates.order_by('date').values_list('date', flat=True).distinct()
+
+    num_scored = 0
+    num_changed = 0
+
+    for date in dates:
+        scores = DevstarScore.objects.filter(
+            experiment__is_junk=False, experiment__plate__date=date)
+        if screen_stage is not None:
+            scores = scores.filter(
+                experiment__plate__screen_stage=screen_stage)
+
+        rows = scores.values_list(
+            'pk', 'experiment__worm_strain', 'experiment__library_stock',
+            'experiment__library_stock__intended_clone',
+            'experiment__plate', 'survival',
+            'gi_score', 'selected_for_scoring')
+
+        current = {}
+
+        def get_rows():
+            for row in rows.iterator():
+                current[row[0]] = row[6:]
+                yield row[:4] + (temperatures[row[4]], row[5])
+
+        results = compute_gi_scores_for_date(
+            get_rows(), n2_pk, l4440_pk, screen_types, threshold=threshold)
+
+        changed = [
+            DevstarScore(pk=pk, gi_score=gi_score,
+                         selected_for_scoring=selected)
+            for pk, (gi_score, selected) in results.iteritems()
+            if current[pk] != (gi_score, selected)]
+
+        num_scored += len(results)
+        num_changed += len(changed)
+
+        if not dry_run:
+            bulk_update(changed, ['gi_score', 'selected_for_scoring'])
+
+    return (num_scored, num_changed)
@@ -0,0 +1,104 @@
+"""
+Availability of experiment images on the image server.
+
+Checking whether an image exists means a request to the image server,
+which may be slow or down. So each check is a HEAD request with a short
+timeout, and the results are cached (in the 'image_availability' cache;
+see CACHES in settings). Images that exist are remembered longer than
+images that do not, since missing images may still be uploaded, and
+images that could not be checked (e.g. because the server timed out)
+are only remembered briefly.
+
+The cache can be filled ahead of time for whole plates with the
+probe_image_availability command, so that pages need not wait on the
+image server at all.
+"""
+
+import hashlib
+from multiprocessing.pool import ThreadPool
+
+from django.core.cache import caches
+
+from utils.http import http_head_status
+
+CACHE_NAME = 'image_availability'
+
+# Modes accepted by Experiment.get_image_url ('big' is full-size)
+MODES = ('big', 'thumbnail', 'devstar', 'pyramid')
+
+# Seconds to wait on the image server per check
+TIMEOUT = 2
+
+# Seconds to remember that an image exists, does not exist, or could
+# not be checked
+AVAILABLE_TTL = 60 * 60 * 24
+UNAVAILABLE_TTL = 60 * 60
+UNREACHABLE_TTL = 60 * 5
+
+
+def _get_cache():
+    return caches[CACHE_NAME]
+
+
+def _get_key(url):
+    return 'available:' + hashlib.md5(url).hexdigest()
+
+
+def is_image_available(experiment, mode='big', timeout=TIMEOUT):
+    """
+    Check if the image for experiment is available on the image server.
+
+    mode should be one of MODES. On a cache miss, this asks the image
+    server, waiting at most timeout seconds.
+    """
+    url = experiment.get_image_url(mode=mode)
+    available = _get_cache().get(_get_key(url))
+
+    if available is None:
+        available = check_urls([url], timeout=timeout)[url]
+
+    return available
+
+
+def check_urls(urls, timeout=TIMEOUT, threads=1):
+    """
+    Check if urls are available, caching the results.
+
+    Uses threads concurrent HEAD requests, each waiting at most timeout
+    seconds. Returns a dictionary mapping each url to True or False.
+    """
+    urls = list(urls)
+
+    def get_status(url):
+        return http_head_status(url, timeout=timeout)
+
+    if threads > 1:
+        pool = ThreadPool(processes=threads)
+        try:
+            statuses = pool.map(get_status, urls)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        statuses = [get_status(url) for url in urls]
+
+    by_ttl = {AVAILABLE_TTL: {}, UNAVAILABLE_TTL: {}, UNREACHABLE_TTL: {}}
+    results = {}
+
+    for url, status in zip(urls, statuses):
+        if status == 200:
+            ttl = AVAILABLE_TTL
+        elif status is None:
+            ttl = UNREACHABLE_TTL
+        else:
+            ttl = UNAVAILABLE_TTL
+
+        results[url] = status == 200
+        by_ttl[ttl][_get_key(url)] = results[url]
+
+    cache = _get_cache()
+    for ttl, values in by_ttl.iteritems():
+        if values:
+            cache.set_many(values, ttl)
+
+    return results
@@ -0,0 +1,60 @@
+"""
+Multi-resolution thumbnails (a "pyramid") of the experiment images.
+
+The raw images are full-size .bmp tiles, several megabytes each, which is
+far more than pages showing 96 wells at a time need. So each tile is also
+saved as a .jpg at each of SIZES (the longer side, in pixels), under
+BASE_DIR_PYRAMID/<size>/<plate>/<tile>.jpg and served from
+BASE_URL_PYRAMID/<size>/<plate>/<tile>.jpg.
+
+The pyramid is generated with the generate_image_pyramid command.
+Experiment.get_image_url(mode='pyramid', width=...) picks the smallest
+size at least as wide as the image will be shown.
+
+The pyramid is optional: if BASE_URL_PYRAMID is not set in localsettings,
+get_image_url(mode='pyramid') gives the thumbnail instead.
+"""
+
+import os
+
+from django.conf import settings
+
+# Longer side of each level of the pyramid, in pixels, in increasing order
+SIZES = (64, 256, 1024)
+
+
+def is_pyramid_enabled():
+    """Check whether the pyramid images are served (see module doc)."""
+    return bool(settings.BASE_URL_PYRAMID)
+
+
+def get_pyramid_size(width=None):
+    """
+    Get the smallest pyramid size that is at least width pixels.
+
+    Returns the largest size if width is not given or is larger than all
+    SIZES.
+    """
+    if width:
+        for size in SIZES:
+            if size >= int(width):
+                return size
+
+    return SIZES[-1]
+
+
+def get_pyramid_url(plate_id, tile, size):
+    """Get the url of the pyramid image of tile at size."""
+    return '/'.join((settings.BASE_URL_PYRAMID, str(size), str(plate_id),
+                     tile + '.jpg'))
+
+
+def get_pyramid_path(plate_id, tile, size):
+    """Get the path of the pyramid image of tile at size."""
+    return os.path.join(settings.BASE_DIR_PYRAMID, str(size), str(plate_id),
+                        tile + '.jpg')
+
+
+def get_source_path(plate_id, tile):
+    """Get the path of the raw .bmp image of tile."""
+    return os.path.join(settings.BASE_DIR_IMG, str(plate_id), tile + '.bmp')
@@ -1,6 +1,7 @@
 from __future__ import division
 from collections import OrderedDict
 
+from library.models import LibraryStock
 from worms.models import WormStrain
 
 
@@ -75,12 +76,107 @@ def get_positives_any_worm(screen_type, screen_stage, criteria, **kwargs):
     A screen is defined by both screen_type ('ENH' or 'SUP')
     and screen_stage (1 for primary, 2 for secondary).
     """
-    worms = WormStrain.get_worms_for_screen_type(screen_type)
+    positives_by_worm = get_positives_by_worm(screen_type, screen_stage,
+                                              criteria, **kwargs)
 
     all_positives = set()
-    for worm in worms:
-        positives = worm.get_positives(screen_type, screen_stage, criteria,
-                                       **kwargs)
+    for positives in positives_by_worm.values():
         all_positives = all_positives.union(positives)
 
     return all_positives
+
+
+def get_positives_by_worm(screen_type, screen_stage, criteria, worms=None,
+                          use_summaries=False, **kwargs):
+    """
+    Get the library stocks that meet criteria, per worm, in a screen.
+
+    A screen is defined by both screen_type ('ENH' or 'SUP')
+    and screen_stage (1 for primary, 2 for secondary).
+
+    criteria should be one of the functions in
+    experiments.helpers.criteria (kwargs are passed along to it).
+
+    Optionally supply worms to limit the computation to those worm
+    strains (defaults to all worms in screen_type).
+
+    The data returned is organized as:
+        p[worm] = set(library_stocks)
+
+    Rather than querying (and instantiating) every score for each
+    worm separately, this fetches the bare score tuples for the whole
+    screen in a single query, and reduces each replicate to the category
+    code of its most relevant score (see experiments.helpers.categories).
+    The criteria's kernel is then applied to the category counts of each
+    (worm, library_stock) group.
+
+    Set use_summaries=True to instead read the most relevant category
+    per replicate straight from the ManualScoreSummary table.
+    """
+    # Import here to avoid creating a circular dependency
+    from experiments.helpers.categories import (count_categories_by_key,
+                                                get_category_code)
+    from experiments.models import ManualScore, ManualScoreSummary
+
+    if worms is None:
+        worms = WormStrain.get_worms_for_screen_type(screen_type)
+
+    worms = {worm.pk: worm for worm in worms}
+
+    screen_type_q = WormStrain.get_screen_type_q(
+        screen_type, worms=worms.values(), prefix='experiment__')
+
+    if use_summaries:
+        rows = (ManualScoreSummary.objects
+                .filter(screen_type_q)
+                .filter(experiment__is_junk=False,
+                        experiment__plate__screen_stage=screen_stage)
+                .order_by()
+                .values_list('experiment__worm_strain',
+                             'experiment__library_stock', 'category'))
+
+        counts_by_group = count_categories_by_key(
+            ((worm_pk, stock_pk), category)
+            for worm_pk, stock_pk, category in rows.iterator())
+
+    else:
+        rows = (ManualScore.objects
+                .filter(screen_type_q)
+                .filter(experiment__is_junk=False,
+                        experiment__plate__screen_stage=screen_stage)
+                .order_by()
+                .values_list('experiment__worm_strain',
+                             'experiment__library_stock',
+                             'experiment', 'score_code'))
+
+        # Reduce to the most relevant category per experiment replicate
+        most_relevant = {}
+        for worm_pk, stock_pk, experiment_pk, code_pk in rows.iterator():
+            category = get_category_code(code_pk)
+            if (experiment_pk not in most_relevant or
+                    category > most_relevant[experiment_pk][1]):
+                most_relevant[experiment_pk] = ((worm_pk, stock_pk),
+                                                category)
+
+        counts_by_group = count_categories_by_key(most_relevant.itervalues())
+
+    positive_pks = {}
+    for key, counts in counts_by_group.iteritems():
+        worm_pk, stock_pk = key
+        if criteria.kernel(counts, stock_pk, **kwargs):
+            if worm_pk not in positive_pks:
+                positive_pks[worm_pk] = set()
+            positive_pks[worm_pk].add(stock_pk)
+
+    all_positive_pks = set()
+    for pks in positive_pks.values():
+        all_positive_pks.update(pks)
+
+    library_stocks = LibraryStock.objects.in_bulk(all_positive_pks)
+
+    positives = {}
+    for worm_pk, worm in worms.iteritems():
+        pks = positive_pks.get(worm_pk, set())
+        positives[worm] = set(library_stocks[pk] for pk in pks)
+
+    return positives
@@ -0,0 +1,89 @@
+"""
+Cache for the secondary scores pages.
+
+Computing the secondary scores page for a worm / temperature means
+organizing and evaluating every secondary score for that combo, which
+can take several seconds for big strains. Since the results only change
+when scores or experiments change, they are cached (in the
+'secondary_scores' cache, shared by all processes; see CACHES in
+settings) per worm, temperature, and set of scorers.
+
+Rather than tracking every cached scorer set, each worm / temperature
+has a "generation" token, which is part of every key for that combo.
+Invalidating a worm / temperature simply replaces its token, orphaning
+the old entries (which the cache backend eventually evicts).
+
+Saving or deleting a ManualScore, Experiment, or ExperimentPlate
+invalidates the affected results (see the signal receivers in
+experiments.models). Bulk changes, which bypass those signals, must
+invalidate the results themselves.
+"""
+
+import hashlib
+import uuid
+from decimal import Decimal
+
+from django.core.cache import caches
+
+CACHE_NAME = 'secondary_scores'
+
+
+def _get_cache():
+    return caches[CACHE_NAME]
+
+
+def _get_generation_key(worm_pk, temperature):
+    return 'generation:{}:{:.1f}'.format(worm_pk, Decimal(temperature))
+
+
+def _get_generation(worm_pk, temperature):
+    cache = _get_cache()
+    key = _get_generation_key(worm_pk, temperature)
+    generation = cache.get(key)
+
+    if generation is None:
+        generation = uuid.uuid4().hex
+        cache.set(key, generation, None)
+
+    return generation
+
+
+def _get_key(worm_pk, temperature, scorers):
+    generation = _get_generation(worm_pk, temperature)
+    key = u'{}:{:.1f}:{}:{}'.format(worm_pk, Decimal(temperature),
+                                    scorers, generation)
+
+    # Hash, since scorers may contain characters unsafe for some backends
+    return 'results:' + hashlib.md5(key.encode('utf-8')).hexdigest()
+
+
+def get_cached_secondary_scores(worm_pk, temperature, scorers):
+    """
+    Get the cached secondary scores results for a worm / temperature.
+
+    scorers should be a string identifying the set of scorers whose
+    scores the results are based on (e.g. a username, or a list of ids).
+
+    Returns None if nothing is cached.
+    """
+    return _get_cache().get(_get_key(worm_pk, temperature, scorers))
+
+
+def set_cached_secondary_scores(worm_pk, temperature, scorers, results):
+    """Cache the secondary scores results for a worm / temperature."""
+    _get_cache().set(_get_key(worm_pk, temperature, scorers), results)
+
+
+def invalidate_secondary_scores(worm_pk, temperature):
+    """
+    Invalidate all cached secondary scores results for a worm / temperature.
+
+    Call this whenever scores for this worm / temperature change.
+    """
+    _get_cache().set(_get_generation_key(worm_pk, temperature),
+                     uuid.uuid4().hex, None)
+
+
+def clear_secondary_scores():
+    """Invalidate all cached secondary scores results."""
+    _get_cache().clear()
@@ -0,0 +1,148 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from experiments.helpers.gi_scores import (DEFAULT_THRESHOLD,
+                                           compute_gi_scores_for_date,
+                                           update_gi_scores)
+from utils.scripting import require_db_write_acknowledgement
+
+# Shape of each synthetic date for --benchmark, similar to a real
+# primary screen date: each mutant is screened on every library plate
+# of the day, N2 at both screening temperatures, with a few L4440 wells
+# per plate
+BENCHMARK_PLATES_PER_DATE = 20
+BENCHMARK_MUTANTS_PER_DATE = 10
+BENCHMARK_L4440_PER_PLATE = 4
+BENCHMARK_TEMPERATURES = (15.0, 25.0)
+
+
+class Command(BaseCommand):
+    """
+    Command to compute the GI scores of the DevStaR scores.
+
+    Sets DevstarScore.gi_score and DevstarScore.selected_for_scoring
+    for every mutant + RNAi well with DevStaR survival (see
+    experiments.helpers.gi_scores). Only the scores that change are
+    saved.
+
+    With --benchmark, nothing is read from or written to the database;
+    instead, the computation is timed on synthetic wells.
+    """
+
+    help = 'Compute the GI scores of the DevStaR scores.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--screen-stage',
+                            dest='screen_stage',
+                            type=int,
+                            choices=(1, 2),
+                            help='Limit to the primary (1) or '
+                                 'secondary (2) screen')
+
+        parser.add_argument('--threshold',
+                            dest='threshold',
+                            type=float,
+                            default=DEFAULT_THRESHOLD,
+                            help='GI score magnitude needed to select a '
+                                 'well for manual scoring')
+
+        parser.add_argument('--dry-run',
+                            dest='dry_run',
+                            action='store_true',
+                            default=False,
+                            help='Compute without saving')
+
+        parser.add_argument('--benchmark',
+                            dest='benchmark',
+                            type=int,
+                            metavar='WELLS',
+                            help='Time the computation on about this many '
+                                 'synthetic wells, instead of updating '
+                                 'the database')
+
+    def handle(self, **options):
+        if options['benchmark']:
+            self._benchmark(options['benchmark'], options['threshold'])
+            return
+
+        if not options['dry_run']:
+            require_db_write_acknowledgement()
+
+        num_scored, num_changed = update_gi_scores(
+            screen_stage=options['screen_stage'],
+            threshold=options['threshold'],
+            dry_run=options['dry_run'])
+
+        self.stdout.write('{} wells scored, {} DevStaR scores changed'
+                          .format(num_scored, num_changed))
+
+    def _benchmark(self, num_wells, threshold):
+        rng = random.Random(0)
+        dates = list(_generate_synthetic_dates(num_wells, rng))
+        screen_types = {
+            (worm_pk, BENCHMARK_TEMPERATURES[worm_pk % 2]):
+            ('ENH', 'SUP')[worm_pk % 2]
+            for worm_pk in range(1, BENCHMARK_MUTANTS_PER_DATE + 1)}
+
+        num_rows = sum(len(rows) for rows in dates)
+        num_scored = 0
+        start = time.time()
+
+        for rows in dates:
+            results = compute_gi_scores_for_date(
+                rows, 0, 0, screen_types, threshold=threshold)
+            num_scored += len(results)
+
+        seconds = time.time() - start
+
+        self.stdout.write(
+            '{} wells ({} scored) over {} dates in {:.2f} s '
+            '({:.0f} wells/s)'.format(
+                num_rows, num_scored, len(dates), seconds,
+                num_rows / seconds if seconds else float('inf')))
+
+
+def _generate_synthetic_dates(num_wells, rng):
+    """
+    Generate synthetic rows for compute_gi_scores_for_date.
+
+    Yields one list of rows per date, until about num_wells rows have
+    been generated. N2 and L4440 both have pk 0; the mutants have pks 1
+    and up, each screened at one of BENCHMARK_TEMPERATURES.
+    """
+    num_generated = 0
+    devstar_pk = 0
+
+    while num_generated < num_wells:
+        rows = []
+
+        for plate in range(BENCHMARK_PLATES_PER_DATE):
+            for well in range(96):
+                if well < BENCHMARK_L4440_PER_PLATE:
+                    stock_pk, clone_pk = 0, 0
+                else:
+                    stock_pk = plate * 96 + well + 1
+                    clone_pk = stock_pk
+
+                worms = [(0, temperature)
+                         for temperature in BENCHMARK_TEMPERATURES]
+                worms.extend(
+                    (worm_pk, BENCHMARK_TEMPERATURES[worm_pk % 2])
+                    for worm_pk in range(1, BENCHMARK_MUTANTS_PER_DATE + 1))
+
+                for worm_pk, temperature in worms:
+                    devstar_pk += 1
+
+                    # Occasionally no brood, so no survival
+                    if rng.random() < 0.02:
+                        survival = None
+                    else:
+                        survival = rng.random()
+
+                    rows.append((devstar_pk, worm_pk, stock_pk, clone_pk,
+                                 temperature, survival))
+
+        num_generated += len(rows)
+        yield rows
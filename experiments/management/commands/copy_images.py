@@ -4,12 +4,20 @@ import os
 import re
 import requests
 import shutil
+import time
+from collections import Counter
+from multiprocessing.pool import ThreadPool
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 
 from utils.well_tile_conversion import well_to_tile
 
+MANIFEST_NAME = 'manifest.csv'
+
+# Seconds to wait on the server before a request is considered failed
+TIMEOUT = 60
+
 
 class Command(BaseCommand):
     """
@@ -32,6 +40,15 @@ class Command(BaseCommand):
     If the first element cannot be converted to an int, or if the second
     cannot be converted to a well, the row is skipped. So having a
     header row is okay.
+
+    Images are downloaded --threads at a time, retrying failed downloads
+    with backoff. A failed image does not stop the other images from
+    being copied. The result for each image (copied, skipped, or failed)
+    is written to manifest.csv in the output directory.
+
+    To finish an interrupted or partly failed copy, run again with
+    --resume. This copies into the existing output directory, skipping
+    images already there with the same size as on the server.
     """
 
     help = 'Copy a set of images to a local directory.'
@@ -45,19 +62,49 @@ class Command(BaseCommand):
         parser.add_argument('output_dir',
                             help='Directory in which to write the images.')
 
+        parser.add_argument('--resume',
+                            dest='resume',
+                            action='store_true',
+                            default=False,
+                            help='Copy into an existing output directory, '
+                                 'skipping images already copied')
+
+        parser.add_argument('--threads',
+                            dest='threads',
+                            type=int,
+                            default=8,
+                            help='Number of concurrent downloads')
+
+        parser.add_argument('--retries',
+                            dest='retries',
+                            type=int,
+                            default=3,
+                            help='Number of times to retry a failed '
+                                 'download')
+
+        parser.add_argument('--backoff',
+                            dest='backoff',
+                            type=float,
+                            default=1,
+                            help='Seconds to wait before the first retry '
+                                 '(doubling for each retry after that)')
+
     def handle(self, **options):
         input_file = options['input_file']
         output_dir = options['output_dir']
 
         # Create output directory, exiting if already exists
         if os.path.exists(output_dir):
-            raise CommandError('Output directory {} already exists'
-                               .format(output_dir))
+            if not options['resume']:
+                raise CommandError('Output directory {} already exists '
+                                   '(use --resume to copy into it)'
+                                   .format(output_dir))
         else:
             os.makedirs(output_dir)
 
         # Parse input
         reader = csv.reader(input_file, delimiter=',')
+        jobs = []
 
         for experiment_id, well in reader:
             try:
@@ -81,13 +128,101 @@ class Command(BaseCommand):
                 settings.BASE_URL_IMG, experiment_id, tile)
             output_image_path = '{}/{}_{}.bmp'.format(
                 output_dir, experiment_id, tile)
-            r = requests.get(input_image_url, stream=True)
+            jobs.append((input_image_url, output_image_path))
+
+        # One session for all threads, so connections are reused
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=options['threads'])
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        def copy(job):
+            url, path = job
+            try:
+                result = _copy_image(session, url, path, options['retries'],
+                                     options['backoff'])
+            except Exception as e:
+                # So that one image does not stop the others
+                result = 'failed: {}'.format(str(e) or
+                                             e.__class__.__name__)
+            return (url, path, result)
+
+        pool = ThreadPool(processes=options['threads'])
+        counts = Counter()
+        manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+
+        # Results are reported and recorded from this thread, as they
+        # come in, so that the manifest covers the images handled even if
+        # the command is interrupted
+        try:
+            with open(manifest_path, 'wb') as f:
+                writer = csv.writer(f)
+                writer.writerow(('url', 'path', 'result'))
+
+                for url, path, result in pool.imap_unordered(copy, jobs):
+                    writer.writerow((url, path, result))
+                    counts[result.split(':')[0]] += 1
+                    self.stdout.write('{} {}'.format(path, result))
+
+        finally:
+            pool.close()
+            pool.join()
+
+        self.stdout.write('{} copied, {} skipped, {} failed (see {})'
+                          .format(counts['copied'], counts['skipped'],
+                                  counts['failed'], manifest_path))
+
+        if counts['failed']:
+            raise CommandError('{} images failed to copy; run again with '
+                               '--resume to retry them'
+                               .format(counts['failed']))
+
+
+def _copy_image(session, url, path, retries, backoff):
+    """
+    Copy the image at url to path.
+
+    Returns 'copied', 'skipped' (if path already has the image), or
+    'failed: <reason>'.
+    """
+    reason = None
+
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff * 2 ** (attempt - 1))
+
+        try:
+            if os.path.exists(path):
+                r = session.head(url, timeout=TIMEOUT)
+                if (r.status_code == 200 and
+                        r.headers.get('content-length') ==
+                        str(os.path.getsize(path))):
+                    return 'skipped'
+
+            r = session.get(url, stream=True, timeout=TIMEOUT)
+
             if r.status_code != 200:
-                raise CommandError('non-ok GET status for {}'
-                                   .format(input_image_url))
+                r.close()
+                reason = 'non-ok GET status {}'.format(r.status_code)
 
-            with open(output_image_path, 'wb') as f:
+                # Only server errors are worth retrying
+                if r.status_code < 500:
+                    break
+
+                continue
+
+            # Write to a temporary file first, so that an interrupted
+            # download is never mistaken for a complete image
+            temporary_path = path + '.part'
+            with open(temporary_path, 'wb') as f:
                 r.raw.decode_content = True
                 shutil.copyfileobj(r.raw, f)
 
-            self.stdout.write('{} written'.format(output_image_path))
+            os.rename(temporary_path, path)
+            return 'copied'
+
+        except (requests.RequestException, IOError) as e:
+            reason = str(e) or e.__class__.__name__
+
+    return 'failed: {}'.format(reason)
@@ -0,0 +1,161 @@
+import os
+from collections import Counter
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from experiments.helpers.image_pyramid import (SIZES, get_pyramid_path,
+                                               get_source_path)
+from experiments.models import Experiment
+from utils.well_tile_conversion import well_to_tile
+
+JPEG_QUALITY = 85
+
+
+class Command(BaseCommand):
+    """
+    Command to generate the image pyramid from the raw .bmp images.
+
+    For each experiment well, reads its raw image (under BASE_DIR_IMG)
+    and saves a .jpg at each of the pyramid sizes (under
+    BASE_DIR_PYRAMID; see experiments.helpers.image_pyramid). Each level
+    is resized from the level above it, rather than from the raw image.
+
+    Images are processed by --jobs processes. This is incremental: a
+    pyramid image is only regenerated if it is older than its raw image,
+    unless --force is used.
+
+    Wells whose raw image is missing are reported as missing; they do not
+    stop the other images from being processed.
+    """
+
+    help = 'Generate multi-resolution thumbnails from the raw images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('plates',
+                            nargs='*',
+                            type=int,
+                            help='Limit to these experiment plates')
+
+        parser.add_argument('--jobs',
+                            dest='jobs',
+                            type=int,
+                            default=1,
+                            help='Number of worker processes')
+
+        parser.add_argument('--force',
+                            dest='force',
+                            action='store_true',
+                            default=False,
+                            help='Regenerate images that are up to date')
+
+    def handle(self, **options):
+        if not settings.BASE_DIR_IMG or not settings.BASE_DIR_PYRAMID:
+            raise CommandError('BASE_DIR_IMG and BASE_DIR_PYRAMID must be '
+                               'set in localsettings')
+
+        experiments = Experiment.objects.all()
+
+        if options['plates']:
+            experiments = experiments.filter(plate__in=options['plates'])
+
+        tasks = []
+
+        for plate_id, well in (experiments.order_by('plate', 'well')
+                               .values_list('plate', 'well').distinct()):
+            tile = well_to_tile(well)
+            tasks.append((
+                get_source_path(plate_id, tile),
+                [(size, get_pyramid_path(plate_id, tile, size))
+                 for size in SIZES],
+                options['force']))
+
+        if options['jobs'] > 1:
+            pool = Pool(processes=options['jobs'])
+            results = pool.imap_unordered(_generate_pyramid, tasks,
+                                          chunksize=16)
+        else:
+            pool = None
+            results = (_generate_pyramid(task) for task in tasks)
+
+        counts = Counter()
+
+        try:
+            for source_path, result in results:
+                counts[result.split(':')[0]] += 1
+                if result != 'up to date':
+                    self.stdout.write('{} {}'.format(source_path, result))
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        self.stdout.write(
+            '{} generated, {} up to date, {} missing, {} failed'
+            .format(counts['generated'], counts['up to date'],
+                    counts['missing'], counts['failed']))
+
+        if counts['failed']:
+            raise CommandError('{} images failed; see above'
+                               .format(counts['failed']))
+
+
+def _generate_pyramid(task):
+    """
+    Generate the pyramid images for one raw image.
+
+    task should be a 3-tuple of the raw image path, a list of (size,
+    path) tuples for the pyramid images, and whether to regenerate
+    images that are up to date.
+
+    Returns a 2-tuple of the raw image path and 'generated', 'up to
+    date', 'missing', or 'failed: <reason>'.
+    """
+    source_path, levels, force = task
+
+    try:
+        source_mtime = os.path.getmtime(source_path)
+    except OSError:
+        return (source_path, 'missing')
+
+    if not force and all(_is_up_to_date(path, source_mtime)
+                         for size, path in levels):
+        return (source_path, 'up to date')
+
+    try:
+        image = Image.open(source_path)
+        if image.mode not in ('L', 'RGB'):
+            image = image.convert('RGB')
+
+        # Largest first, so that each level is resized from the last
+        for size, path in sorted(levels, reverse=True):
+            image.thumbnail((size, size), Image.ANTIALIAS)
+
+            directory = os.path.dirname(path)
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError:
+                    # Another process may have created it meanwhile
+                    if not os.path.isdir(directory):
+                        raise
+
+            # Write to a temporary file first, so that an interrupted
+            # run never leaves a partial image that looks up to date
+            temporary_path = path + '.part'
+            image.save(temporary_path, 'JPEG', quality=JPEG_QUALITY)
+            os.rename(temporary_path, path)
+
+    except (IOError, OSError) as e:
+        return (source_path, 'failed: {}'.format(e))
+
+    return (source_path, 'generated')
+
+
+def _is_up_to_date(path, source_mtime):
+    try:
+        return os.path.getmtime(path) >= source_mtime
+    except OSError:
+        return False
@@ -1,6 +1,11 @@
+import random
+from multiprocessing import Pool
+
 from django.core.management.base import BaseCommand
+from django.db import connections
 
 from experiments.helpers.criteria import passes_enh_primary
+from library.models import LibraryStock
 from utils.plates import (assign_to_plates, get_plate_assignment_rows,
                           is_symmetric)
 from worms.models import WormStrain
@@ -27,22 +32,51 @@ class Command(BaseCommand):
                             default=False,
                             help='Print summary of counts only')
 
+        parser.add_argument('--use-summaries',
+                            dest='use_summaries',
+                            action='store_true',
+                            default=False,
+                            help='Read the most relevant scores from the '
+                                 'ManualScoreSummary table')
+
+        parser.add_argument('--jobs',
+                            dest='jobs',
+                            type=int,
+                            default=1,
+                            help='Number of worker processes to compute '
+                                 'the positives per worm')
+
+        parser.add_argument('--seed',
+                            dest='seed',
+                            type=int,
+                            default=None,
+                            help='Seed for choosing the random empty wells '
+                                 '(to make the output reproducible)')
+
     def handle(self, **options):
         summary_mode = options['summary']
 
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+
         candidates_by_worm = {}
         candidates_by_clone = {}
-        worms = WormStrain.get_worms_for_screen_type('ENH')
+        worms = list(WormStrain.get_worms_for_screen_type('ENH'))
 
-        for worm in worms:
-            candidates_by_worm[worm] = []
-            singles = worm.get_stocks_tested_by_number_of_replicates(
-                'ENH', 1, 1)
+        pks_per_worm = _get_positive_pks_per_worm(
+            worms, options['jobs'], options['use_summaries'])
 
-            positives = worm.get_positives(
-                'ENH', 1, passes_enh_primary, singles=singles)
+        all_pks = set()
+        for pks in pks_per_worm:
+            all_pks.update(pks)
+        library_stocks = (LibraryStock.objects.select_related('plate')
+                          .in_bulk(all_pks))
 
-            for library_stock in positives:
+        # Merge in worm order, so that the result does not depend on jobs
+        for worm, pks in zip(worms, pks_per_worm):
+            candidates_by_worm[worm] = []
+            for pk in pks:
+                library_stock = library_stocks[pk]
                 candidates_by_worm[worm].append(library_stock)
                 if library_stock not in candidates_by_clone:
                     candidates_by_clone[library_stock] = []
@@ -53,7 +87,7 @@ class Command(BaseCommand):
                               .format(len(candidates_by_clone)))
 
             self.stdout.write('\n\nBefore accounting for universals:')
-            _print_candidates_by_worm(candidates_by_worm)
+            _print_candidates_by_worm(self, candidates_by_worm)
 
         # Move certain clones from individual worm lists to universal
         candidates_by_worm['universal'] = []
@@ -66,7 +100,7 @@ class Command(BaseCommand):
 
         if summary_mode:
             self.stdout.write('\n\nAfter accounting for universals:')
-            _print_candidates_by_worm(candidates_by_worm)
+            _print_candidates_by_worm(self, candidates_by_worm)
             return
 
         # Create official cherrypick list, with random empty wells
@@ -85,8 +119,9 @@ class Command(BaseCommand):
                 empties_per_plate = 2
                 empties_limit = None
 
+            # Sort by pk (LibraryStock does not define an ordering)
             assigned = assign_to_plates(
-                sorted(candidates),
+                sorted(candidates, key=lambda x: x.pk),
                 vertical=True,
                 empties_per_plate=empties_per_plate,
                 empties_limit=empties_limit,
@@ -146,6 +181,42 @@ class Command(BaseCommand):
             seen.add(wells)
 
 
+def _get_positive_pks_per_worm(worms, jobs=1, use_summaries=False):
+    """
+    Get the pks of the ENH primary positives for each worm in worms.
+
+    Returns a list of sorted pk lists, in the same order as worms.
+
+    If jobs > 1, the worms are split among that many worker processes.
+    """
+    args = [(worm.pk, use_summaries) for worm in worms]
+
+    if jobs <= 1:
+        return [_get_positive_pks(x) for x in args]
+
+    # Each worker must open its own database connection, rather than
+    # sharing the parent's across the fork
+    connections.close_all()
+    pool = Pool(processes=jobs, initializer=connections.close_all)
+    try:
+        return pool.map(_get_positive_pks, args)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _get_positive_pks(args):
+    worm_pk, use_summaries = args
+    worm = WormStrain.objects.get(pk=worm_pk)
+    singles = worm.get_stocks_tested_by_number_of_replicates('ENH', 1, 1)
+
+    positives = worm.get_positives(
+        'ENH', 1, passes_enh_primary, singles=singles,
+        use_summaries=use_summaries)
+
+    return sorted(x.pk for x in positives)
+
+
 def _print_candidates_by_worm(command, candidates_by_worm):
     total = 0
     for worm in sorted(candidates_by_worm):
@@ -1,9 +1,9 @@
 from django.core.management.base import BaseCommand
 
 from experiments.helpers.criteria import passes_sup_secondary_stringent
+from experiments.helpers.scores import get_positives_by_worm
 from library.helpers.sequencing import categorize_sequences_by_blat_results
 from library.models import LibrarySequencing
-from worms.models import WormStrain
 
 
 class Command(BaseCommand):
@@ -23,6 +23,13 @@ class Command(BaseCommand):
                             default=False,
                             help='Print summary only')
 
+        parser.add_argument('--use-summaries',
+                            dest='use_summaries',
+                            action='store_true',
+                            default=False,
+                            help='Read the most relevant scores from the '
+                                 'ManualScoreSummary table')
+
     def handle(self, **options):
         if options['summary']:
             summary_mode = True
@@ -39,9 +46,10 @@ class Command(BaseCommand):
         # BLAT hit is an amplicon for the intended clone)
         verified = set(x.source_stock for x in seqs_blat[1])
 
-        # Get all SUP worm strains
-        worms = WormStrain.objects.exclude(
-            restrictive_temperature__isnull=True)
+        # Get the positives for all SUP worm strains in one pass
+        positives_by_worm = get_positives_by_worm(
+            'SUP', 2, passes_sup_secondary_stringent,
+            use_summaries=options['use_summaries'])
 
         verified_doublecheck = set()
         num_interactions_by_well = 0
@@ -50,10 +58,7 @@ class Command(BaseCommand):
         # For each worm, find the intersection of verified positives,
         # and add to the list of interactions
         w = {}
-        for worm in worms:
-            positives = worm.get_positives('SUP', 2,
-                                           passes_sup_secondary_stringent)
-
+        for worm, positives in positives_by_worm.iteritems():
             pos_verified = positives.intersection(verified)
 
             verified_doublecheck.update(pos_verified)
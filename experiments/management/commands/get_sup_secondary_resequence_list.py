@@ -29,8 +29,14 @@ class Command(BaseCommand):
             '--empties-per-plate', type=int, default=0,
             help='Number of empty wells per output plate')
 
+        parser.add_argument(
+            '--use-summaries', action='store_true', default=False,
+            help='Read the most relevant scores from the '
+                 'ManualScoreSummary table')
+
     def handle(self, **options):
-        positives = get_positives_any_worm('SUP', 2, criteria)
+        positives = get_positives_any_worm(
+            'SUP', 2, criteria, use_summaries=options['use_summaries'])
 
         seqs = (LibrarySequencing.objects
                 .filter(source_stock__in=positives)
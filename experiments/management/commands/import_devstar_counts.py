@@ -1,20 +1,60 @@
-from itertools import chain
+import hashlib
 import os
+from itertools import groupby
+from multiprocessing import Pool
 
-from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
 
-from experiments.models import Experiment, DevstarScore
+from experiments.models import (DevstarImportWatermark, DevstarScore,
+                                Experiment, ExperimentPlate)
 from utils.scripting import require_db_write_acknowledgement
+from utils.sql import bulk_update
 
 
 PATTERNS = ('bacteria', 'W', 'LC', 'EC', 'NewcntW', 'NewcntL')
 
+PATTERN_INDICES = {pattern: i for i, pattern in enumerate(PATTERNS)}
+
+RAW_FIELDS = ('is_bacteria_present', 'area_adult', 'area_larva',
+              'area_embryo', 'count_adult', 'count_larva')
+
 
 class Command(BaseCommand):
-    help = ('WORK IN PROGRESS -- does not yet save anything to database. '
-            'Waiting on Lior to normalize cnt.txt output. '
-            'Parse DevStaR txt output, to add to this database.')
+    """
+    Command to import DevStaR counts into the database.
+
+    Parses the DevStaR output for each experiment (a cnt.txt file under
+    BASE_DIR_DEVSTAR_OUTPUT; see Experiment.get_devstar_count_path) and
+    saves it as a DevstarScore, deriving the other DevstarScore fields
+    (see DevstarScore.clean).
+
+    Experiments are handled --batch-size plates at a time. The files of
+    each batch are parsed one plate per task, by --jobs processes. Then
+    any existing DevstarScores for the batch are read in one query, new
+    ones are inserted in bulk, and existing ones lacking DevStaR output
+    are updated in bulk.
+
+    Each line of a file is matched to a pattern by its first token
+    (that is, after any leading whitespace; see _get_pattern_index),
+    rather than by the whole line starting with the pattern. An
+    experiment whose file is missing, or has a line whose count cannot
+    be parsed, is skipped with a warning, rather than stopping the
+    import.
+
+    An existing DevstarScore whose DevStaR output does not match its
+    file is reported and left alone, and the command fails at the end.
+
+    With --incremental, only plates whose DevStaR output files changed
+    since they were last imported with --incremental are parsed. This
+    is judged first by the files' names, sizes, and modification times,
+    then by their contents (see DevstarImportWatermark). The first
+    incremental run parses every plate, to record where things stand.
+    """
+
+    help = 'Parse DevStaR txt output, to add to this database.'
 
     def add_arguments(self, parser):
         parser.add_argument('--all', action='store_true', dest='all',
@@ -23,89 +63,346 @@ class Command(BaseCommand):
                                   'those without DevStaR counts in the '
                                   'database'))
 
+        parser.add_argument('--incremental',
+                            dest='incremental',
+                            action='store_true',
+                            default=False,
+                            help='Parse only the plates whose DevStaR '
+                                 'files changed since the last '
+                                 'incremental import')
+
+        parser.add_argument('--plates',
+                            dest='plates',
+                            nargs='+',
+                            type=int,
+                            help='Limit to these experiment plates')
+
+        parser.add_argument('--jobs',
+                            dest='jobs',
+                            type=int,
+                            default=1,
+                            help='Number of worker processes to parse '
+                                 'the DevStaR files')
+
+        parser.add_argument('--batch-size',
+                            dest='batch_size',
+                            type=int,
+                            default=50,
+                            help='Number of experiment plates to parse '
+                                 'and save per transaction')
+
     def handle(self, **options):
         require_db_write_acknowledgement()
-        return
 
-        if options['all']:
-            experiments = Experiment.objects.all()
+        experiments = Experiment.objects.all()
+
+        if options['plates']:
+            experiments = experiments.filter(plate__in=options['plates'])
+
+        if options['incremental']:
+            self.watermarks = {
+                watermark.pk: watermark
+                for watermark in DevstarImportWatermark.objects.all()}
+            self.file_signatures = self._get_changed_file_signatures(
+                options['plates'])
+            plate_pks = sorted(self.file_signatures)
+
         else:
-            null_devstar_experiment_pks = (
-                DevstarScore.objects.filter(
-                    area_adult__isnull=True,
-                    area_larva__isnull=True,
-                    area_embryo__isnull=True)
-                .values_list('experiment', flat=True))
-
-            null_devstar_experiments = Experiment.objects.filter(
-                pk__in=null_devstar_experiment_pks)
-
-            all_devstar_experiment_pks = (
-                DevstarScore.objects.all()
-                .values_list('experiment', flat=True))
-
-            no_devstar_experiments = Experiment.objects.exclude(
-                pk__in=all_devstar_experiment_pks)
-
-            experiments = sorted(
-                chain(null_devstar_experiments, no_devstar_experiments),
-                key=lambda instance: instance.id)
-
-        for experiment in experiments:
-            path = experiment.get_devstar_count_path()
-
-            if not os.path.isfile(path):
-                self.stderr.write('WARNING: Skipping experiment {} due to '
-                                  'DevStaR file not found'
-                                  .format(experiment))
+            if not options['all']:
+                experiments = experiments.filter(
+                    Q(devstarscore__isnull=True) |
+                    Q(devstarscore__area_adult__isnull=True,
+                      devstarscore__area_larva__isnull=True,
+                      devstarscore__area_embryo__isnull=True))
+
+            plate_pks = list(experiments.order_by('plate')
+                             .values_list('plate', flat=True).distinct())
+
+        if options['jobs'] > 1:
+            pool = Pool(processes=options['jobs'])
+            parse = pool.map
+        else:
+            pool = None
+            parse = map
+
+        self.totals = {'created': 0, 'updated': 0, 'unchanged': 0,
+                       'mismatched': 0, 'skipped': 0}
+
+        batch_size = options['batch_size']
+
+        try:
+            for i in range(0, len(plate_pks), batch_size):
+                batch_plate_pks = plate_pks[i:i + batch_size]
+                rows = (experiments
+                        .filter(plate__in=batch_plate_pks)
+                        .order_by('plate', 'well')
+                        .values_list('pk', 'plate', 'well').distinct())
+
+                # One task per plate
+                tasks = [
+                    (plate_pk,
+                     [(pk, Experiment(plate_id=plate_pk, well=well)
+                       .get_devstar_count_path())
+                      for pk, plate_pk, well in plate_rows])
+                    for plate_pk, plate_rows in groupby(
+                        rows, key=lambda x: x[1])]
+
+                parsed = parse(_parse_plate, tasks)
+
+                if options['incremental']:
+                    self._save_incremental_batch(parsed)
+                else:
+                    self._save_batch(parsed)
+
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        self.stdout.write(
+            '{created} created, {updated} updated, {unchanged} unchanged, '
+            '{mismatched} mismatched, {skipped} skipped'
+            .format(**self.totals))
+
+        if self.totals['mismatched']:
+            raise CommandError('{} DevStaR outputs did not match the '
+                               'database; see warnings above'
+                               .format(self.totals['mismatched']))
+
+    def _get_changed_file_signatures(self, plate_pks=None):
+        """
+        Get the file signatures of the plates with changed DevStaR files.
+
+        Looks at every plate with a DevStaR output directory (optionally
+        limited to plate_pks), returning a dictionary mapping the pk of
+        each plate whose file signature differs from its watermark to its
+        new file signature.
+        """
+        plates = ExperimentPlate.objects.all()
+        if plate_pks:
+            plates = plates.filter(pk__in=plate_pks)
+        plate_pks = set(plates.values_list('pk', flat=True))
+
+        signatures = {}
+
+        for name in os.listdir(settings.BASE_DIR_DEVSTAR_OUTPUT):
+            try:
+                plate_pk = int(name)
+            except ValueError:
+                continue
+
+            if plate_pk not in plate_pks:
+                continue
+
+            signature = _get_file_signature(
+                os.path.join(settings.BASE_DIR_DEVSTAR_OUTPUT, name))
+            watermark = self.watermarks.get(plate_pk)
+
+            if watermark is None or watermark.file_signature != signature:
+                signatures[plate_pk] = signature
+
+        return signatures
+
+    def _save_incremental_batch(self, parsed):
+        """
+        Save a batch of parsed plates, updating their watermarks.
+
+        Plates whose file contents match their watermarks are not saved
+        again. Plates with DevStaR output that does not match the
+        database do not get a new watermark, so that they are parsed
+        (and reported) again next time.
+        """
+        changed = []
+        for plate_pk, results, content_hash in parsed:
+            watermark = self.watermarks.get(plate_pk)
+            if watermark and watermark.content_hash == content_hash:
+                self.totals['unchanged'] += sum(
+                    1 for experiment_pk, counts, warnings in results
+                    if counts is not None)
+            else:
+                changed.append((plate_pk, results, content_hash))
+
+        mismatched = self._save_batch(changed)
+
+        watermarks = [
+            DevstarImportWatermark(
+                plate_id=plate_pk, content_hash=content_hash,
+                file_signature=self.file_signatures[plate_pk])
+            for plate_pk, results, content_hash in parsed
+            if plate_pk not in mismatched]
+
+        with transaction.atomic():
+            DevstarImportWatermark.objects.filter(
+                pk__in=[watermark.pk for watermark in watermarks]).delete()
+            DevstarImportWatermark.objects.bulk_create(watermarks)
+
+    def _save_batch(self, parsed):
+        """
+        Save a batch of parsed plates.
+
+        parsed should be a list of (plate_pk, results, content_hash)
+        tuples, as returned by _parse_plate.
+
+        Returns the set of plates with DevStaR output that does not match
+        the database.
+        """
+        plate_pks = [plate_pk for plate_pk, results, content_hash in parsed]
+        existing = {}
+        for score in DevstarScore.objects.filter(
+                experiment__plate__in=plate_pks):
+            existing.setdefault(score.experiment_id, []).append(score)
+
+        batch = [(plate_pk, experiment_pk, counts, warnings)
+                 for plate_pk, results, content_hash in parsed
+                 for experiment_pk, counts, warnings in results]
+
+        to_create = []
+        to_update = []
+        mismatched = set()
+
+        for plate_pk, experiment_pk, counts, warnings in batch:
+            for warning in warnings:
+                self.stderr.write('WARNING: {}'.format(warning))
+
+            if counts is None:
+                self.totals['skipped'] += 1
+                continue
+
+            new_score = DevstarScore(experiment_id=experiment_pk,
+                                     **dict(zip(RAW_FIELDS, counts)))
+            new_score.clean()
+
+            previous_scores = existing.get(experiment_pk)
+
+            if not previous_scores:
+                to_create.append(new_score)
                 continue
 
-            counts = [None] * 6
+            for previous_score in previous_scores:
+                if previous_score.matches_raw_fields(new_score):
+                    self.totals['unchanged'] += 1
+
+                elif _lacks_raw_fields(previous_score):
+                    for field in RAW_FIELDS + DevstarScore.DERIVED_FIELDS:
+                        setattr(previous_score, field,
+                                getattr(new_score, field))
+                    to_update.append(previous_score)
+
+                else:
+                    mismatched.add(plate_pk)
+                    self.totals['mismatched'] += 1
+                    self.stderr.write('WARNING: The DevStaR txt output '
+                                      'does not match the existing '
+                                      'database entry for Experiment {}'
+                                      .format(experiment_pk))
+
+        with transaction.atomic():
+            DevstarScore.objects.bulk_create(to_create)
+            bulk_update(to_update, RAW_FIELDS + DevstarScore.DERIVED_FIELDS)
+
+        self.totals['created'] += len(to_create)
+        self.totals['updated'] += len(to_update)
+
+        return mismatched
+
+
+def _lacks_raw_fields(score):
+    return (score.area_adult is None and score.area_larva is None and
+            score.area_embryo is None)
+
+
+def _get_file_signature(directory):
+    """
+    Get a signature of the DevStaR output files in directory.
+
+    The signature is based on each file's name, size, and modification
+    time, so that it can be computed without reading the files.
+    """
+    sha1 = hashlib.sha1()
 
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('cnt.txt'):
+            stat = os.stat(os.path.join(directory, name))
+            sha1.update('{} {} {!r}\n'.format(name, stat.st_size,
+                                              stat.st_mtime))
+
+    return sha1.hexdigest()
+
+
+def _parse_plate(task):
+    """
+    Parse the DevStaR output files for one experiment plate.
+
+    task should be a 2-tuple of the plate pk and a list of
+    (experiment_pk, path) tuples.
+
+    Returns a 3-tuple of the plate pk, a list of (experiment_pk, counts,
+    warnings) tuples, where counts is a list of the counts for PATTERNS
+    (None if the file could not be parsed), and a SHA-1 of the files'
+    contents.
+    """
+    plate_pk, experiments = task
+    sha1 = hashlib.sha1()
+    results = []
+
+    for experiment_pk, path in experiments:
+        try:
             with open(path, 'r') as f:
-                for line in f:
-                    for i, pattern in enumerate(PATTERNS):
-                        if line.startswith(pattern):
-                            try:
-                                counts[i] = int(line.split()[1])
-                            except Exception:
-                                raise CommandError('Error parsing line {} '
-                                                   'in experiment {}'
-                                                   .format(i, experiment))
-
-            for i, count in enumerate(counts):
-                if count is None:
-                    self.stderr.write('WARNING: {} count is missing '
-                                      'for experiment {}'
-                                      .format(PATTERNS[i], experiment))
-
-            new_score = DevstarScore(
-                experiment=experiment,
-                is_bacteria_present=counts[0], area_adult=counts[1],
-                area_larva=counts[2], area_embryo=counts[3],
-                count_adult=counts[4], count_larva=counts[5],
-            )
-
-            # If score already exists in database, check for match
-            try:
-                previous_score = DevstarScore.objects.get(
-                    experiment=experiment)
-
-                if not previous_score.matches_raw_fields(new_score):
-                    raise CommandError('The DevStaR txt output does '
-                                       'not match the existing database '
-                                       'entry for Experiment {}'
-                                       .format(experiment))
-
-            except ObjectDoesNotExist:
-                self.stderr.write('DevStaR object not found for {}. '
-                                  'Attempting to save.'
-                                  .format(experiment))
-                try:
-                    new_score.full_clean()
-
-                except ValidationError:
-                    raise CommandError('Cleaning DevStaR object {} '
-                                       'raised ValidationError'
-                                       .format(new_score))
-                # new_score.save()
+                contents = f.read()
+        except IOError:
+            contents = None
+
+        sha1.update('{}\n{!r}\n'.format(path, contents))
+        results.append((experiment_pk,) +
+                       _parse_count_file(experiment_pk, contents))
+
+    return (plate_pk, results, sha1.hexdigest())
+
+
+def _parse_count_file(experiment_pk, contents):
+    """
+    Parse the contents of one DevStaR output file.
+
+    contents should be None if the file does not exist.
+
+    Returns a 2-tuple of the counts for PATTERNS (None if the file is
+    missing or could not be parsed) and a list of warnings.
+    """
+    if contents is None:
+        return (None, ['Skipping experiment {} due to DevStaR file not '
+                       'found'.format(experiment_pk)])
+
+    counts = [None] * len(PATTERNS)
+
+    for line_number, line in enumerate(contents.splitlines()):
+        parts = line.split()
+        if not parts:
+            continue
+
+        i = _get_pattern_index(parts[0])
+        if i is None:
+            continue
+
+        try:
+            counts[i] = int(parts[1])
+        except (IndexError, ValueError):
+            return (None, ['Skipping experiment {} due to error '
+                           'parsing line {}'
+                           .format(experiment_pk, line_number)])
+
+    warnings = ['{} count is missing for experiment {}'
+                .format(PATTERNS[i], experiment_pk)
+                for i, count in enumerate(counts) if count is None]
+
+    return (counts, warnings)
+
+
+def _get_pattern_index(token):
+    """Get the index of the pattern that token starts with, if any."""
+    try:
+        return PATTERN_INDICES[token]
+    except KeyError:
+        for i, pattern in enumerate(PATTERNS):
+            if token.startswith(pattern):
+                return i
+        return None
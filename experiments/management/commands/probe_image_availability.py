@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from experiments.helpers.image_availability import (
+    MODES, TIMEOUT, check_urls)
+from experiments.models import Experiment
+
+
+class Command(BaseCommand):
+    """
+    Command to check which images exist on the image server.
+
+    Checks the images of whole experiment plates, caching the results
+    (see experiments.helpers.image_availability), so that pages showing
+    those experiments need not wait on the image server. Run this
+    periodically, or after uploading new images.
+
+    Plates can be chosen by id, or by date.
+    """
+
+    help = 'Check which experiment images exist on the image server.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('plates',
+                            nargs='*',
+                            type=int,
+                            help='Ids of the experiment plates to check')
+
+        parser.add_argument('--date',
+                            dest='date',
+                            default=None,
+                            help='Check all plates from date (YYYY-MM-DD)')
+
+        parser.add_argument('--mode',
+                            dest='modes',
+                            action='append',
+                            choices=MODES,
+                            help='Kind of image to check (can be repeated; '
+                                 'defaults to all)')
+
+        parser.add_argument('--threads',
+                            dest='threads',
+                            type=int,
+                            default=8,
+                            help='Number of concurrent requests')
+
+        parser.add_argument('--timeout',
+                            dest='timeout',
+                            type=float,
+                            default=TIMEOUT,
+                            help='Seconds to wait on the image server '
+                                 'per request')
+
+    def handle(self, **options):
+        if not options['plates'] and not options['date']:
+            raise CommandError('Supply plate ids, or --date')
+
+        experiments = Experiment.objects.all()
+
+        if options['plates']:
+            experiments = experiments.filter(plate__in=options['plates'])
+
+        if options['date']:
+            experiments = experiments.filter(plate__date=options['date'])
+
+        modes = options['modes'] or MODES
+        urls = [experiment.get_image_url(mode=mode)
+                for experiment in experiments for mode in modes]
+
+        results = check_urls(urls, timeout=options['timeout'],
+                             threads=options['threads'])
+
+        num_available = sum(results.values())
+        self.stdout.write('{} of {} images available'
+                          .format(num_available, len(results)))
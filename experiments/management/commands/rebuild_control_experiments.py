@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from experiments.models import ControlExperiment
+
+
+class Command(BaseCommand):
+    """
+    Command to rebuild the ControlExperiment index.
+
+    The index is normally kept up to date as experiments and plates are
+    saved, and is populated by the migration that adds it. Run this after
+    experiments are added or changed in ways that bypass saving them one
+    at a time (e.g. QuerySet.update, or bulk inserts by hand).
+    """
+
+    help = 'Rebuild the index of L4440 and N2 control experiments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size',
+                            dest='batch_size',
+                            type=int,
+                            default=1000,
+                            help='Number of controls to insert per query')
+
+    def handle(self, **options):
+        num_created = ControlExperiment.rebuild(
+            batch_size=options['batch_size'])
+
+        self.stdout.write('{} control experiments indexed'
+                          .format(num_created))
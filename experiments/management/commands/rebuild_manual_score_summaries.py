@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from experiments.models import ManualScoreSummary
+
+
+class Command(BaseCommand):
+    """
+    Command to rebuild the ManualScoreSummary table.
+
+    The summaries are normally kept up to date as scores are submitted
+    through the scoring interface. Run this to populate the table for the
+    first time, or after scores are added or deleted some other way
+    (e.g. the admin, or a database import).
+    """
+
+    help = 'Rebuild the most relevant manual score per experiment.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size',
+                            dest='batch_size',
+                            type=int,
+                            default=1000,
+                            help='Number of summaries to insert per query')
+
+    def handle(self, **options):
+        num_created = ManualScoreSummary.rebuild(
+            batch_size=options['batch_size'])
+
+        self.stdout.write('{} experiment summaries created'
+                          .format(num_created))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from experiments.models import DevstarScore
+
+
+class Command(BaseCommand):
+    """
+    Command to recompute the fields derived from DevStaR output.
+
+    Run this after changing how the DevstarScore fields are derived
+    (see DevstarScore.get_derived_fields), e.g. changing
+    EMBRYO_AREA_DIVISOR. Only the scores whose derived fields change are
+    saved.
+    """
+
+    help = 'Recompute the DevStaR fields derived from DevStaR output.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size',
+                            dest='batch_size',
+                            type=int,
+                            default=5000,
+                            help='Number of scores to read per query')
+
+    def handle(self, **options):
+        num_changed = DevstarScore.recompute_derived_fields(
+            batch_size=options['batch_size'])
+
+        self.stdout.write('{} DevStaR scores changed'.format(num_changed))
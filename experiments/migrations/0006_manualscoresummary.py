@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.2 on 2026-10-17 18:58
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('experiments', '0005_auto_20160729_2142'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ManualScoreSummary',
+            fields=[
+                ('experiment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='experiments.Experiment')),
+                ('category', models.PositiveSmallIntegerField(db_index=True)),
+                ('num_scorers', models.PositiveSmallIntegerField()),
+                ('score', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='experiments.ManualScore')),
+                ('score_code', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='experiments.ManualScoreCode')),
+            ],
+            options={
+                'ordering': ['experiment'],
+                'db_table': 'ManualScoreSummary',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.2 on 2026-10-17 19:03
+from __future__ import unicode_literals
+
+import random
+
+from django.db import migrations, models
+import experiments.models
+
+
+def populate_random_keys(apps, schema_editor):
+    """
+    Give each existing experiment its own random key.
+
+    (AddField evaluates the default only once, giving every existing
+    row the same key.)
+    """
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('UPDATE Experiment SET random_key = RAND()')
+        return
+
+    Experiment = apps.get_model('experiments', 'Experiment')
+    for pk in Experiment.objects.values_list('pk', flat=True).iterator():
+        Experiment.objects.filter(pk=pk).update(random_key=random.random())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('experiments', '0006_manualscoresummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='experiment',
+            name='random_key',
+            field=models.FloatField(db_index=True, default=experiments.models.get_random_key, editable=False),
+        ),
+        migrations.RunPython(populate_random_keys,
+                             migrations.RunPython.noop),
+    ]
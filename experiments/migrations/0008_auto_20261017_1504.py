@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.2 on 2026-10-17 19:04
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('experiments', '0007_experiment_random_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoringQueue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('num_unqueued', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'ScoringQueue',
+            },
+        ),
+        migrations.CreateModel(
+            name='ScoringQueueItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('leased_until', models.DateTimeField(blank=True, default=None, null=True)),
+                ('is_done', models.BooleanField(default=False)),
+                ('experiment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='experiments.Experiment')),
+                ('queue', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='experiments.ScoringQueue')),
+            ],
+            options={
+                'ordering': ['queue', 'position'],
+                'db_table': 'ScoringQueueItem',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='scoringqueueitem',
+            unique_together=set([('queue', 'experiment')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='scoringqueueitem',
+            index_together=set([('queue', 'is_done', 'position')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='scoringqueue',
+            unique_together=set([('user', 'key')]),
+        ),
+    ]
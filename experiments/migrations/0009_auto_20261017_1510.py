@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.2 on 2026-10-17 19:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Q
+import django.db.models.deletion
+
+
+def populate_control_experiments(apps, schema_editor):
+    """
+    Index the existing control experiments.
+
+    (Mirrors ControlExperiment.rebuild, which historical models lack.)
+    """
+    Experiment = apps.get_model('experiments', 'Experiment')
+    ControlExperiment = apps.get_model('experiments', 'ControlExperiment')
+
+    rows = (Experiment.objects
+            .filter(Q(worm_strain='N2') |
+                    Q(library_stock__intended_clone='L4440'),
+                    is_junk=False)
+            .values_list('pk', 'plate__date', 'plate__temperature',
+                         'worm_strain', 'library_stock',
+                         'library_stock__intended_clone'))
+
+    batch = []
+
+    for (experiment_pk, date, temperature, worm_pk, stock_pk,
+         clone_pk) in rows.iterator():
+        batch.append(ControlExperiment(
+            experiment_id=experiment_pk, date=date, temperature=temperature,
+            worm_strain_id=worm_pk, library_stock_id=stock_pk,
+            is_l4440=(clone_pk == 'L4440'), is_n2=(worm_pk == 'N2')))
+
+        if len(batch) >= 1000:
+            ControlExperiment.objects.bulk_create(batch)
+            batch = []
+
+    ControlExperiment.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('worms', '0003_auto_20160729_2216'),
+        ('library', '0009_auto_20160224_0452'),
+        ('experiments', '0008_auto_20261017_1504'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ControlExperiment',
+            fields=[
+                ('experiment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='experiments.Experiment')),
+                ('date', models.DateField()),
+                ('temperature', models.DecimalField(decimal_places=1, max_digits=3)),
+                ('is_l4440', models.BooleanField()),
+                ('is_n2', models.BooleanField()),
+                ('library_stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='library.LibraryStock')),
+                ('worm_strain', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='worms.WormStrain')),
+            ],
+            options={
+                'ordering': ['experiment'],
+                'db_table': 'ControlExperiment',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='controlexperiment',
+            index_together=set([('date', 'worm_strain', 'temperature'), ('date', 'library_stock')]),
+        ),
+        migrations.RunPython(populate_control_experiments,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.2 on 2026-10-17 19:17
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('experiments', '0009_auto_20261017_1510'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DevstarImportWatermark',
+            fields=[
+                ('plate', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='experiments.ExperimentPlate')),
+                ('file_signature', models.CharField(max_length=40)),
+                ('content_hash', models.CharField(max_length=40)),
+                ('imported', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['plate'],
+                'db_table': 'DevstarImportWatermark',
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.2 on 2026-10-17 19:55
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('experiments', '0010_devstarimportwatermark'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='devstarscore',
+            name='count_embryo',
+            field=models.IntegerField(blank=True, help_text=b'area_embryo // EMBRYO_AREA_DIVISOR (see get_derived_fields)', null=True),
+        ),
+    ]
@@ -1,19 +1,31 @@
 from __future__ import division
+import hashlib
+import random
+import urllib
+from datetime import timedelta
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
-from django.db import models
-from django.db.models import Case, When
+from django.db import IntegrityError, models, transaction
+from django.db.models import Max, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 
 from clones.models import Clone
+from experiments.helpers.image_pyramid import (
+    get_pyramid_size, get_pyramid_url, is_pyramid_enabled)
 from experiments.helpers.naming import generate_experiment_id
 from experiments.helpers.scores import get_most_relevant_score_per_experiment
+from experiments.helpers.secondary_scores import (
+    clear_secondary_scores, invalidate_secondary_scores)
 from library.models import LibraryPlate, LibraryStock
 from utils.comparison import get_closest_candidate
 from utils.http import build_url
 from utils.plates import get_well_list
+from utils.references import cached_reference
+from utils.sql import bulk_update
 from utils.well_tile_conversion import well_to_tile
 from worms.models import WormStrain
 
@@ -95,9 +107,10 @@ class ExperimentPlate(models.Model):
 
     def set_worm_strain(self, worm_strain):
         """Set the worm strain for all wells in this plate."""
-        for experiment in self.experiment_set.all():
-            experiment.worm_strain = worm_strain
-            experiment.save()
+        # Before the update, to also invalidate the previous worms
+        worm_pks = self._get_worm_pks()
+        self.experiment_set.update(worm_strain=worm_strain)
+        self._update_derived_data(worm_pks)
 
     def get_library_plates(self):
         """
@@ -122,10 +135,12 @@ class ExperimentPlate(models.Model):
         to experiment_plate positions.
         """
         stocks_by_well = library_plate.get_stocks_as_dictionary()
-        for experiment in self.experiment_set.all():
+        experiments = list(self.experiment_set.all())
+        for experiment in experiments:
             well = experiment.well
             experiment.library_stock = stocks_by_well[well]
-            experiment.save()
+        bulk_update(experiments, ('library_stock',))
+        self._update_derived_data()
 
     def has_junk(self):
         """
@@ -136,9 +151,25 @@ class ExperimentPlate(models.Model):
 
     def set_junk(self, is_junk):
         """Set the junk field for all wells in this plate."""
-        for experiment in self.experiment_set.all():
-            experiment.is_junk = is_junk
-            experiment.save()
+        self.experiment_set.update(is_junk=is_junk)
+        self._update_derived_data()
+
+    def _get_worm_pks(self):
+        return set(self.experiment_set.values_list('worm_strain', flat=True))
+
+    def _update_derived_data(self, worm_pks=()):
+        """
+        Update what is derived from this plate's wells, after bulk changes.
+
+        The set_ methods change the wells in bulk, bypassing the signals
+        that would otherwise do this once per well. So this rebuilds the
+        plate's ControlExperiment index, and invalidates the cached
+        secondary scores of the plate's worms (plus worm_pks).
+        """
+        for worm_pk in self._get_worm_pks() | set(worm_pks):
+            invalidate_secondary_scores(worm_pk, self.temperature)
+
+        ControlExperiment.rebuild(experiments=self.experiment_set.all())
 
     @classmethod
     def get_tested_temperatures(cls):
@@ -185,10 +216,17 @@ class ExperimentPlate(models.Model):
         if not dry_run:
             experiment_plate.save()
             Experiment.objects.bulk_create(experiment_wells)
+            ControlExperiment.rebuild(
+                experiments=[well.pk for well in experiment_wells])
 
         return (experiment_plate, experiment_wells)
 
 
+def get_random_key():
+    """Get a random key for a new Experiment (see Experiment.random_key)."""
+    return random.random()
+
+
 class Experiment(models.Model):
     """A well-level experiment."""
 
@@ -200,6 +238,11 @@ class Experiment(models.Model):
     is_junk = models.BooleanField(default=False, db_index=True)
     comment = models.TextField(blank=True)
 
+    # Uniform random number in [0, 1), for fast random sampling
+    # (see get_random_sample)
+    random_key = models.FloatField(default=get_random_key, db_index=True,
+                                   editable=False)
+
     class Meta:
         db_table = 'Experiment'
         ordering = ['plate', 'well']
@@ -243,14 +286,24 @@ class Experiment(models.Model):
     def get_tile(self):
         return well_to_tile(self.well)
 
-    def get_image_url(self, mode=None):
+    def get_image_url(self, mode=None, width=None):
         """
         Get the image url for this experiment.
 
-        Optionally supply mode='thumbnail' or mode='devstar'.
+        Optionally supply mode='thumbnail', mode='devstar', or
+        mode='pyramid'. For mode='pyramid', also supply the width (in
+        pixels) at which the image will be shown, to get the smallest
+        adequate size (see experiments.helpers.image_pyramid). If the
+        pyramid is not enabled, mode='pyramid' gives the thumbnail.
         """
         tile = well_to_tile(self.well)
-        if mode == 'thumbnail':
+        if mode == 'pyramid' and not is_pyramid_enabled():
+            mode = 'thumbnail'
+
+        if mode == 'pyramid':
+            url = get_pyramid_url(self.plate_id, tile,
+                                  get_pyramid_size(width))
+        elif mode == 'thumbnail':
             url = '/'.join((settings.BASE_URL_THUMBNAIL,
                             str(self.plate_id), tile))
             url += '.jpg'
@@ -312,7 +365,7 @@ class Experiment(models.Model):
             'is_junk': False,
             'plate__date': self.date(),
             'plate__temperature': self.temperature(),
-            'worm_strain': self.worm_strain.pk,
+            'worm_strain': self.worm_strain_id,
             'library_stock__intended_clone': Clone.get_l4440(),
         }
 
@@ -333,17 +386,26 @@ class Experiment(models.Model):
 
         N2 controls for this experiment are restricted to those from
         the same date, *closest* temperature, same RNAi clone.
+
+        The closest temperature is found with the ControlExperiment index
+        (None if there are no N2 controls).
         """
         filters = {
             'is_junk': False,
             'plate__date': self.date(),
-            'plate__temperature': self.temperature(),
-            'library_stock': self.library_stock,
+            'library_stock': self.library_stock_id,
             'worm_strain': WormStrain.get_n2().pk,
         }
 
-        filters['plate__temperature'] = Experiment.get_closest_temperature(
-            self.temperature(), filters)
+        temperatures = (ControlExperiment.objects
+                        .filter(is_n2=True, date=self.date(),
+                                library_stock=self.library_stock_id)
+                        .order_by('temperature')
+                        .values_list('temperature', flat=True)
+                        .distinct())
+
+        filters['plate__temperature'] = get_closest_candidate(
+            self.temperature(), temperatures)
 
         return filters
 
@@ -377,6 +439,40 @@ class Experiment(models.Model):
                 .values_list('plate__temperature', flat=True)
                 .distinct())
 
+    @classmethod
+    def get_random_sample(cls, experiments, count):
+        """
+        Get a random sample of count experiments from experiments QuerySet.
+
+        Rather than ordering all of experiments randomly (which makes the
+        database sort them all), this starts at a random point in the
+        indexed random_key column, and takes the next count experiments,
+        wrapping around to the beginning if needed. So the cost depends
+        on count, not on the number of experiments.
+
+        Note that this is a random window of random_key, not an
+        independent sample: experiments with adjacent keys are always
+        sampled together (a given pair of experiments is either often
+        or never in the same sample), and since keys are not evenly
+        spaced, experiments after a large gap are more likely to be
+        sampled. This is fine for picking experiments to score, but not
+        for statistics that assume an independent sample.
+
+        Returns a list, in random order.
+        """
+        start = random.random()
+
+        sample = list(experiments.filter(random_key__gte=start)
+                      .order_by('random_key')[:count])
+
+        if len(sample) < count:
+            sample.extend(experiments.filter(random_key__lt=start)
+                          .order_by('random_key')[:count - len(sample)])
+
+        # Otherwise in random_key order, starting at the same point
+        random.shuffle(sample)
+        return sample
+
     @classmethod
     def get_closest_temperature(cls, goal, filters):
         """
@@ -386,6 +482,97 @@ class Experiment(models.Model):
         return get_closest_candidate(goal, options)
 
 
+class ControlExperiment(models.Model):
+    """
+    Index of the control experiments, for fast control lookups.
+
+    A control experiment is a non-junk experiment with either the L4440
+    clone or the N2 worm strain (or both). Each has the fields needed to
+    find it as a control copied from its plate, worm, and library stock,
+    so that finding the controls for experiments (see
+    Experiment.get_n2_control_filters and the double knockdown page) is
+    a single indexed read.
+
+    It is populated by the migration that adds it, kept up to date as
+    experiments and plates are saved (see update_control_experiments)
+    or added in bulk through the website, and can be rebuilt in bulk
+    (see rebuild). Changes that bypass these (e.g. the legacy database
+    sync) rebuild it themselves.
+    """
+
+    experiment = models.OneToOneField(Experiment, models.CASCADE,
+                                      primary_key=True)
+    date = models.DateField()
+    temperature = models.DecimalField(max_digits=3, decimal_places=1)
+    worm_strain = models.ForeignKey(WormStrain, models.CASCADE)
+    library_stock = models.ForeignKey(LibraryStock, models.CASCADE)
+    is_l4440 = models.BooleanField()
+    is_n2 = models.BooleanField()
+
+    class Meta:
+        db_table = 'ControlExperiment'
+        ordering = ['experiment']
+        index_together = (
+            ('date', 'worm_strain', 'temperature'),
+            ('date', 'library_stock'),
+        )
+
+    def __unicode__(self):
+        return '{} control'.format(self.experiment_id)
+
+    @classmethod
+    def rebuild(cls, experiments=None, batch_size=1000):
+        """
+        Rebuild the index from scratch.
+
+        Optionally supply experiments to limit the rebuild to those
+        experiments (defaults to all experiments).
+
+        Returns the number of control experiments indexed.
+        """
+        n2_pk = WormStrain.get_n2().pk
+        l4440_pk = Clone.get_l4440().pk
+
+        controls = Experiment.objects.filter(
+            Q(worm_strain=n2_pk) | Q(library_stock__intended_clone=l4440_pk),
+            is_junk=False)
+        indexed = cls.objects.all()
+
+        if experiments is not None:
+            controls = controls.filter(pk__in=experiments)
+            indexed = indexed.filter(experiment__in=experiments)
+
+        rows = controls.values_list(
+            'pk', 'plate__date', 'plate__temperature', 'worm_strain',
+            'library_stock', 'library_stock__intended_clone')
+
+        batch = []
+        num_created = 0
+
+        # So that readers never see the index partly rebuilt
+        with transaction.atomic():
+            indexed.delete()
+
+            for (experiment_pk, date, temperature, worm_pk, stock_pk,
+                 clone_pk) in rows.iterator():
+                batch.append(cls(
+                    experiment_id=experiment_pk, date=date,
+                    temperature=temperature, worm_strain_id=worm_pk,
+                    library_stock_id=stock_pk,
+                    is_l4440=(clone_pk == l4440_pk),
+                    is_n2=(worm_pk == n2_pk)))
+
+                if len(batch) >= batch_size:
+                    cls.objects.bulk_create(batch)
+                    num_created += len(batch)
+                    batch = []
+
+            cls.objects.bulk_create(batch)
+            num_created += len(batch)
+
+        return num_created
+
+
 class ManualScoreCode(models.Model):
     """A class of score that could be assigned to an image by a human."""
 
@@ -453,13 +640,44 @@ class ManualScoreCode(models.Model):
         return (not self.is_strong() and not self.is_medium() and
                 not self.is_weak() and not self.is_negative())
 
+    def get_category(self):
+        """Get this score code's more general score category."""
+        if self.is_strong():
+            return ManualScore.STRONG
+        elif self.is_medium():
+            return ManualScore.MEDIUM
+        elif self.is_weak():
+            return ManualScore.WEAK
+        elif self.is_negative():
+            return ManualScore.NEGATIVE
+        else:
+            return ManualScore.OTHER
+
+    def get_relevance_per_replicate(self):
+        """
+        Get the relevance of this score code within an experiment replicate.
+
+        See ManualScore.get_relevance_per_replicate.
+        """
+        return ManualScore.RELEVANCE_PER_REPLICATE.index(self.get_category())
+
     @classmethod
     def get_codes(cls, key):
-        pks = cls._SCORING_PKS[key]
+        codes = cls.get_codes_by_pk()
 
         # This preserves the order of the pks
-        preserved = Case(*[When(pk=pk, then=i) for i, pk in enumerate(pks)])
-        return (cls.objects.filter(pk__in=pks).order_by(preserved))
+        return [codes[pk] for pk in cls._SCORING_PKS[key] if pk in codes]
+
+    @classmethod
+    @cached_reference('experiments.ManualScoreCode')
+    def get_codes_by_pk(cls):
+        """
+        Get all score codes, as a dictionary keyed on pk.
+
+        The dictionary is cached per process (see utils.references), and
+        should not be modified.
+        """
+        return {code.pk: code for code in cls.objects.all()}
 
 
 class ManualScore(models.Model):
@@ -521,16 +739,7 @@ class ManualScore(models.Model):
 
     def get_category(self):
         """Get this score's more general score category."""
-        if self.is_strong():
-            return ManualScore.STRONG
-        elif self.is_medium():
-            return ManualScore.MEDIUM
-        elif self.is_weak():
-            return ManualScore.WEAK
-        elif self.is_negative():
-            return ManualScore.NEGATIVE
-        elif self.is_other():
-            return ManualScore.OTHER
+        return self.score_code.get_category()
 
     def get_weight(self):
         """
@@ -551,8 +760,7 @@ class ManualScore(models.Model):
         This ranking can be used to boil down the multiple scores for
         an experiment to a single most important score.
         """
-        return ManualScore.RELEVANCE_PER_REPLICATE.index(
-            self.get_category())
+        return self.score_code.get_relevance_per_replicate()
 
     def get_relevance_across_replicates(self):
         """
@@ -567,10 +775,349 @@ class ManualScore(models.Model):
         return ManualScore.RELEVANCE_ACROSS_REPLICATES.index(
             self.get_category())
 
+    @classmethod
+    def save_new_scores(cls, scores):
+        """
+        Save new scores to the database, in bulk.
+
+        Also updates what is derived from the scores: the
+        ManualScoreSummary rows of the experiments scored, and the cached
+        secondary scores pages for their worm / temperature combos.
+
+        Each score's experiment should have its plate loaded (e.g. with
+        select_related), to avoid a query per experiment.
+        """
+        experiments = {score.experiment_id: score.experiment
+                       for score in scores}
+
+        with transaction.atomic():
+            cls.objects.bulk_create(scores)
+            ManualScoreSummary.rebuild(experiments=experiments.keys())
+
+        combos = set((experiment.worm_strain_id, experiment.plate.temperature)
+                     for experiment in experiments.values())
+        for worm_pk, temperature in combos:
+            invalidate_secondary_scores(worm_pk, temperature)
+
+
+class ManualScoreSummary(models.Model):
+    """
+    The most relevant manual score for a single experiment replicate.
+
+    This denormalizes ManualScore, so that the most relevant score per
+    replicate can be read from one narrow table rather than regrouped
+    from all scores. The summaries of each page of submitted scores are
+    rebuilt as it is saved (see ManualScore.save_new_scores), those of
+    a score saved or deleted on its own as that happens (see
+    update_manual_score_summary), and all summaries can be rebuilt with
+    the rebuild_manual_score_summaries command (see rebuild).
+
+    Among equally relevant scores, the earliest submitted one wins.
+    """
+
+    experiment = models.OneToOneField(Experiment, models.CASCADE,
+                                      primary_key=True)
+    score = models.ForeignKey(ManualScore, models.CASCADE)
+    score_code = models.ForeignKey(ManualScoreCode, models.CASCADE)
+
+    # Index of the score's category in ManualScore.RELEVANCE_PER_REPLICATE
+    category = models.PositiveSmallIntegerField(db_index=True)
+
+    num_scorers = models.PositiveSmallIntegerField()
+
+    class Meta:
+        db_table = 'ManualScoreSummary'
+        ordering = ['experiment']
+
+    def __unicode__(self):
+        return ('{} most relevant score {}'
+                .format(self.experiment_id, self.score_code_id))
+
+    @classmethod
+    def rebuild(cls, experiments=None, batch_size=1000):
+        """
+        Rebuild the summaries from scratch.
+
+        Optionally supply experiments to limit the rebuild to those
+        experiments (defaults to all experiments).
+
+        The rebuild is done in a transaction, so readers never see the
+        summaries partly rebuilt.
+
+        Scores inserted in bulk other than by ManualScore.save_new_scores
+        are not summarized until the summaries are rebuilt (as the
+        legacy database sync does after adding scores).
+
+        Returns the number of summaries created.
+        """
+        # Import here to avoid creating a circular dependency
+        from experiments.helpers.categories import get_category_code
+        scores = ManualScore.objects.all()
+        summaries = cls.objects.all()
+
+        if experiments is not None:
+            scores = scores.filter(experiment__in=experiments)
+            summaries = summaries.filter(experiment__in=experiments)
+
+        rows = (scores.order_by('experiment', 'pk')
+                .values_list('experiment', 'pk', 'score_code', 'scorer'))
+
+        batch = []
+        num_created = 0
+        scorers = set()
+        summary = None
+
+        with transaction.atomic():
+            summaries.delete()
+
+            for (experiment_pk, score_pk, code_pk,
+                 scorer_pk) in rows.iterator():
+                category = get_category_code(code_pk)
+
+                if (summary is None or
+                        summary.experiment_id != experiment_pk):
+                    if len(batch) >= batch_size:
+                        cls.objects.bulk_create(batch)
+                        num_created += len(batch)
+                        batch = []
+
+                    scorers = set()
+                    summary = cls(experiment_id=experiment_pk,
+                                  score_id=score_pk, score_code_id=code_pk,
+                                  category=category)
+                    batch.append(summary)
+
+                elif category > summary.category:
+                    summary.score_id = score_pk
+                    summary.score_code_id = code_pk
+                    summary.category = category
+
+                scorers.add(scorer_pk)
+                summary.num_scorers = len(scorers)
+
+            cls.objects.bulk_create(batch)
+            num_created += len(batch)
+
+        return num_created
+
+
+class ScoringQueue(models.Model):
+    """
+    A queue of experiments for a user to score, for one set of filters.
+
+    Rather than re-running the (possibly expensive) filters on every
+    scoring page, the queue is filled with a chunk of the matching
+    experiments at a time (see REFILL_SIZE). Each page then leases the
+    next batch of queued experiments, so that two pages on the same queue
+    (e.g. in two browser tabs) do not get the same experiments. Items are
+    marked done as the user submits scores (see mark_done), and leases
+    on experiments that were never scored simply expire.
+
+    Queues older than MAX_AGE are deleted whenever the user gets a queue
+    (see get_for_filters), so that abandoned queues do not pile up. A
+    queue still in use is then simply recreated, with a fresh view of
+    the experiments matching its filters.
+    """
+
+    user = models.ForeignKey(User, models.CASCADE)
+
+    # Hash of the filters (see get_key)
+    key = models.CharField(max_length=40)
+
+    created = models.DateTimeField(default=timezone.now)
+
+    # Number of matching experiments not yet added to the queue, as of
+    # the last refill
+    num_unqueued = models.PositiveIntegerField(default=0)
+
+    REFILL_SIZE = 500
+    LEASE_DURATION = timedelta(minutes=15)
+    MAX_AGE = timedelta(days=7)
+
+    class Meta:
+        db_table = 'ScoringQueue'
+        unique_together = ('user', 'key')
+
+    def __unicode__(self):
+        return '{} scoring queue {}'.format(self.user, self.key)
+
+    def get_num_remaining(self):
+        """Get the approximate number of experiments left to score."""
+        return (self.num_unqueued +
+                self.scoringqueueitem_set.filter(is_done=False).count())
+
+    def lease(self, experiments, count, randomize_order=False):
+        """
+        Lease the next count experiments from this queue.
+
+        experiments should be the QuerySet of experiments that this
+        queue is for. Queued experiments that no longer match it (e.g.
+        since marked junk, or scored by someone else) are dropped from
+        the queue rather than leased.
+
+        Set randomize_order=True to refill with a random sample of
+        experiments (see Experiment.get_random_sample), rather than in
+        the order of experiments.
+
+        Returns a list of experiments, in queue order.
+        """
+        leased = []
+
+        while len(leased) < count:
+            items = self._lease_items(count - len(leased))
+
+            if items:
+                leased.extend(self._drop_unmatched(items, experiments))
+            elif not self._refill(experiments, randomize_order):
+                break
+
+        return [item.experiment for item in leased]
+
+    def _lease_items(self, count):
+        now = timezone.now()
+
+        with transaction.atomic():
+            items = list(
+                self.scoringqueueitem_set
+                .select_for_update()
+                .filter(Q(leased_until__isnull=True) |
+                        Q(leased_until__lt=now),
+                        is_done=False)
+                .select_related('experiment', 'experiment__plate',
+                                'experiment__worm_strain',
+                                'experiment__library_stock')
+                .order_by('position')[:count])
+
+            (ScoringQueueItem.objects
+             .filter(pk__in=[item.pk for item in items])
+             .update(leased_until=now + ScoringQueue.LEASE_DURATION))
+
+        return items
+
+    def _drop_unmatched(self, items, experiments):
+        """Remove items no longer in experiments; return the rest."""
+        matching = set(experiments
+                       .filter(pk__in=[item.experiment_id for item in items])
+                       .values_list('pk', flat=True))
+
+        (ScoringQueueItem.objects
+         .filter(pk__in=[item.pk for item in items
+                         if item.experiment_id not in matching])
+         .delete())
+
+        return [item for item in items if item.experiment_id in matching]
+
+    def _refill(self, experiments, randomize_order):
+        """Add the next chunk of experiments; return how many were added."""
+        with transaction.atomic():
+            # Lock the queue, so that concurrent refills (e.g. from two
+            # browser tabs) do not add the same experiments
+            ScoringQueue.objects.select_for_update().get(pk=self.pk)
+
+            candidates = experiments.exclude(scoringqueueitem__queue=self)
+
+            if randomize_order:
+                new = Experiment.get_random_sample(candidates,
+                                                   ScoringQueue.REFILL_SIZE)
+            else:
+                new = list(candidates[:ScoringQueue.REFILL_SIZE])
+
+            last = (self.scoringqueueitem_set
+                    .aggregate(Max('position'))['position__max'])
+            if last is None:
+                last = -1
+
+            ScoringQueueItem.objects.bulk_create([
+                ScoringQueueItem(queue=self, experiment=experiment,
+                                 position=last + 1 + i)
+                for i, experiment in enumerate(new)])
+
+            # (candidates now excludes the newly queued experiments)
+            self.num_unqueued = candidates.count()
+            self.save()
+
+        return len(new)
+
+    @classmethod
+    def get_for_filters(cls, user, filters):
+        """
+        Get (creating if needed) user's queue for a set of filters.
+
+        See get_key for filters. Deletes user's queues older than
+        MAX_AGE first.
+        """
+        key = cls.get_key(filters)
+
+        (cls.objects
+         .filter(user=user, created__lt=timezone.now() - cls.MAX_AGE)
+         .delete())
+
+        try:
+            with transaction.atomic():
+                return cls.objects.get_or_create(user=user, key=key)[0]
+        except IntegrityError:
+            # Created concurrently (e.g. by another browser tab)
+            return cls.objects.get(user=user, key=key)
+
+    @classmethod
+    def get_key(cls, filters):
+        """
+        Get the key identifying a set of filters.
+
+        filters should be a dictionary of lists of values, e.g. the
+        lists() of the GET parameters of the scoring page (not including
+        the page number). Single values are also accepted.
+        """
+        pairs = []
+
+        for k, values in filters.items():
+            if not isinstance(values, (list, tuple)):
+                values = [values]
+            pairs.extend((k, unicode(v).encode('utf-8')) for v in values)
+
+        encoded = urllib.urlencode(sorted(pairs))
+        return hashlib.sha1(encoded).hexdigest()
+
+    @classmethod
+    def mark_done(cls, user, experiments):
+        """
+        Mark experiments as done in all of user's scoring queues.
+
+        Call this when user submits scores for experiments.
+        """
+        (ScoringQueueItem.objects
+         .filter(queue__user=user, experiment__in=experiments)
+         .update(is_done=True, leased_until=None))
+
+
+class ScoringQueueItem(models.Model):
+    """An experiment in a ScoringQueue."""
+
+    queue = models.ForeignKey(ScoringQueue, models.CASCADE)
+    experiment = models.ForeignKey(Experiment, models.CASCADE)
+    position = models.PositiveIntegerField()
+    leased_until = models.DateTimeField(null=True, blank=True, default=None)
+    is_done = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = 'ScoringQueueItem'
+        ordering = ['queue', 'position']
+        unique_together = ('queue', 'experiment')
+        index_together = ('queue', 'is_done', 'position')
+
+    def __unicode__(self):
+        return '{} in {}'.format(self.experiment_id, self.queue)
+
 
 class DevstarScore(models.Model):
     """Information about an image determined by the DevStaR."""
 
+    # Area of a single embryo, for estimating count_embryo from area_embryo
+    EMBRYO_AREA_DIVISOR = 70
+
+    DERIVED_FIELDS = ('count_embryo', 'larva_per_adult', 'embryo_per_adult',
+                      'survival', 'lethality')
+
     experiment = models.ForeignKey(Experiment, models.CASCADE)
 
     area_adult = models.IntegerField(null=True, blank=True,
@@ -583,8 +1130,10 @@ class DevstarScore(models.Model):
                                       help_text='DevStaR program output')
     count_larva = models.IntegerField(null=True, blank=True,
                                       help_text='DevStaR program output')
-    count_embryo = models.IntegerField(null=True, blank=True,
-                                       help_text='area_embryo // 70')
+    count_embryo = models.IntegerField(
+        null=True, blank=True,
+        help_text='area_embryo // EMBRYO_AREA_DIVISOR '
+                  '(see get_derived_fields)')
 
     larva_per_adult = models.FloatField(
         null=True, blank=True, default=None,
@@ -620,37 +1169,200 @@ class DevstarScore(models.Model):
 
         This sets the fields that are derived from the DevStaR raw output.
         """
+        derived = self.get_derived_fields(
+            self.area_embryo, self.count_adult, self.count_larva)
+
+        for field, value in zip(self.DERIVED_FIELDS, derived):
+            setattr(self, field, value)
+
+    @classmethod
+    def get_derived_fields(cls, area_embryo, count_adult, count_larva):
+        """
+        Get the fields derived from the DevStaR raw output.
+
+        Returns a tuple of the values of DERIVED_FIELDS. Values that
+        cannot be derived (because of missing raw output, or division by
+        zero) are None.
+        """
         # Use floor division for egg count
-        if self.area_embryo is not None:
-            self.count_embryo = self.area_embryo // 70
+        if area_embryo is None:
+            count_embryo = None
+        else:
+            count_embryo = area_embryo // cls.EMBRYO_AREA_DIVISOR
 
-        if self.count_larva is not None and self.count_adult is not None:
-            if self.count_adult == 0:
-                self.larva_per_adult = None
-            else:
-                self.larva_per_adult = self.count_larva / self.count_adult
+        larva_per_adult = None
+        embryo_per_adult = None
 
-        if self.count_embryo is not None and self.count_adult is not None:
-            if self.count_adult == 0:
-                self.embryo_per_adult = None
-            else:
-                self.embryo_per_adult = self.count_embryo / self.count_adult
+        if count_adult:
+            if count_larva is not None:
+                larva_per_adult = count_larva / count_adult
 
-        if self.count_embryo is not None and self.count_larva is not None:
-            brood_size = self.count_larva + self.count_embryo
-            if brood_size == 0:
-                self.surival = None
-                self.lethality = None
-            else:
-                self.survival = self.count_larva / brood_size
-                self.lethality = self.count_embryo / brood_size
+            if count_embryo is not None:
+                embryo_per_adult = count_embryo / count_adult
+
+        survival = None
+        lethality = None
+
+        if count_embryo is not None and count_larva is not None:
+            brood_size = count_larva + count_embryo
+            if brood_size:
+                survival = count_larva / brood_size
+                lethality = count_embryo / brood_size
+
+        return (count_embryo, larva_per_adult, embryo_per_adult,
+                survival, lethality)
+
+    @classmethod
+    def recompute_derived_fields(cls, scores=None, batch_size=5000):
+        """
+        Recompute the derived fields (see clean) of many scores at once.
+
+        Optionally supply scores to limit the recompute to a QuerySet of
+        scores (defaults to all scores).
+
+        Reads the raw output batch_size scores at a time, and saves only
+        the scores whose derived fields changed, with bulk updates.
+        Returns the number of scores changed.
+        """
+        if scores is None:
+            scores = cls.objects.all()
+
+        fields = (('pk', 'area_embryo', 'count_adult', 'count_larva') +
+                  cls.DERIVED_FIELDS)
+
+        num_changed = 0
+        last_pk = None
+
+        while True:
+            chunk = scores.order_by('pk')
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            rows = list(chunk.values_list(*fields)[:batch_size])
+
+            if not rows:
+                break
+
+            changed = []
+
+            for row in rows:
+                derived = cls.get_derived_fields(*row[1:4])
+                if derived != row[4:]:
+                    changed.append(cls(
+                        pk=row[0], **dict(zip(cls.DERIVED_FIELDS, derived))))
+
+            num_changed += bulk_update(changed, cls.DERIVED_FIELDS)
+            last_pk = rows[-1][0]
+
+        return num_changed
 
     def matches_raw_fields(self, other):
         return (
-            self.experiment == other.experiment and
+            self.experiment_id == other.experiment_id and
             self.is_bacteria_present == other.is_bacteria_present and
             self.area_adult == other.area_adult and
             self.area_larva == other.area_larva and
             self.area_embryo == other.area_embryo and
             self.count_adult == other.count_adult and
             self.count_larva == other.count_larva)
+
+
+class DevstarImportWatermark(models.Model):
+    """
+    Record of the DevStaR output last imported for an experiment plate.
+
+    Lets import_devstar_counts --incremental skip plates whose DevStaR
+    output files have not changed since they were last imported.
+    """
+
+    plate = models.OneToOneField(ExperimentPlate, models.CASCADE,
+                                 primary_key=True)
+
+    # SHA-1 of the names, sizes, and modification times of the plate's
+    # DevStaR output files (cheap to check, without reading the files)
+    file_signature = models.CharField(max_length=40)
+
+    # SHA-1 of the contents of the plate's DevStaR output files
+    content_hash = models.CharField(max_length=40)
+
+    imported = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'DevstarImportWatermark'
+        ordering = ['plate']
+
+    def __unicode__(self):
+        return '{} DevStaR import watermark'.format(self.plate_id)
+
+
+@receiver(post_save, sender=Experiment)
+@receiver(post_save, sender=ExperimentPlate)
+def update_control_experiments(sender, instance, raw=False, **kwargs):
+    """
+    Update the ControlExperiment index for a saved experiment or plate.
+
+    (Deleted experiments are removed from the index by cascade.)
+    """
+    if raw:
+        return
+
+    if sender is ExperimentPlate:
+        ControlExperiment.rebuild(experiments=instance.experiment_set.all())
+    else:
+        ControlExperiment.rebuild(experiments=[instance.pk])
+
+
+@receiver(post_save, sender=Experiment)
+@receiver(post_delete, sender=Experiment)
+def invalidate_experiment_secondary_scores(sender, instance, raw=False,
+                                           **kwargs):
+    """Invalidate the cached secondary scores for a changed experiment."""
+    if raw:
+        return
+
+    try:
+        temperature = instance.plate.temperature
+    except ExperimentPlate.DoesNotExist:
+        return
+
+    invalidate_secondary_scores(instance.worm_strain_id, temperature)
+
+
+@receiver(post_save, sender=ExperimentPlate)
+@receiver(post_delete, sender=ExperimentPlate)
+def clear_plate_secondary_scores(sender, instance, raw=False, **kwargs):
+    """
+    Invalidate all cached secondary scores for a changed plate.
+
+    (Its previous temperature, whose results are also affected, is not
+    known.)
+    """
+    if not raw:
+        clear_secondary_scores()
+
+
+@receiver(post_save, sender=ManualScore)
+@receiver(post_delete, sender=ManualScore)
+def update_manual_score_summary(sender, instance, raw=False, **kwargs):
+    """
+    Rebuild the ManualScoreSummary of a saved or deleted score's experiment.
+
+    (Deleting the score that a summary points to also deletes the
+    summary, by cascade, so the summary is rebuilt from the remaining
+    scores.)
+    """
+    if not raw:
+        ManualScoreSummary.rebuild(experiments=[instance.experiment_id])
+
+
+@receiver(post_save, sender=ManualScore)
+@receiver(post_delete, sender=ManualScore)
+def invalidate_score_secondary_scores(sender, instance, raw=False,
+                                      **kwargs):
+    """Invalidate the cached secondary scores for a changed score."""
+    if raw:
+        return
+
+    for worm_pk, temperature in (
+            Experiment.objects.filter(pk=instance.experiment_id)
+            .values_list('worm_strain', 'plate__temperature')):
+        invalidate_secondary_scores(worm_pk, temperature)
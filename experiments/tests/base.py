@@ -0,0 +1,88 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from clones.models import Clone
+from experiments.models import (Experiment, ExperimentPlate,
+                                ManualScore, ManualScoreCode)
+from library.models import LibraryPlate, LibraryStock
+from worms.models import WormStrain
+
+
+class ScoresTestCase(TestCase):
+    """
+    Base test case with a small, manually scored secondary screen.
+
+    Two mutant strains (one SUP, one ENH) are tested against the same
+    three library stocks, with several replicates per stock. Each
+    replicate is scored by up to two scorers.
+    """
+
+    def setUp(self):
+        WormStrain.objects.create(id='N2')
+
+        self.sup_worm = WormStrain.objects.create(
+            id='EU552', gene='glp-1', allele='or178',
+            genotype='glp-1(or178) III', restrictive_temperature=22.5)
+
+        self.enh_worm = WormStrain.objects.create(
+            id='EU1006', gene='dnc-1', allele='or404',
+            genotype='dnc-1(or404) IV', permissive_temperature=22.5)
+
+        Clone.objects.create(id='L4440')
+        for clone_id in ('sjj_a', 'sjj_b', 'sjj_c'):
+            Clone.objects.create(id=clone_id)
+
+        library_plate = LibraryPlate.objects.create(
+            id='I-1-A1', number_of_wells=96, screen_stage=2)
+
+        self.stocks = []
+        for well, clone_id in (('A01', 'sjj_a'), ('A02', 'sjj_b'),
+                               ('A03', 'sjj_c'), ('A04', 'L4440')):
+            self.stocks.append(LibraryStock.objects.create(
+                id='I-1-A1_' + well, plate=library_plate, well=well,
+                intended_clone_id=clone_id))
+
+        for pk in (-7, 0, 1, 2, 3, 7, 12, 13, 14):
+            ManualScoreCode.objects.create(id=pk)
+
+        self.scorers = [User.objects.create(username='noah'),
+                        User.objects.create(username='malcolm')]
+
+        # Replicate scores per stock, as (scorer_1, scorer_2) codes
+        sup_replicates = {
+            'A01': [(3, 0), (2, None), (3, 3), (0, -7)],
+            'A02': [(1, 0), (1, None), (0, 0), (-7, None), (1, 1)],
+            'A03': [(0, 0), (-7, 7), (1, None)],
+        }
+
+        enh_replicates = {
+            'A01': [(12, 0), (0, None)],
+            'A02': [(12, None), (12, 0)],
+            'A03': [(14, None)],
+        }
+
+        self.create_scores(self.sup_worm, sup_replicates, 40000)
+        self.create_scores(self.enh_worm, enh_replicates, 50000)
+
+    def create_scores(self, worm, replicates, first_plate_id):
+        stocks_by_well = {stock.well: stock for stock in self.stocks}
+        for well, codes_per_replicate in sorted(replicates.items()):
+            for i, codes in enumerate(codes_per_replicate):
+                plate, created = ExperimentPlate.objects.get_or_create(
+                    id=first_plate_id + i, screen_stage=2, temperature=22.5,
+                    date=datetime.date(2016, 1, 1 + i))
+
+                experiment = Experiment.objects.create(
+                    id='{}_{}'.format(plate.id, well), plate=plate,
+                    well=well, worm_strain=worm,
+                    library_stock=stocks_by_well[well])
+
+                for scorer, code in zip(self.scorers, codes):
+                    if code is None:
+                        continue
+
+                    ManualScore.objects.create(
+                        experiment=experiment, score_code_id=code,
+                        scorer=scorer)
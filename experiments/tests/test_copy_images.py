@@ -0,0 +1,165 @@
+import csv
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+import requests
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from experiments.management.commands.copy_images import (
+    MANIFEST_NAME, _copy_image)
+from utils.tests.stub_server import StubHandler, StubServer
+
+
+class CopyImageTestCase(SimpleTestCase):
+    def setUp(self):
+        self.server = StubServer().__enter__()
+        self.session = requests.Session()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, '1_Tile000001.bmp')
+
+    def tearDown(self):
+        self.server.__exit__()
+        shutil.rmtree(self.directory)
+
+    def copy(self, url_path, retries=2):
+        return _copy_image(self.session, self.server.get_url(url_path),
+                           self.path, retries, backoff=.01)
+
+    def get_methods(self):
+        return [method for method, path in self.server.requests]
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def test_copy(self):
+        self.assertEqual(self.copy('/ok/1.bmp'), 'copied')
+        self.assertEqual(self.read(), StubHandler.BODY)
+        self.assertEqual(self.get_methods(), ['GET'])
+
+    def test_retries_server_errors(self):
+        self.assertEqual(self.copy('/flaky/1.bmp'), 'copied')
+        self.assertEqual(self.get_methods(), ['GET', 'GET'])
+
+        self.assertEqual(self.copy('/error/1.bmp'),
+                         'failed: non-ok GET status 500')
+        self.assertEqual(self.get_methods().count('GET'), 2 + 3)
+
+    def test_no_retries(self):
+        self.assertEqual(self.copy('/flaky/1.bmp', retries=0),
+                         'failed: non-ok GET status 503')
+
+    def test_client_errors_not_retried(self):
+        self.assertEqual(self.copy('/missing/1.bmp'),
+                         'failed: non-ok GET status 404')
+        self.assertEqual(self.get_methods(), ['GET'])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_unreachable(self):
+        result = _copy_image(self.session, 'http://127.0.0.1:1/ok/1.bmp',
+                             self.path, 1, backoff=.01)
+        self.assertTrue(result.startswith('failed: '))
+
+    def test_resume_skips_same_size(self):
+        with open(self.path, 'wb') as f:
+            f.write(StubHandler.BODY)
+
+        self.assertEqual(self.copy('/ok/1.bmp'), 'skipped')
+        self.assertEqual(self.get_methods(), ['HEAD'])
+
+    def test_resume_copies_different_size(self):
+        with open(self.path, 'wb') as f:
+            f.write('partial')
+
+        self.assertEqual(self.copy('/ok/1.bmp'), 'copied')
+        self.assertEqual(self.get_methods(), ['HEAD', 'GET'])
+        self.assertEqual(self.read(), StubHandler.BODY)
+
+    def test_part_file_renamed(self):
+        # E.g. left by an interrupted run
+        with open(self.path + '.part', 'wb') as f:
+            f.write('interrupted')
+
+        self.assertEqual(self.copy('/ok/1.bmp'), 'copied')
+        self.assertEqual(os.listdir(self.directory),
+                         [os.path.basename(self.path)])
+        self.assertEqual(self.read(), StubHandler.BODY)
+
+
+class CopyImagesCommandTestCase(SimpleTestCase):
+    def setUp(self):
+        self.server = StubServer().__enter__()
+        self.directory = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.directory, 'images')
+
+        self.input_path = os.path.join(self.directory, 'input.csv')
+        with open(self.input_path, 'w') as f:
+            f.write('experiment,well\n1,A01\n1,Tile000002\n2,H12\n')
+
+    def tearDown(self):
+        self.server.__exit__()
+        shutil.rmtree(self.directory)
+
+    def copy_images(self, url_path, *args):
+        self.stdout = StringIO()
+        with self.settings(BASE_URL_IMG=self.server.get_url(url_path)):
+            call_command('copy_images', self.input_path, self.output_dir,
+                         '--threads', '2', '--retries', '1',
+                         '--backoff', '.01', *args, stdout=self.stdout)
+
+    def get_manifest(self):
+        with open(os.path.join(self.output_dir, MANIFEST_NAME), 'rb') as f:
+            rows = list(csv.reader(f))
+
+        self.assertEqual(rows[0], ['url', 'path', 'result'])
+        return sorted((os.path.basename(path), result)
+                      for url, path, result in rows[1:])
+
+    def test_copy_and_resume(self):
+        self.copy_images('/ok')
+        self.assertEqual(self.get_manifest(), [
+            ('1_Tile000001.bmp', 'copied'),
+            ('1_Tile000002.bmp', 'copied'),
+            ('2_Tile000085.bmp', 'copied'),
+        ])
+        self.assertIn('3 copied, 0 skipped, 0 failed',
+                      self.stdout.getvalue())
+
+        # Whole lines, one per image, despite the threads
+        lines = self.stdout.getvalue().splitlines()
+        self.assertEqual(sorted(lines[:3]), [
+            os.path.join(self.output_dir, name) + ' copied'
+            for name in ('1_Tile000001.bmp', '1_Tile000002.bmp',
+                         '2_Tile000085.bmp')])
+
+        with self.assertRaises(CommandError):
+            self.copy_images('/ok')
+
+        self.copy_images('/ok', '--resume')
+        self.assertEqual([result for name, result in self.get_manifest()],
+                         ['skipped'] * 3)
+
+    def test_failures_recorded(self):
+        with self.assertRaises(CommandError):
+            self.copy_images('/missing')
+
+        self.assertEqual(
+            [result for name, result in self.get_manifest()],
+            ['failed: non-ok GET status 404'] * 3)
+
+    def test_unexpected_error_recorded(self):
+        # A directory in the way of one image, so that renaming the
+        # downloaded image to it fails
+        os.makedirs(os.path.join(self.output_dir, '1_Tile000002.bmp'))
+
+        with self.assertRaises(CommandError):
+            self.copy_images('/ok', '--resume')
+
+        manifest = self.get_manifest()
+        self.assertEqual(manifest[0], ('1_Tile000001.bmp', 'copied'))
+        self.assertTrue(manifest[1][1].startswith('failed: '))
+        self.assertEqual(manifest[2], ('2_Tile000085.bmp', 'copied'))
@@ -0,0 +1,65 @@
+from django.db.models.query import QuerySet
+
+from experiments.forms import (IMPOSSIBLE, LevelsScoreForm,
+                               SuppressorScoreForm, _limit_to_screen_type)
+from experiments.models import Experiment, ManualScoreCode
+from experiments.tests.base import ScoresTestCase
+
+
+class LimitToScreenTypeTestCase(ScoresTestCase):
+    def test_returns_queryset(self):
+        experiments = _limit_to_screen_type(Experiment.objects.all(), 'SUP')
+        self.assertIsInstance(experiments, QuerySet)
+
+    def test_limits_to_screen_temperature(self):
+        for screen_type, worm in (('SUP', self.sup_worm),
+                                  ('ENH', self.enh_worm)):
+            experiments = _limit_to_screen_type(Experiment.objects.all(),
+                                                screen_type)
+            self.assertEqual(
+                set(experiments),
+                set(Experiment.objects.filter(worm_strain=worm)))
+
+    def test_excludes_other_temperatures(self):
+        experiments = Experiment.objects.filter(worm_strain=self.sup_worm)
+        self.sup_worm.restrictive_temperature = 25
+        self.sup_worm.save()
+        self.assertFalse(_limit_to_screen_type(experiments, 'SUP').exists())
+
+
+class ScoreFormTestCase(ScoresTestCase):
+    def get_score_code_pks(self, form_class, cleaned_data):
+        # Choices are read when the forms module is imported, so set
+        # the cleaned data directly rather than validating
+        experiment = Experiment.objects.first()
+        form = form_class(prefix=experiment.pk, user=self.scorers[0],
+                          experiment=experiment,
+                          score_codes=ManualScoreCode.objects.in_bulk(
+                              [-7, 0, 1, 2, 3, 7, 12, 13, 14]))
+        form.cleaned_data = cleaned_data
+
+        scores = form.get_scores()
+        for score in scores:
+            self.assertEqual(score.experiment, experiment)
+            self.assertEqual(score.scorer, self.scorers[0])
+
+        return [score.score_code_id for score in scores]
+
+    def test_suppressor_scores(self):
+        self.assertEqual(
+            self.get_score_code_pks(SuppressorScoreForm, {
+                'sup_score': 3, 'auxiliary_scores': [7, -7]}),
+            [3, 7, -7])
+
+    def test_levels_scores(self):
+        self.assertEqual(
+            self.get_score_code_pks(LevelsScoreForm, {
+                'emb_score': 12, 'ste_score': 13, 'auxiliary_scores': []}),
+            [12, 13])
+
+    def test_impossible_excluded(self):
+        self.assertEqual(
+            self.get_score_code_pks(LevelsScoreForm, {
+                'emb_score': IMPOSSIBLE, 'ste_score': 14,
+                'auxiliary_scores': [7]}),
+            [14, 7])
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import skipIf
+
+from django.test import SimpleTestCase
+
+from experiments.helpers.image_pyramid import SIZES
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+if Image:
+    from experiments.management.commands.generate_image_pyramid import (
+        _generate_pyramid)
+
+
+@skipIf(Image is None, 'Pillow is not installed')
+class GeneratePyramidTestCase(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source_path = os.path.join(self.directory, 'Tile000001.bmp')
+        Image.new('RGB', (1200, 900), 'white').save(self.source_path)
+
+        self.levels = [
+            (size, os.path.join(self.directory, str(size), '40000',
+                                'Tile000001.jpg'))
+            for size in SIZES]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def generate(self, force=False):
+        source_path, result = _generate_pyramid(
+            (self.source_path, self.levels, force))
+        self.assertEqual(source_path, self.source_path)
+        return result
+
+    def set_mtime(self, path, mtime):
+        os.utime(path, (mtime, mtime))
+
+    def test_generates_each_size(self):
+        self.assertEqual(self.generate(), 'generated')
+
+        for size, path in self.levels:
+            image = Image.open(path)
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(max(image.size), size)
+
+        # Temporary files renamed into place
+        for size, path in self.levels:
+            self.assertFalse(os.path.exists(path + '.part'))
+
+    def test_up_to_date(self):
+        self.generate()
+        self.assertEqual(self.generate(), 'up to date')
+
+        # A raw image newer than one level regenerates
+        now = time.time()
+        self.set_mtime(self.source_path, now)
+        self.set_mtime(self.levels[0][1], now - 60)
+        self.assertEqual(self.generate(), 'generated')
+        self.assertEqual(self.generate(), 'up to date')
+
+    def test_force(self):
+        self.generate()
+        self.set_mtime(self.levels[0][1], 0)
+        self.set_mtime(self.source_path, 0)
+
+        self.assertEqual(self.generate(force=True), 'generated')
+        self.assertGreater(os.path.getmtime(self.levels[0][1]), 0)
+
+    def test_partial_image_is_not_up_to_date(self):
+        # As left by an interrupted run: only a temporary file
+        self.generate()
+        size, path = self.levels[0]
+        os.rename(path, path + '.part')
+
+        self.assertEqual(self.generate(), 'generated')
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(path + '.part'))
+
+    def test_missing(self):
+        os.remove(self.source_path)
+        self.assertEqual(self.generate(), 'missing')
+        self.assertFalse(os.path.exists(os.path.join(self.directory,
+                                                     str(SIZES[0]))))
+
+    def test_failed(self):
+        with open(self.source_path, 'w') as f:
+            f.write('not an image')
+
+        self.assertTrue(self.generate().startswith('failed: '))
+        for size, path in self.levels:
+            self.assertFalse(os.path.exists(path))
@@ -0,0 +1,159 @@
+import datetime
+
+from django.test import SimpleTestCase, TestCase
+
+from clones.models import Clone
+from experiments.helpers.gi_scores import (compute_gi_scores_for_date,
+                                           update_gi_scores)
+from experiments.models import DevstarScore, Experiment, ExperimentPlate
+from library.models import LibraryPlate, LibraryStock
+from worms.models import WormStrain
+
+N2 = 'N2'
+L4440 = 'L4440'
+LOW = 15.0
+HIGH = 25.0
+
+
+class ComputeGIScoresTestCase(SimpleTestCase):
+    def setUp(self):
+        self.screen_types = {('enh', LOW): 'ENH', ('sup', HIGH): 'SUP'}
+
+    def compute(self, rows, threshold=.25):
+        return compute_gi_scores_for_date(rows, N2, L4440,
+                                          self.screen_types, threshold)
+
+    def test_multiplicative_model(self):
+        results = self.compute([
+            (1, 'enh', 'stock_l4440', L4440, LOW, .8),
+            (2, 'enh', 'stock_l4440', L4440, LOW, .6),
+            (3, N2, 'stock_a', 'a', LOW, .5),
+            (4, 'enh', 'stock_a', 'a', LOW, .05),
+            (5, 'enh', 'stock_a', 'a', LOW, .3),
+        ])
+
+        self.assertEqual(sorted(results), [4, 5])
+
+        gi_score, selected = results[4]
+        self.assertAlmostEqual(gi_score, -.3)
+        self.assertTrue(selected)
+
+        gi_score, selected = results[5]
+        self.assertAlmostEqual(gi_score, -.05)
+        self.assertFalse(selected)
+
+    def test_suppression(self):
+        results = self.compute([
+            (1, 'sup', 'stock_l4440', L4440, HIGH, .1),
+            (2, N2, 'stock_a', 'a', HIGH, .5),
+            (3, 'sup', 'stock_a', 'a', HIGH, .9),
+        ])
+
+        gi_score, selected = results[3]
+        self.assertAlmostEqual(gi_score, .85)
+        self.assertTrue(selected)
+
+    def test_closest_n2_temperature(self):
+        results = self.compute([
+            (1, 'enh', 'stock_l4440', L4440, LOW, 1),
+            (2, N2, 'stock_a', 'a', 16.0, .5),
+            (3, N2, 'stock_a', 'a', HIGH, .1),
+            (4, 'enh', 'stock_a', 'a', LOW, .5),
+        ])
+
+        self.assertAlmostEqual(results[4][0], 0)
+
+    def test_closest_n2_temperature_lacks_survival(self):
+        results = self.compute([
+            (1, 'enh', 'stock_l4440', L4440, LOW, 1),
+            (2, N2, 'stock_a', 'a', LOW, None),
+            (3, N2, 'stock_a', 'a', HIGH, .1),
+            (4, 'enh', 'stock_a', 'a', LOW, .5),
+        ])
+
+        self.assertEqual(results[4], (None, None))
+
+    def test_missing_controls(self):
+        results = self.compute([
+            (1, 'enh', 'stock_l4440', L4440, LOW, 1),
+            (2, N2, 'stock_a', 'a', LOW, .5),
+            (3, 'enh', 'stock_b', 'b', LOW, .5),
+            (4, 'sup', 'stock_a', 'a', HIGH, .5),
+            (5, 'enh', 'stock_a', 'a', LOW, None),
+        ])
+
+        self.assertEqual(results[3], (None, None))
+        self.assertEqual(results[4], (None, None))
+        self.assertEqual(results[5], (None, None))
+
+    def test_not_screen_temperature(self):
+        results = self.compute([
+            (1, 'enh', 'stock_l4440', L4440, HIGH, 1),
+            (2, N2, 'stock_a', 'a', HIGH, 1),
+            (3, 'enh', 'stock_a', 'a', HIGH, 0),
+        ])
+
+        self.assertEqual(results[3], (-1, None))
+
+    def test_empty_well(self):
+        results = self.compute([
+            (1, 'enh', 'stock_l4440', L4440, LOW, 1),
+            (2, N2, 'stock_empty', None, LOW, 1),
+            (3, 'enh', 'stock_empty', None, LOW, .5),
+            (4, 'enh', 'stock_a', 'a', LOW, .5),
+        ])
+
+        self.assertEqual(sorted(results), [4])
+
+
+class UpdateGIScoresTestCase(TestCase):
+    def setUp(self):
+        n2 = WormStrain.objects.create(id='N2')
+        worm = WormStrain.objects.create(id='EU1006',
+                                         permissive_temperature=LOW)
+
+        library_plate = LibraryPlate.objects.create(
+            id='I-1-A1', number_of_wells=96, screen_stage=1)
+        stocks = {}
+        for well, clone_id in (('A01', 'sjj_a'), ('A02', 'L4440')):
+            Clone.objects.create(id=clone_id)
+            stocks[well] = LibraryStock.objects.create(
+                id='I-1-A1_' + well, plate=library_plate, well=well,
+                intended_clone_id=clone_id)
+
+        # (plate, temperature, worm, well, survival)
+        wells = ((1, LOW, worm, 'A01', .1),
+                 (1, LOW, worm, 'A02', .8),
+                 (2, LOW, n2, 'A01', .5),
+                 (3, HIGH, n2, 'A01', 1))
+
+        for plate_id, temperature, strain, well, survival in wells:
+            plate, created = ExperimentPlate.objects.get_or_create(
+                id=plate_id, screen_stage=1, temperature=temperature,
+                date=datetime.date(2016, 1, 1))
+            experiment = Experiment.objects.create(
+                id='{}_{}'.format(plate_id, well), plate=plate, well=well,
+                worm_strain=strain, library_stock=stocks[well])
+            DevstarScore.objects.create(experiment=experiment,
+                                        survival=survival)
+
+    def test_update_gi_scores(self):
+        self.assertEqual(update_gi_scores(), (1, 1))
+
+        score = DevstarScore.objects.get(experiment='1_A01')
+        self.assertAlmostEqual(score.gi_score, -.3)
+        self.assertTrue(score.selected_for_scoring)
+
+        self.assertIsNone(
+            DevstarScore.objects.get(experiment='1_A02').gi_score)
+
+        # Nothing changes the second time
+        self.assertEqual(update_gi_scores(), (1, 0))
+
+    def test_dry_run(self):
+        self.assertEqual(update_gi_scores(dry_run=True), (1, 1))
+        self.assertIsNone(
+            DevstarScore.objects.get(experiment='1_A01').gi_score)
+
+    def test_screen_stage(self):
+        self.assertEqual(update_gi_scores(screen_stage=2), (0, 0))
@@ -0,0 +1,56 @@
+from django.core.cache import caches
+from django.test.utils import override_settings
+
+from experiments.helpers.image_availability import (
+    CACHE_NAME, check_urls, is_image_available)
+from experiments.models import Experiment
+from experiments.tests.base import ScoresTestCase
+from utils.tests.stub_server import StubServer
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    CACHE_NAME: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test_image_availability',
+    },
+    'secondary_scores': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test_secondary_scores',
+    },
+})
+class ImageAvailabilityTestCase(ScoresTestCase):
+    def setUp(self):
+        super(ImageAvailabilityTestCase, self).setUp()
+        caches[CACHE_NAME].clear()
+        self.server = StubServer().__enter__()
+        self.experiment = Experiment.objects.get(pk='40000_A01')
+
+    def tearDown(self):
+        self.server.__exit__()
+
+    def test_caches_results(self):
+        with self.settings(BASE_URL_DEVSTAR=self.server.get_url('/ok'),
+                           BASE_URL_IMG=self.server.get_url('/missing')):
+            for i in range(3):
+                self.assertTrue(
+                    is_image_available(self.experiment, 'devstar'))
+                self.assertFalse(is_image_available(self.experiment))
+
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_slow_server(self):
+        with self.settings(BASE_URL_DEVSTAR=self.server.get_url('/slow')):
+            self.assertFalse(
+                is_image_available(self.experiment, 'devstar', timeout=0.1))
+
+    def test_check_urls(self):
+        urls = [self.server.get_url('/ok/{}'.format(i)) for i in range(10)]
+        urls.append(self.server.get_url('/missing/1'))
+
+        results = check_urls(urls, threads=4)
+        self.assertEqual(sum(results.values()), 10)
+        self.assertFalse(results[urls[-1]])
+        self.assertEqual(len(self.server.requests), 11)
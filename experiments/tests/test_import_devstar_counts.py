@@ -0,0 +1,240 @@
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from django.test import SimpleTestCase
+
+from experiments.management.commands.import_devstar_counts import (
+    RAW_FIELDS, Command, _parse_count_file, _parse_plate)
+from experiments.models import DevstarImportWatermark, DevstarScore, Experiment
+from experiments.tests.base import ScoresTestCase
+
+CONTENTS = '''bacteria 1
+W 100
+LC 200
+EC 1400
+NewcntW 4
+NewcntL 20
+'''
+
+COUNTS = [1, 100, 200, 1400, 4, 20]
+
+
+class ParseCountFileTestCase(SimpleTestCase):
+    def test_parse(self):
+        self.assertEqual(_parse_count_file('1_A01', CONTENTS), (COUNTS, []))
+
+    def test_first_token(self):
+        # Matched on the first token, so indented lines are parsed too,
+        # and a longer token still counts for the pattern it starts with
+        contents = CONTENTS.replace('LC 200', '  LC 200').replace(
+            'W 100', 'Wcnt 100')
+        self.assertEqual(_parse_count_file('1_A01', contents), (COUNTS, []))
+
+    def test_missing_file(self):
+        counts, warnings = _parse_count_file('1_A01', None)
+        self.assertIsNone(counts)
+        self.assertEqual(warnings, ['Skipping experiment 1_A01 due to '
+                                    'DevStaR file not found'])
+
+    def test_bad_line(self):
+        for bad in ('EC', 'EC many'):
+            counts, warnings = _parse_count_file(
+                '1_A01', CONTENTS.replace('EC 1400', bad))
+            self.assertIsNone(counts)
+            self.assertEqual(warnings, ['Skipping experiment 1_A01 due to '
+                                        'error parsing line 3'])
+
+    def test_missing_pattern(self):
+        counts, warnings = _parse_count_file(
+            '1_A01', CONTENTS.replace('NewcntL 20\n', 'other 5\n'))
+        self.assertEqual(counts, COUNTS[:5] + [None])
+        self.assertEqual(warnings,
+                         ['NewcntL count is missing for experiment 1_A01'])
+
+
+class SaveBatchTestCase(ScoresTestCase):
+    def setUp(self):
+        super(SaveBatchTestCase, self).setUp()
+        self.command = Command(stdout=StringIO(), stderr=StringIO())
+        self.command.totals = {'created': 0, 'updated': 0, 'unchanged': 0,
+                               'mismatched': 0, 'skipped': 0}
+
+    def save_batch(self, results):
+        return self.command._save_batch([(40000, results, 'hash')])
+
+    def assertTotals(self, **expected):
+        for key, value in self.command.totals.items():
+            self.assertEqual(value, expected.get(key, 0), key)
+
+    def test_create(self):
+        mismatched = self.save_batch([('40000_A01', COUNTS, []),
+                                      ('40000_A02', None, ['Skipping'])])
+        self.assertEqual(mismatched, set())
+        self.assertTotals(created=1, skipped=1)
+
+        score = DevstarScore.objects.get(experiment='40000_A01')
+        self.assertEqual(score.count_embryo, 20)
+        self.assertEqual(score.embryo_per_adult, 5)
+        self.assertFalse(
+            DevstarScore.objects.filter(experiment='40000_A02').exists())
+        self.assertIn('WARNING: Skipping',
+                      self.command.stderr.getvalue())
+
+    def test_update(self):
+        DevstarScore.objects.create(experiment_id='40000_A01')
+
+        mismatched = self.save_batch([('40000_A01', COUNTS, [])])
+        self.assertEqual(mismatched, set())
+        self.assertTotals(updated=1)
+
+        score = DevstarScore.objects.get(experiment='40000_A01')
+        self.assertEqual(
+            [getattr(score, field) for field in RAW_FIELDS], COUNTS)
+        self.assertEqual(score.count_embryo, 20)
+
+    def test_unchanged(self):
+        DevstarScore.objects.create(experiment_id='40000_A01',
+                                    **dict(zip(RAW_FIELDS, COUNTS)))
+
+        mismatched = self.save_batch([('40000_A01', COUNTS, [])])
+        self.assertEqual(mismatched, set())
+        self.assertTotals(unchanged=1)
+        self.assertEqual(DevstarScore.objects.count(), 1)
+
+    def test_mismatched(self):
+        DevstarScore.objects.create(experiment_id='40000_A01',
+                                    **dict(zip(RAW_FIELDS, COUNTS)))
+
+        mismatched = self.save_batch(
+            [('40000_A01', COUNTS[:5] + [21], [])])
+        self.assertEqual(mismatched, {40000})
+        self.assertTotals(mismatched=1)
+        self.assertEqual(
+            DevstarScore.objects.get(experiment='40000_A01').count_larva,
+            20)
+        self.assertIn('does not match the existing database entry for '
+                      'Experiment 40000_A01',
+                      self.command.stderr.getvalue())
+
+
+class IncrementalImportTestCase(ScoresTestCase):
+    def setUp(self):
+        super(IncrementalImportTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = self.settings(
+            BASE_DIR_DEVSTAR_OUTPUT=self.directory)
+        self.settings_override.enable()
+
+        self.experiments = list(Experiment.objects.filter(
+            plate__in=(40000, 40001)))
+        for experiment in self.experiments:
+            self.write_count_file(experiment, CONTENTS)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory)
+        super(IncrementalImportTestCase, self).tearDown()
+
+    def write_count_file(self, experiment, contents):
+        path = experiment.get_devstar_count_path()
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(contents)
+
+    def import_incremental(self):
+        """Do what handle does with --incremental, minus the prompt."""
+        command = Command(stdout=StringIO(), stderr=StringIO())
+        command.totals = {'created': 0, 'updated': 0, 'unchanged': 0,
+                          'mismatched': 0, 'skipped': 0}
+        command.watermarks = {
+            watermark.pk: watermark
+            for watermark in DevstarImportWatermark.objects.all()}
+        command.file_signatures = command._get_changed_file_signatures()
+
+        tasks = [(plate_pk, [(experiment.pk,
+                              experiment.get_devstar_count_path())
+                             for experiment in self.experiments
+                             if experiment.plate_id == plate_pk])
+                 for plate_pk in sorted(command.file_signatures)]
+        command._save_incremental_batch(map(_parse_plate, tasks))
+
+        self.changed_plates = sorted(command.file_signatures)
+        return command.totals
+
+    def get_watermarked_plates(self):
+        return sorted(DevstarImportWatermark.objects.values_list(
+            'plate', flat=True))
+
+    def test_changed_content_saved_and_watermarked(self):
+        totals = self.import_incremental()
+        self.assertEqual(self.changed_plates, [40000, 40001])
+        self.assertEqual(totals['created'], len(self.experiments))
+        self.assertEqual(self.get_watermarked_plates(), [40000, 40001])
+
+        experiment = self.experiments[0]
+        self.write_count_file(experiment,
+                              CONTENTS.replace('NewcntL 20', 'NewcntL 2'))
+        DevstarScore.objects.filter(experiment=experiment).update(
+            area_adult=None, area_larva=None, area_embryo=None)
+
+        totals = self.import_incremental()
+        self.assertEqual(self.changed_plates, [experiment.plate_id])
+        self.assertEqual(totals['updated'], 1)
+        self.assertEqual(
+            DevstarScore.objects.get(experiment=experiment).count_larva, 2)
+
+        watermark = DevstarImportWatermark.objects.get(
+            plate=experiment.plate_id)
+        self.assertEqual(self.import_incremental()['updated'], 0)
+        self.assertEqual(self.changed_plates, [])
+        self.assertEqual(DevstarImportWatermark.objects.get(
+            plate=experiment.plate_id).content_hash, watermark.content_hash)
+
+    def test_unchanged_signature_skipped(self):
+        self.import_incremental()
+        totals = self.import_incremental()
+
+        self.assertEqual(self.changed_plates, [])
+        self.assertFalse(any(totals.values()))
+
+    def test_changed_signature_unchanged_content(self):
+        self.import_incremental()
+        watermark = DevstarImportWatermark.objects.get(plate=40000)
+
+        # Touch a file, changing its modification time only
+        path = self.experiments[0].get_devstar_count_path()
+        os.utime(path, (0, 0))
+
+        totals = self.import_incremental()
+        self.assertEqual(self.changed_plates, [self.experiments[0].plate_id])
+
+        num_experiments = sum(1 for experiment in self.experiments
+                              if experiment.plate_id == 40000)
+        self.assertEqual(totals['unchanged'], num_experiments)
+        self.assertEqual(totals['created'] + totals['updated'], 0)
+
+        # The new signature is recorded, so the plate is skipped next time
+        new_watermark = DevstarImportWatermark.objects.get(plate=40000)
+        self.assertNotEqual(new_watermark.file_signature,
+                            watermark.file_signature)
+        self.assertEqual(new_watermark.content_hash, watermark.content_hash)
+
+        self.import_incremental()
+        self.assertEqual(self.changed_plates, [])
+
+    def test_mismatched_plate_not_watermarked(self):
+        DevstarScore.objects.create(
+            experiment_id='40001_A01',
+            **dict(zip(RAW_FIELDS, COUNTS[:5] + [21])))
+
+        totals = self.import_incremental()
+        self.assertEqual(totals['mismatched'], 1)
+        self.assertEqual(self.get_watermarked_plates(), [40000])
+
+        # So it is parsed, and reported, again
+        totals = self.import_incremental()
+        self.assertEqual(self.changed_plates, [40001])
+        self.assertEqual(totals['mismatched'], 1)
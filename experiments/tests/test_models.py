@@ -0,0 +1,367 @@
+import datetime
+from datetime import timedelta
+
+from django.core.urlresolvers import reverse
+from django.test import RequestFactory
+from django.utils import timezone
+
+from experiments.models import (ControlExperiment, DevstarScore,
+                                Experiment, ExperimentPlate, ScoringQueue)
+from experiments.tests.base import ScoresTestCase
+from experiments.views.views_knockdown import double_knockdown
+from worms.models import WormStrain
+
+
+class GetRandomSampleTestCase(ScoresTestCase):
+    def setUp(self):
+        super(GetRandomSampleTestCase, self).setUp()
+        self.experiments = Experiment.objects.filter(
+            worm_strain=self.sup_worm)
+
+    def test_sample_size(self):
+        for count in (0, 1, 5, 12, 20):
+            sample = Experiment.get_random_sample(self.experiments, count)
+            self.assertEqual(len(sample), min(count, 12))
+            self.assertEqual(len(set(sample)), len(sample))
+            self.assertTrue(set(sample).issubset(set(self.experiments)))
+
+    def test_random_order(self):
+        by_key = list(self.experiments.order_by('random_key'))
+        windows = [by_key[i:] + by_key[:i] for i in range(len(by_key))]
+
+        samples = [Experiment.get_random_sample(self.experiments, 12)
+                   for i in range(10)]
+
+        # Not just the window in random_key order
+        self.assertFalse(all(sample in windows for sample in samples))
+
+    def test_wraps_around(self):
+        # With keys at both extremes, nearly any start must wrap around
+        self.experiments.update(random_key=0)
+        Experiment.objects.filter(pk='40000_A01').update(random_key=0.9999)
+
+        sample = Experiment.get_random_sample(
+            self.experiments.filter(well='A01'), 4)
+        self.assertEqual(len(sample), 4)
+
+
+class ScoringQueueTestCase(ScoresTestCase):
+    def setUp(self):
+        super(ScoringQueueTestCase, self).setUp()
+        self.experiments = Experiment.objects.filter(
+            worm_strain=self.sup_worm)
+        self.queue = ScoringQueue.objects.create(
+            user=self.scorers[0], key=ScoringQueue.get_key({'a': 'b'}))
+
+    def test_get_key(self):
+        self.assertEqual(ScoringQueue.get_key({'a': 'b', 'c': 1}),
+                         ScoringQueue.get_key({'c': '1', 'a': 'b'}))
+        self.assertNotEqual(ScoringQueue.get_key({'a': 'b'}),
+                            ScoringQueue.get_key({'a': 'c'}))
+
+    def test_get_key_multiple_values(self):
+        self.assertEqual(ScoringQueue.get_key({'a': ['b', 'c']}),
+                         ScoringQueue.get_key({'a': ['c', 'b']}))
+        self.assertNotEqual(ScoringQueue.get_key({'a': ['b', 'c']}),
+                            ScoringQueue.get_key({'a': ['c']}))
+
+    def test_get_for_filters(self):
+        queue = ScoringQueue.get_for_filters(self.scorers[0], {'a': ['b']})
+        self.assertEqual(queue, self.queue)
+
+        other = ScoringQueue.get_for_filters(self.scorers[1], {'a': ['b']})
+        self.assertNotEqual(other, self.queue)
+
+    def test_old_queues_are_deleted(self):
+        self.queue.lease(self.experiments, 5)
+        old = timezone.now() - ScoringQueue.MAX_AGE - timedelta(seconds=1)
+        ScoringQueue.objects.filter(pk=self.queue.pk).update(created=old)
+
+        other_user = ScoringQueue.objects.create(
+            user=self.scorers[1], key=self.queue.key, created=old)
+
+        # Getting any queue deletes the user's old ones
+        ScoringQueue.get_for_filters(self.scorers[0], {'c': ['d']})
+        self.assertFalse(ScoringQueue.objects.filter(
+            pk=self.queue.pk).exists())
+        self.assertTrue(ScoringQueue.objects.filter(
+            pk=other_user.pk).exists())
+
+        # An old queue still in use is recreated
+        queue = ScoringQueue.get_for_filters(self.scorers[0], {'a': ['b']})
+        self.assertEqual(queue.key, self.queue.key)
+        self.assertEqual(queue.get_num_remaining(), 0)
+        self.assertEqual(len(queue.lease(self.experiments, 12)), 12)
+
+    def test_recent_queues_are_kept(self):
+        ScoringQueue.objects.filter(pk=self.queue.pk).update(
+            created=timezone.now() - ScoringQueue.MAX_AGE +
+            timedelta(minutes=1))
+        ScoringQueue.get_for_filters(self.scorers[0], {'c': ['d']})
+        self.assertTrue(ScoringQueue.objects.filter(
+            pk=self.queue.pk).exists())
+
+    def test_unmatched_experiments_are_dropped(self):
+        self.queue.lease(self.experiments, 1)
+        self.queue.scoringqueueitem_set.update(leased_until=None)
+
+        # E.g. marked junk after being queued
+        junk = list(self.experiments[:3])
+        Experiment.objects.filter(pk__in=[e.pk for e in junk]).update(
+            is_junk=True)
+
+        leased = self.queue.lease(self.experiments.filter(is_junk=False), 12)
+        self.assertEqual(len(leased), 9)
+        self.assertFalse(set(junk) & set(leased))
+        self.assertEqual(self.queue.get_num_remaining(), 9)
+
+    def test_leases_do_not_overlap(self):
+        first = self.queue.lease(self.experiments, 5)
+        second = self.queue.lease(self.experiments, 5)
+        third = self.queue.lease(self.experiments, 5)
+
+        self.assertEqual(len(first), 5)
+        self.assertEqual(len(second), 5)
+        self.assertEqual(len(third), 2)
+        self.assertEqual(len(set(first + second + third)), 12)
+        self.assertEqual(first, list(self.experiments[:5]))
+
+    def test_refills_in_chunks(self):
+        ScoringQueue.REFILL_SIZE = 4
+        try:
+            leased = self.queue.lease(self.experiments, 6,
+                                      randomize_order=True)
+        finally:
+            ScoringQueue.REFILL_SIZE = 500
+
+        self.assertEqual(len(leased), 6)
+        self.assertEqual(len(set(leased)), 6)
+        self.assertEqual(self.queue.num_unqueued, 4)
+        self.assertEqual(self.queue.get_num_remaining(), 12)
+
+    def test_expired_leases_are_reused(self):
+        leased = self.queue.lease(self.experiments, 12)
+        self.queue.scoringqueueitem_set.filter(
+            experiment__in=leased[:3]).update(
+            leased_until=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.queue.lease(self.experiments, 12),
+                         leased[:3])
+
+    def test_mark_done(self):
+        leased = self.queue.lease(self.experiments, 12)
+        ScoringQueue.mark_done(self.scorers[0], leased[:4])
+        self.assertEqual(self.queue.get_num_remaining(), 8)
+
+        # Done items are not leased again, even once leases expire
+        self.queue.scoringqueueitem_set.update(leased_until=None)
+        self.assertEqual(self.queue.lease(self.experiments, 12),
+                         leased[4:])
+
+
+class GetImageUrlTestCase(ScoresTestCase):
+    def setUp(self):
+        super(GetImageUrlTestCase, self).setUp()
+        self.experiment = Experiment.objects.get(pk='40000_A01')
+
+    def test_pyramid(self):
+        with self.settings(BASE_URL_PYRAMID='http://images/pyramid'):
+            for width, size in ((None, 1024), (10, 64), (64, 64),
+                                (100, 256), (5000, 1024)):
+                self.assertEqual(
+                    self.experiment.get_image_url('pyramid', width),
+                    'http://images/pyramid/{}/40000/Tile000001.jpg'
+                    .format(size))
+
+    def test_pyramid_not_enabled(self):
+        with self.settings(BASE_URL_PYRAMID=None,
+                           BASE_URL_THUMBNAIL='http://images/thumbnails'):
+            self.assertEqual(
+                self.experiment.get_image_url('pyramid', 100),
+                self.experiment.get_image_url('thumbnail'))
+
+
+class ControlExperimentTestCase(ScoresTestCase):
+    def setUp(self):
+        super(ControlExperimentTestCase, self).setUp()
+        n2 = WormStrain.get_n2()
+        date = datetime.date(2016, 1, 1)
+
+        # N2 plates at two other temperatures, the same day as replicate 1
+        for plate_id, temperature in ((60000, 20), (60001, 23)):
+            plate = ExperimentPlate.objects.create(
+                id=plate_id, screen_stage=2, temperature=temperature,
+                date=date)
+            for stock in self.stocks:
+                Experiment.objects.create(
+                    id='{}_{}'.format(plate_id, stock.well), plate=plate,
+                    well=stock.well, worm_strain=n2, library_stock=stock)
+
+        # Mutant + L4440, the same day as replicate 1
+        Experiment.objects.create(
+            id='40000_A04', plate_id=40000, well='A04',
+            worm_strain=self.sup_worm, library_stock=self.stocks[3])
+
+        self.num_indexed = ControlExperiment.rebuild()
+        self.experiment = Experiment.objects.select_related('plate').get(
+            pk='40000_A01')
+
+    def test_rebuild(self):
+        self.assertEqual(self.num_indexed, 9)
+        self.assertEqual(
+            ControlExperiment.objects.filter(is_l4440=True).count(), 3)
+        self.assertEqual(
+            ControlExperiment.objects.filter(is_n2=True).count(), 8)
+
+    def test_n2_control_filters(self):
+        with self.assertNumQueries(1):
+            filters = self.experiment.get_n2_control_filters()
+
+        self.assertEqual(filters['plate__temperature'], 23)
+        self.assertEqual(
+            list(Experiment.objects.filter(**filters)
+                 .values_list('pk', flat=True)),
+            ['60001_A01'])
+
+    def test_no_n2_controls(self):
+        experiment = Experiment.objects.get(pk='40001_A01')
+        self.assertIsNone(
+            experiment.get_n2_control_filters()['plate__temperature'])
+
+    def test_toggle_junk(self):
+        control = Experiment.objects.get(pk='60001_A01')
+        control.toggle_junk()
+        self.assertEqual(
+            self.experiment.get_n2_control_filters()['plate__temperature'],
+            20)
+
+        control.toggle_junk()
+        self.assertEqual(
+            self.experiment.get_n2_control_filters()['plate__temperature'],
+            23)
+
+    def test_set_junk(self):
+        plate = ExperimentPlate.objects.get(pk=60001)
+        plate.set_junk(True)
+        self.assertFalse(ControlExperiment.objects.filter(
+            experiment__plate=plate).exists())
+        self.assertEqual(
+            self.experiment.get_n2_control_filters()['plate__temperature'],
+            20)
+
+        plate.set_junk(False)
+        self.assertEqual(ControlExperiment.objects.filter(
+            experiment__plate=plate).count(), 4)
+
+    def test_set_worm_strain(self):
+        plate = ExperimentPlate.objects.get(pk=40000)
+        plate.set_worm_strain(WormStrain.get_n2())
+
+        self.assertEqual(
+            Experiment.objects.get(pk='40000_A01').worm_strain_id, 'N2')
+        self.assertTrue(ControlExperiment.objects.filter(
+            experiment='40000_A01', is_n2=True).exists())
+
+    def test_set_library_stocks(self):
+        Experiment.objects.filter(pk='60000_A01').update(
+            library_stock=self.stocks[3])
+
+        plate = ExperimentPlate.objects.get(pk=60000)
+        plate.set_library_stocks(self.stocks[0].plate)
+
+        self.assertEqual(
+            Experiment.objects.get(pk='60000_A01').library_stock_id,
+            self.stocks[0].pk)
+        self.assertEqual(
+            ControlExperiment.objects.get(
+                experiment='60000_A01').library_stock_id,
+            self.stocks[0].pk)
+
+    def test_saved_experiment_indexed(self):
+        plate = ExperimentPlate.objects.create(
+            id=60002, screen_stage=2, temperature=25,
+            date=datetime.date(2016, 1, 1))
+        control = Experiment.objects.create(
+            id='60002_A01', plate=plate, well='A01',
+            worm_strain=WormStrain.get_n2(), library_stock=self.stocks[0])
+
+        self.assertTrue(ControlExperiment.objects.filter(
+            experiment=control, is_n2=True).exists())
+
+        plate.date = datetime.date(2016, 1, 2)
+        plate.save()
+        self.assertEqual(ControlExperiment.objects.get(
+            experiment=control).date, datetime.date(2016, 1, 2))
+
+    def test_double_knockdown_controls(self):
+        request = RequestFactory().get('/')
+        content = double_knockdown(request, self.sup_worm.pk, 'sjj_a',
+                                   '22.5').content.decode('utf-8')
+
+        def shown(experiment_pk):
+            return reverse('experiment_well_url',
+                           args=[experiment_pk]) in content
+
+        # Mutant + L4440, and N2 at the closest temperature
+        for experiment_pk in ('40000_A04', '60001_A01', '60001_A04'):
+            self.assertTrue(shown(experiment_pk), experiment_pk)
+
+        for experiment_pk in ('60000_A01', '60000_A04'):
+            self.assertFalse(shown(experiment_pk), experiment_pk)
+
+
+class DevstarScoreTestCase(ScoresTestCase):
+    def setUp(self):
+        super(DevstarScoreTestCase, self).setUp()
+        self.experiments = list(Experiment.objects.all()[:4])
+
+    def test_clean(self):
+        score = DevstarScore(area_embryo=1410, count_adult=4, count_larva=20)
+        score.clean()
+
+        self.assertEqual(score.count_embryo, 20)
+        self.assertEqual(score.larva_per_adult, 5)
+        self.assertEqual(score.embryo_per_adult, 5)
+        self.assertEqual(score.survival, .5)
+        self.assertEqual(score.lethality, .5)
+
+    def test_clean_zero_brood(self):
+        score = DevstarScore(area_embryo=10, count_adult=0, count_larva=0,
+                             survival=.5, lethality=.5, larva_per_adult=1)
+        score.clean()
+
+        self.assertEqual(score.count_embryo, 0)
+        self.assertIsNone(score.larva_per_adult)
+        self.assertIsNone(score.survival)
+        self.assertIsNone(score.lethality)
+
+    def test_recompute_derived_fields(self):
+        raw = [(700, 1, 10), (0, 0, 0), (None, 2, 2), (140, 2, 8)]
+
+        for experiment, (area_embryo, count_adult, count_larva) in zip(
+                self.experiments, raw):
+            score = DevstarScore(
+                experiment=experiment, area_embryo=area_embryo,
+                count_adult=count_adult, count_larva=count_larva)
+            score.clean()
+            score.save()
+
+        # Make one score stale
+        DevstarScore.objects.filter(experiment=self.experiments[1]).update(
+            survival=.5)
+
+        self.assertEqual(
+            DevstarScore.recompute_derived_fields(batch_size=3), 1)
+        self.assertIsNone(DevstarScore.objects.get(
+            experiment=self.experiments[1]).survival)
+
+        DevstarScore.EMBRYO_AREA_DIVISOR = 35
+        try:
+            self.assertEqual(DevstarScore.recompute_derived_fields(), 2)
+        finally:
+            DevstarScore.EMBRYO_AREA_DIVISOR = 70
+
+        score = DevstarScore.objects.get(experiment=self.experiments[0])
+        self.assertEqual(score.count_embryo, 20)
+        self.assertEqual(score.embryo_per_adult, 20)
+        self.assertEqual(score.survival, 10 / 30.)
@@ -0,0 +1,168 @@
+from __future__ import division
+
+from experiments.helpers.categories import (
+    count_categories, get_average_weight, STRONG, MEDIUM, WEAK, NEGATIVE,
+    OTHER)
+from experiments.helpers.criteria import (
+    passes_sup_secondary_percent, passes_sup_secondary_count,
+    passes_sup_secondary_stringent, passes_enh_primary,
+    shows_any_suppression)
+from experiments.helpers.scores import (get_positives_by_worm,
+                                        get_positives_any_worm,
+                                        get_average_score_weight)
+from experiments.models import Experiment, ManualScore, ManualScoreSummary
+from experiments.tests.base import ScoresTestCase
+
+
+def _get_positives_per_object(worm, screen_type, criteria, **kwargs):
+    """Reference implementation, organizing full ManualScore objects."""
+    s = worm.get_organized_scores(screen_type, 2, most_relevant_only=True)
+    return set(stock for stock, experiments in s.iteritems()
+               if criteria(experiments.values(), **kwargs))
+
+
+class CategoriesTestCase(ScoresTestCase):
+    def test_categories_match_score_methods(self):
+        data = self.sup_worm.get_organized_scores('SUP', 2)
+        for stock, experiments in data.iteritems():
+            for scores in experiments.values():
+                counts = count_categories(scores)
+                self.assertEqual(sum(counts), len(scores))
+                for score in scores:
+                    category = score.get_relevance_per_replicate()
+                    self.assertTrue(counts[category])
+
+    def test_average_weight_matches_score_methods(self):
+        data = self.sup_worm.get_organized_scores('SUP', 2,
+                                                  most_relevant_only=True)
+        for stock, experiments in data.iteritems():
+            scores = experiments.values()
+            self.assertEqual(get_average_weight(count_categories(scores)),
+                             get_average_score_weight(scores))
+
+    def test_kernels(self):
+        counts = [0] * 5
+        self.assertFalse(shows_any_suppression.kernel(counts))
+        self.assertFalse(passes_sup_secondary_percent.kernel(counts))
+
+        counts[OTHER] = 4
+        counts[NEGATIVE] = 1
+        counts[WEAK] = 2
+        counts[MEDIUM] = 1
+        counts[STRONG] = 1
+        self.assertTrue(shows_any_suppression.kernel(counts))
+        self.assertTrue(passes_sup_secondary_count.kernel(counts))
+        self.assertFalse(passes_sup_secondary_stringent.kernel(counts))
+        self.assertEqual(get_average_weight(counts), 7 / 5)
+
+
+class GetPositivesTestCase(ScoresTestCase):
+    def test_sup_criteria_match_per_object(self):
+        for criteria in (passes_sup_secondary_percent,
+                         passes_sup_secondary_count,
+                         passes_sup_secondary_stringent,
+                         shows_any_suppression):
+            positives = get_positives_by_worm('SUP', 2, criteria)
+            self.assertEqual(
+                positives[self.sup_worm],
+                _get_positives_per_object(self.sup_worm, 'SUP', criteria))
+
+    def test_enh_criteria_match_per_object(self):
+        singles = set(self.stocks[2:3])
+        positives = get_positives_by_worm('ENH', 2, passes_enh_primary,
+                                          singles=singles)
+        self.assertEqual(
+            positives[self.enh_worm],
+            _get_positives_per_object(self.enh_worm, 'ENH',
+                                      passes_enh_primary, singles=singles))
+
+    def test_sup_positives(self):
+        positives = get_positives_by_worm('SUP', 2, shows_any_suppression)
+        self.assertEqual(positives[self.sup_worm], set(self.stocks[0:3]))
+
+        positives = get_positives_by_worm('SUP', 2,
+                                          passes_sup_secondary_count)
+        self.assertEqual(positives[self.sup_worm], set(self.stocks[0:1]))
+
+    def test_get_positives_for_single_worm(self):
+        positives = self.sup_worm.get_positives(
+            'SUP', 2, passes_sup_secondary_count)
+        self.assertEqual(positives, set(self.stocks[0:1]))
+
+    def test_get_positives_any_worm(self):
+        positives = get_positives_any_worm('SUP', 2, shows_any_suppression)
+        self.assertEqual(positives, set(self.stocks[0:3]))
+
+        positives = get_positives_any_worm('ENH', 2, passes_enh_primary)
+        self.assertEqual(positives, set(self.stocks[1:3]))
+
+        singles = set(self.stocks[0:1])
+        positives = get_positives_any_worm('ENH', 2, passes_enh_primary,
+                                           singles=singles)
+        self.assertEqual(positives, set(self.stocks[0:3]))
+
+
+class ManualScoreSummaryTestCase(ScoresTestCase):
+    def test_rebuild_matches_most_relevant_scores(self):
+        ManualScoreSummary.rebuild(batch_size=2)
+
+        for experiment in Experiment.objects.all():
+            summary = experiment.manualscoresummary
+            scores = list(experiment.get_manual_scores())
+            most_relevant = max(scores,
+                                key=lambda x: x.get_relevance_per_replicate())
+            self.assertEqual(summary.category,
+                             most_relevant.get_relevance_per_replicate())
+            self.assertEqual(summary.num_scorers,
+                             len(set(x.scorer_id for x in scores)))
+
+    def test_deleting_winning_score(self):
+        ManualScoreSummary.rebuild()
+        summary = ManualScoreSummary.objects.filter(num_scorers=2).first()
+        experiment = summary.experiment
+
+        # Cascades to the summary, which is rebuilt from the other score
+        summary.score.delete()
+
+        summary = ManualScoreSummary.objects.get(experiment=experiment)
+        remaining = experiment.manualscore_set.get()
+        self.assertEqual(summary.score, remaining)
+        self.assertEqual(summary.num_scorers, 1)
+
+    def test_saving_score(self):
+        ManualScoreSummary.rebuild()
+        summary = ManualScoreSummary.objects.filter(num_scorers=1).first()
+        other_scorer = [scorer for scorer in self.scorers
+                        if scorer != summary.score.scorer][0]
+
+        ManualScore.objects.create(experiment=summary.experiment,
+                                   score_code_id=summary.score_code_id,
+                                   scorer=other_scorer)
+
+        summary = ManualScoreSummary.objects.get(pk=summary.pk)
+        self.assertEqual(summary.num_scorers, 2)
+
+    def test_organized_scores_from_summaries(self):
+        ManualScoreSummary.rebuild()
+        for worm, screen_type in ((self.sup_worm, 'SUP'),
+                                  (self.enh_worm, 'ENH')):
+            from_summaries = worm.get_organized_scores(
+                screen_type, 2, most_relevant_only=True, use_summaries=True)
+            from_scores = worm.get_organized_scores(
+                screen_type, 2, most_relevant_only=True)
+
+            for stock, experiments in from_scores.iteritems():
+                for experiment, score in experiments.iteritems():
+                    self.assertEqual(
+                        from_summaries[stock][experiment].get_category(),
+                        score.get_category())
+
+    def test_positives_from_summaries(self):
+        ManualScoreSummary.rebuild()
+        for criteria in (passes_sup_secondary_percent,
+                         passes_sup_secondary_count,
+                         shows_any_suppression):
+            self.assertEqual(
+                get_positives_by_worm('SUP', 2, criteria,
+                                      use_summaries=True),
+                get_positives_by_worm('SUP', 2, criteria))
@@ -0,0 +1,152 @@
+import pickle
+
+from django.core.cache import caches
+from django.core.urlresolvers import reverse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from experiments.helpers.secondary_scores import (
+    CACHE_NAME, get_cached_secondary_scores, set_cached_secondary_scores,
+    invalidate_secondary_scores)
+from experiments.models import Experiment, ExperimentPlate, ManualScore
+from experiments.tests.base import ScoresTestCase
+from experiments.views.views_secondary_scores import (
+    _get_display_data, _get_secondary_scores, secondary_scores)
+
+
+# Not the shared file-based cache, which the web server may be using
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    CACHE_NAME: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test_secondary_scores',
+    },
+})
+class SecondaryScoresCacheTestCase(ScoresTestCase):
+    def setUp(self):
+        super(SecondaryScoresCacheTestCase, self).setUp()
+        caches[CACHE_NAME].clear()
+        self.worm_pk = self.sup_worm.pk
+
+    def test_set_and_get(self):
+        self.assertIsNone(
+            get_cached_secondary_scores(self.worm_pk, '22.5', 'ids=1'))
+
+        set_cached_secondary_scores(self.worm_pk, '22.5', 'ids=1', {'a': 1})
+        self.assertEqual(
+            get_cached_secondary_scores(self.worm_pk, '22.5', 'ids=1'),
+            {'a': 1})
+
+        # Temperature is normalized; other scorer sets are separate
+        self.assertEqual(
+            get_cached_secondary_scores(self.worm_pk, 22.50, 'ids=1'),
+            {'a': 1})
+        self.assertIsNone(
+            get_cached_secondary_scores(self.worm_pk, '22.5', 'ids=2'))
+
+    def test_invalidate(self):
+        set_cached_secondary_scores(self.worm_pk, '22.5', 'ids=1', {'a': 1})
+        set_cached_secondary_scores(self.worm_pk, '15', 'ids=1', {'b': 2})
+        invalidate_secondary_scores(self.worm_pk, '22.5')
+
+        self.assertIsNone(
+            get_cached_secondary_scores(self.worm_pk, '22.5', 'ids=1'))
+        self.assertEqual(
+            get_cached_secondary_scores(self.worm_pk, '15', 'ids=1'),
+            {'b': 2})
+
+    def test_saving_score_invalidates(self):
+        set_cached_secondary_scores(self.worm_pk, '22.5', 'ids=1', {'a': 1})
+
+        experiment = Experiment.objects.filter(
+            worm_strain=self.sup_worm).first()
+        ManualScore.save_new_scores([ManualScore(
+            experiment=experiment, score_code_id=3, scorer=self.scorers[0])])
+
+        self.assertIsNone(
+            get_cached_secondary_scores(self.worm_pk, '22.5', 'ids=1'))
+
+    def test_toggling_junk_invalidates(self):
+        set_cached_secondary_scores(self.worm_pk, '22.5', 'ids=1', {'a': 1})
+
+        experiment = Experiment.objects.filter(
+            worm_strain=self.sup_worm).first()
+        experiment.toggle_junk()
+
+        self.assertIsNone(
+            get_cached_secondary_scores(self.worm_pk, '22.5', 'ids=1'))
+
+    def test_setting_plate_worm_invalidates_both_worms(self):
+        enh_worm_pk = self.enh_worm.pk
+        set_cached_secondary_scores(self.worm_pk, '22.5', 'ids=1', {'a': 1})
+        set_cached_secondary_scores(enh_worm_pk, '22.5', 'ids=1', {'b': 2})
+
+        ExperimentPlate.objects.get(pk=40000).set_worm_strain(self.enh_worm)
+
+        self.assertIsNone(
+            get_cached_secondary_scores(self.worm_pk, '22.5', 'ids=1'))
+        self.assertIsNone(
+            get_cached_secondary_scores(enh_worm_pk, '22.5', 'ids=1'))
+
+    def test_deleting_score_invalidates(self):
+        set_cached_secondary_scores(self.worm_pk, '22.5', 'ids=1', {'a': 1})
+
+        ManualScore.objects.filter(
+            experiment__worm_strain=self.sup_worm).first().delete()
+
+        self.assertIsNone(
+            get_cached_secondary_scores(self.worm_pk, '22.5', 'ids=1'))
+
+    def test_other_worm_not_invalidated(self):
+        set_cached_secondary_scores(self.worm_pk, '22.5', 'ids=1', {'a': 1})
+
+        ManualScore.objects.filter(
+            experiment__worm_strain=self.enh_worm).first().delete()
+
+        self.assertEqual(
+            get_cached_secondary_scores(self.worm_pk, '22.5', 'ids=1'),
+            {'a': 1})
+
+    def test_results_are_plain_values(self):
+        results = _get_secondary_scores(self.sup_worm, 'SUP', {})
+        self.assertEqual(len(results['rows']), 3)
+
+        row = results['rows'][0]
+        self.assertEqual(
+            sorted(row),
+            ['avg', 'experiments', 'passes_count', 'passes_percent',
+             'passes_stringent', 'stock'])
+        self.assertIsInstance(row['stock'], basestring)
+        for experiment_pk, category in row['experiments']:
+            self.assertIsInstance(experiment_pk, basestring)
+            self.assertIsInstance(category, basestring)
+
+        # No model instances to pickle
+        self.assertNotIn('django', pickle.dumps(results))
+
+    def test_display_data(self):
+        rows = _get_secondary_scores(self.sup_worm, 'SUP', {})['rows']
+        data = _get_display_data(pickle.loads(pickle.dumps(rows)))
+
+        self.assertEqual([stock.pk for stock in data],
+                         [row['stock'] for row in rows])
+
+        stock, experiments = data.items()[0]
+        self.assertEqual(stock.avg, rows[0]['avg'])
+        self.assertEqual(stock.passes_count, rows[0]['passes_count'])
+        self.assertEqual(experiments, rows[0]['experiments'])
+
+    def test_page_from_cache(self):
+        # Called directly, to skip the lockdown middleware
+        request = RequestFactory().get('/')
+        response = secondary_scores(request, self.worm_pk, '22.5',
+                                    username='noah')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(reverse('experiment_well_url', args=['40000_A01']),
+                      response.content)
+
+        cached = secondary_scores(request, self.worm_pk, '22.5',
+                                  username='noah')
+        self.assertEqual(cached.content, response.content)
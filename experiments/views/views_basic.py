@@ -7,19 +7,26 @@ from django.http import HttpResponseRedirect
 from django.shortcuts import redirect, render, get_object_or_404
 
 from experiments.helpers.data_entry import parse_batch_data_entry_gdoc
-from experiments.models import Experiment, ExperimentPlate
+from experiments.helpers.image_availability import is_image_available
+from experiments.models import (Experiment, ExperimentPlate, ManualScore,
+                                ManualScoreCode, ScoringQueue)
 from experiments.forms import (
     FilterExperimentWellsForm, FilterExperimentPlatesForm,
     FilterExperimentWellsToScoreForm, get_score_form,
     AddExperimentPlateForm, ChangeExperimentPlatesForm,
     process_ChangeExperimentPlatesForm_data,
 )
-from utils.http import http_response_ok, build_url
+from utils.http import build_url
 from utils.pagination import get_paginated
 
 EXPERIMENT_PLATES_PER_PAGE = 30
 EXPERIMENT_WELLS_PER_PAGE = 30
 
+# Widths, in pixels, at which plate pages show each well's image (used
+# to pick the image size in mode 'pyramid')
+PLATE_IMAGE_WIDTH = 100
+VERTICAL_IMAGE_WIDTH = 320
+
 
 def experiment_well(request, pk):
     """Render the page to see a particular experiment well."""
@@ -30,12 +37,9 @@ def experiment_well(request, pk):
         experiment.toggle_junk()
         return redirect('experiment_well_url', experiment.pk)
 
-    devstar_url = experiment.get_image_url(mode='devstar')
-    devstar_available = http_response_ok(devstar_url)
-
     context = {
         'experiment': experiment,
-        'devstar_available': devstar_available,
+        'devstar_available': is_image_available(experiment, 'devstar'),
 
         # Default to full-size images
         'mode': request.GET.get('mode', 'big')
@@ -54,6 +58,7 @@ def experiment_plate(request, pk):
 
         # Default to thumbnail images
         'mode': request.GET.get('mode', 'thumbnail'),
+        'image_width': PLATE_IMAGE_WIDTH,
     }
 
     return render(request, 'experiment_plate.html', context)
@@ -72,7 +77,8 @@ def vertical_experiment_plates(request, pks):
         'experiment_plates': plates,
 
         # Default to thumbnail
-        'mode': request.GET.get('mode', 'thumbnail')
+        'mode': request.GET.get('mode', 'thumbnail'),
+        'image_width': VERTICAL_IMAGE_WIDTH,
     }
 
     return render(request, 'vertical_experiment_plates.html', context)
@@ -107,6 +113,7 @@ def find_experiment_wells(request):
     """Render the page to find experiment wells based on filters."""
     experiments = None
     display_experiments = None
+    num_experiments = None
 
     if request.GET:
         form = FilterExperimentWellsForm(request.GET)
@@ -115,6 +122,7 @@ def find_experiment_wells(request):
             experiments = form.process()
             display_experiments = get_paginated(request, experiments,
                                                 EXPERIMENT_WELLS_PER_PAGE)
+            num_experiments = display_experiments.paginator.count
     else:
         form = FilterExperimentWellsForm()
 
@@ -122,6 +130,7 @@ def find_experiment_wells(request):
         'form': form,
         'experiments': experiments,
         'display_experiments': display_experiments,
+        'num_experiments': num_experiments,
     }
 
     return render(request, 'find_experiment_wells.html', context)
@@ -245,11 +254,17 @@ def score_experiment_wells(request):
 
         pks = [k.split('-')[0] for k in request.POST if pattern.match(k)]
 
+        # Preload score codes, so the forms need not query for them
+        score_codes = ManualScoreCode.get_codes_by_pk()
+
         # Check if all POSTs are valid
-        for experiment in Experiment.objects.filter(pk__in=pks):
+        experiments = (Experiment.objects.filter(pk__in=pks)
+                       .select_related('plate'))
+        for experiment in experiments:
             f = get_score_form(request.GET.get('score_form_key'))
-            experiment.score_form = f(request.POST, user=request.user,
-                                      prefix=experiment.pk)
+            experiment.score_form = f(
+                request.POST, user=request.user, prefix=experiment.pk,
+                experiment=experiment, score_codes=score_codes)
 
             post_experiments.append(experiment)
 
@@ -258,9 +273,14 @@ def score_experiment_wells(request):
 
         # If all POSTs valid, process and redirect
         if not redo_post:
+            scores = []
             for experiment in post_experiments:
-                # This actually submits the scores to the database
-                experiment.score_form.process()
+                scores.extend(experiment.score_form.get_scores())
+
+            # This actually submits the scores to the database
+            ManualScore.save_new_scores(scores)
+
+            ScoringQueue.mark_done(request.user, post_experiments)
 
             url = build_url('score_experiment_wells_url', get=request.GET)
             return HttpResponseRedirect(url)
@@ -282,6 +302,12 @@ def score_experiment_wells(request):
     experiments = filter_data['experiments']
     unscored_by_user = filter_data['unscored_by_user']
 
+    if unscored_by_user:
+        # Serve experiments from a persistent queue for these filters,
+        # rather than re-running the filters on every page
+        filters = {k: v for k, v in request.GET.lists() if k != 'page'}
+        queue = ScoringQueue.get_for_filters(request.user, filters)
+
     if redo_post:
         # These already have attached and bound score forms
         display_experiments = post_experiments
@@ -290,7 +316,9 @@ def score_experiment_wells(request):
         per_page = filter_data['images_per_page']
 
         if unscored_by_user:
-            display_experiments = experiments[:per_page]
+            display_experiments = queue.lease(
+                experiments, per_page,
+                randomize_order=filter_data['randomize_order'])
         else:
             display_experiments = get_paginated(request, experiments, per_page)
 
@@ -299,9 +327,15 @@ def score_experiment_wells(request):
         for experiment in display_experiments:
             experiment.score_form = score_form(prefix=experiment.pk)
 
+    if unscored_by_user:
+        num_experiments = queue.get_num_remaining()
+    else:
+        num_experiments = experiments.count()
+
     context = {
         'experiments': experiments,
         'display_experiments': display_experiments,
+        'num_experiments': num_experiments,
         'unscored_by_user': filter_data['unscored_by_user'],
         'do_not_display': ['images_per_page', 'score_form_key', 'is_junk']
     }
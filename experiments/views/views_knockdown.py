@@ -1,14 +1,16 @@
 from collections import OrderedDict
 from copy import copy
 
+from django.db.models import Prefetch
 from django.shortcuts import redirect, render, get_object_or_404
 
 from clones.models import Clone
 from experiments.forms import (
     DoubleKnockdownForm, MutantKnockdownForm, RNAiKnockdownForm)
-from experiments.models import Experiment
+from experiments.models import Experiment, ManualScore
 from library.models import LibraryStock
 from worms.models import WormStrain
+from utils.comparison import get_closest_candidate
 from utils.http import build_url
 
 
@@ -149,23 +151,59 @@ def double_knockdown(request, mutant, clones, temperature):
     mutant = get_object_or_404(WormStrain, pk=mutant)
     clones = Clone.objects.filter(pk__in=clones.split(','))
 
+    library_stocks = list(
+        LibraryStock.objects.filter(intended_clone__in=clones)
+        .select_related('plate')
+        .order_by('-plate__screen_stage', 'id'))
+    stock_pks = [library_stock.pk for library_stock in library_stocks]
+
+    # Fetch each of the four kinds of experiments in bulk, rather than
+    # per library stock and date, and organize them in memory. The
+    # controls are found with the ControlExperiment index
+    mutant_rnai = _group_experiments(
+        _get_knockdown_experiments(join_manual=True).filter(
+            worm_strain=mutant, library_stock__in=stock_pks,
+            plate__temperature=temperature),
+        key=lambda x: (x.library_stock_id, x.plate.date))
+
+    dates = set(date for stock_pk, date in mutant_rnai)
+
+    mutant_l4440 = _group_experiments(
+        _get_knockdown_experiments().filter(
+            controlexperiment__is_l4440=True,
+            controlexperiment__worm_strain=mutant,
+            controlexperiment__temperature=temperature,
+            controlexperiment__date__in=dates),
+        key=lambda x: x.plate.date)
+
+    n2_rnai = _group_experiments(
+        _get_knockdown_experiments().filter(
+            controlexperiment__is_n2=True,
+            controlexperiment__library_stock__in=stock_pks,
+            controlexperiment__date__in=dates),
+        key=lambda x: (x.library_stock_id, x.plate.date))
+
+    n2_l4440 = _group_experiments(
+        _get_knockdown_experiments().filter(
+            controlexperiment__is_n2=True,
+            controlexperiment__is_l4440=True,
+            controlexperiment__date__in=dates),
+        key=lambda x: x.plate.date)
+
     for clone in clones:
         data_per_clone = OrderedDict()
 
-        library_stocks = (LibraryStock.objects.filter(intended_clone=clone)
-                          .order_by('-plate__screen_stage', 'id'))
-
         for library_stock in library_stocks:
+            if library_stock.intended_clone_id != clone.pk:
+                continue
+
             data_per_well = OrderedDict()
 
-            dates = Experiment.get_distinct_dates({
-                'is_junk': False,
-                'worm_strain': mutant,
-                'library_stock': library_stock,
-                'plate__temperature': temperature,
-            })
+            stock_dates = sorted(
+                (date for stock_pk, date in mutant_rnai
+                 if stock_pk == library_stock.pk), reverse=True)
 
-            for date in dates:
+            for date in stock_dates:
                 # Add double knockdowns
                 filters = {
                     'is_junk': False,
@@ -174,8 +212,8 @@ def double_knockdown(request, mutant, clones, temperature):
                     'library_stock': library_stock,
                     'plate__temperature': temperature,
                 }
-                mutant_rnai = _create_inner_dictionary(
-                    filters, join_manual=True)
+                mutant_rnai_dict = _create_inner_dictionary(
+                    filters, mutant_rnai[(library_stock.pk, date)])
 
                 # Add mutant + L4440 controls
                 filters = {
@@ -185,39 +223,40 @@ def double_knockdown(request, mutant, clones, temperature):
                     'library_stock__intended_clone': l4440,
                     'plate__temperature': temperature,
                 }
-                mutant_l4440 = _create_inner_dictionary(filters)
+                mutant_l4440_dict = _create_inner_dictionary(
+                    filters, mutant_l4440.get(date, []))
 
-                # Add N2 + RNAi controls
+                # Add N2 + RNAi controls, at the closest temperature
                 filters = {
                     'is_junk': False,
                     'plate__date': date,
                     'worm_strain': n2.pk,
                     'library_stock': library_stock,
                 }
-
-                t = Experiment.get_closest_temperature(temperature, filters)
+                t, experiments = _limit_to_closest_temperature(
+                    n2_rnai.get((library_stock.pk, date), []), temperature)
                 filters['plate__temperature'] = t
 
-                n2_rnai = _create_inner_dictionary(filters)
+                n2_rnai_dict = _create_inner_dictionary(filters, experiments)
 
-                # Add N2 + L4440 controls
+                # Add N2 + L4440 controls, at the closest temperature
                 filters = {
                     'is_junk': False,
                     'plate__date': date,
                     'worm_strain': n2.pk,
                     'library_stock__intended_clone': l4440,
                 }
-
-                t = Experiment.get_closest_temperature(temperature, filters)
+                t, experiments = _limit_to_closest_temperature(
+                    n2_l4440.get(date, []), temperature)
                 filters['plate__temperature'] = t
 
-                n2_l4440 = _create_inner_dictionary(filters)
+                n2_l4440_dict = _create_inner_dictionary(filters, experiments)
 
                 data_per_well[date] = {
-                    'mutant_rnai': mutant_rnai,
-                    'mutant_l4440': mutant_l4440,
-                    'n2_rnai': n2_rnai,
-                    'n2_l4440': n2_l4440,
+                    'mutant_rnai': mutant_rnai_dict,
+                    'mutant_l4440': mutant_l4440_dict,
+                    'n2_rnai': n2_rnai_dict,
+                    'n2_l4440': n2_l4440_dict,
                 }
 
             if data_per_well:
@@ -235,14 +274,53 @@ def double_knockdown(request, mutant, clones, temperature):
     return render(request, 'double_knockdown.html', context)
 
 
-def _create_inner_dictionary(filters, join_devstar=True, join_manual=False):
-    experiments = Experiment.objects.filter(**filters).select_related('plate')
-    if join_devstar:
-        experiments = experiments.prefetch_related('devstarscore_set')
+def _get_knockdown_experiments(join_manual=False):
+    """
+    Get the base QuerySet for the experiments shown in knockdown pages.
+
+    Joins the plate and DevStaR scores, and optionally the manual scores
+    (along with their scorers and score codes).
+    """
+    experiments = (Experiment.objects.filter(is_junk=False)
+                   .select_related('plate')
+                   .prefetch_related('devstarscore_set'))
 
     if join_manual:
-        experiments = experiments.prefetch_related('manualscore_set')
+        experiments = experiments.prefetch_related(Prefetch(
+            'manualscore_set',
+            queryset=ManualScore.objects.select_related('scorer',
+                                                        'score_code')))
+
+    return experiments
+
+
+def _group_experiments(experiments, key):
+    """
+    Group experiments into a dictionary of lists according to key.
+
+    key should be a function of an experiment. Order within each list is
+    preserved.
+    """
+    d = {}
+    for experiment in experiments:
+        d.setdefault(key(experiment), []).append(experiment)
+    return d
+
+
+def _limit_to_closest_temperature(experiments, goal):
+    """
+    Limit experiments to those at the temperature closest to goal.
+
+    Returns a 2-tuple of the closest temperature (None if experiments is
+    empty) and the limited list of experiments.
+    """
+    temperatures = sorted(set(x.plate.temperature for x in experiments))
+    closest = get_closest_candidate(goal, temperatures)
+    return (closest,
+            [x for x in experiments if x.plate.temperature == closest])
+
 
+def _create_inner_dictionary(filters, experiments):
     d = {}
     d['experiments'] = experiments
     d['link_to_all'] = build_url('find_experiment_wells_url', get=filters)
@@ -12,8 +12,13 @@ from experiments.helpers.criteria import (
     passes_sup_secondary_count,
     passes_sup_secondary_stringent)
 
-from experiments.helpers.scores import get_average_score_weight
+from experiments.helpers.categories import (
+    count_categories, get_average_weight)
 
+from experiments.helpers.secondary_scores import (
+    get_cached_secondary_scores, set_cached_secondary_scores)
+
+from library.models import LibraryStock
 from worms.models import WormStrain
 
 NOAH_ID = 14
@@ -39,60 +44,117 @@ def secondary_scores(request, worm, temperature, username=None):
 
     if username:
         user = get_object_or_404(get_user_model(), username=username)
-        data = worm.get_organized_scores(screen_type, screen_stage=2,
-                                         most_relevant_only=True,
-                                         scorer=user)
+        scorers = 'username=' + username
+        filters = {'scorer': user}
     else:
-        data = worm.get_organized_scores(screen_type, screen_stage=2,
-                                         most_relevant_only=True,
-                                         scorer_id__in=IDS)
+        scorers = 'ids=' + ','.join(str(x) for x in IDS)
+        filters = {'scorer_id__in': IDS}
+
+    results = get_cached_secondary_scores(worm.pk, temperature, scorers)
+    if results is None:
+        results = _get_secondary_scores(worm, screen_type, filters)
+        set_cached_secondary_scores(worm.pk, temperature, scorers, results)
+
+    context = {
+        'worm': worm,
+        'screen_type': screen_type,
+        'temperature': temperature,
+        'data': _get_display_data(results['rows']),
+    }
+    context.update((key, value) for key, value in results.iteritems()
+                   if key != 'rows')
+
+    return render(request, 'secondary_scores.html', context)
+
+
+def _get_secondary_scores(worm, screen_type, filters):
+    """
+    Compute the secondary scores results for a worm / screen_type.
+
+    filters limits the scores considered (e.g. to certain scorers).
+
+    Returns a dictionary of the counts to be added to the
+    secondary_scores context, plus 'rows', a list of per-stock
+    dictionaries (strongest positives first) for _get_display_data.
+    Since this is cached, it holds only plain values (pks, flags,
+    numbers, and categories), rather than model instances.
+    """
+    data = worm.get_organized_scores(screen_type, screen_stage=2,
+                                     most_relevant_only=True, **filters)
 
     num_passes_stringent = 0
     num_passes_percent = 0
     num_passes_count = 0
     num_experiment_columns = 0
 
-    for stock, expts in data.iteritems():
-        scores = expts.values()
-        stock.avg = get_average_score_weight(scores)
-
-        stock.passes_stringent = passes_sup_secondary_stringent(scores)
-        stock.passes_percent = passes_sup_secondary_percent(
-            scores)
-        stock.passes_count = passes_sup_secondary_count(scores)
+    rows = []
 
-        if stock.passes_stringent:
+    for stock, expts in data.iteritems():
+        # Count categories once, and apply each criteria's kernel to that
+        counts = count_categories(expts.values())
+
+        row = {
+            'stock': stock.pk,
+            'avg': get_average_weight(counts),
+            'passes_stringent': passes_sup_secondary_stringent.kernel(
+                counts),
+            'passes_percent': passes_sup_secondary_percent.kernel(counts),
+            'passes_count': passes_sup_secondary_count.kernel(counts),
+            'experiments': [(experiment.pk, score.get_category())
+                            for experiment, score in expts.iteritems()],
+        }
+        rows.append(row)
+
+        if row['passes_stringent']:
             num_passes_stringent += 1
 
-        if stock.passes_percent:
+        if row['passes_percent']:
             num_passes_percent += 1
 
-        if stock.passes_count:
+        if row['passes_count']:
             num_passes_count += 1
 
         if len(expts) > num_experiment_columns:
             num_experiment_columns = len(expts)
 
-    data = OrderedDict(sorted(
-        data.iteritems(),
-        key=lambda x: (x[0].passes_stringent,
-                       x[0].passes_percent,
-                       x[0].passes_count,
-                       x[0].avg),
-        reverse=True))
+    rows.sort(key=lambda x: (x['passes_stringent'],
+                             x['passes_percent'],
+                             x['passes_count'],
+                             x['avg']),
+              reverse=True)
 
-    context = {
-        'worm': worm,
-        'screen_type': screen_type,
-        'temperature': temperature,
-        'data': data,
+    return {
+        'rows': rows,
         'num_passes_percent': num_passes_percent,
         'num_passes_count': num_passes_count,
         'num_passes_stringent': num_passes_stringent,
         'num_experiment_columns': num_experiment_columns,
     }
 
-    return render(request, 'secondary_scores.html', context)
+
+def _get_display_data(rows):
+    """
+    Get the secondary_scores 'data' from the rows of cached results.
+
+    Returns an OrderedDict mapping each library stock (with the row's
+    values set as attributes) to its list of (experiment_pk, category)
+    tuples, in the order of rows.
+    """
+    stocks = (LibraryStock.objects
+              .select_related('plate', 'intended_clone')
+              .in_bulk([row['stock'] for row in rows]))
+
+    data = OrderedDict()
+
+    for row in rows:
+        stock = stocks[row['stock']]
+        stock.avg = row['avg']
+        stock.passes_stringent = row['passes_stringent']
+        stock.passes_percent = row['passes_percent']
+        stock.passes_count = row['passes_count']
+        data[stock] = row['experiments']
+
+    return data
 
 
 def find_secondary_scores(request):
@@ -1,5 +1,7 @@
 """Utility module with helpers for HTTP response querying."""
 
+import httplib
+import socket
 import urllib
 import urllib2
 from django.core.urlresolvers import reverse
@@ -16,6 +18,39 @@ def http_response_ok(url):
     return r.code == 200
 
 
+class HeadRequest(urllib2.Request):
+    """A urllib2 request with the HEAD method."""
+
+    def get_method(self):
+        return 'HEAD'
+
+
+def http_head_status(url, timeout=5):
+    """
+    Get the HTTP status that a url responds to HEAD with.
+
+    Unlike http_response_ok, does not download the response body, and
+    gives up after timeout seconds. Returns None if the url does not
+    respond in time, or cannot be reached at all.
+    """
+    try:
+        r = urllib2.urlopen(HeadRequest(url), timeout=timeout)
+
+    except urllib2.HTTPError as e:
+        return e.code
+
+    except (urllib2.URLError, httplib.HTTPException, socket.error):
+        return None
+
+    r.close()
+    return r.code
+
+
+def http_head_ok(url, timeout=5):
+    """Return True if a url responds to HEAD with "ok" HTTP status"""
+    return http_head_status(url, timeout=timeout) == 200
+
+
 def build_url(*args, **kwargs):
     get = kwargs.pop('get', {})
     url = reverse(*args, **kwargs)
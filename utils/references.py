@@ -0,0 +1,137 @@
+"""
+Utility module to cache well-known database rows per process.
+
+Some rows (e.g. the L4440 clone, the N2 worm strain, the manual score
+codes) are looked up constantly, but practically never change. Wrapping
+their getters with cached_reference keeps the results in memory for the
+life of the process, so that only the first call costs a query.
+
+A getter's cached results are cleared whenever an instance of one of its
+models is saved or deleted in this process (through the post_save and
+post_delete signals). Changes that bypass signals (e.g. QuerySet.update,
+or changes made by another process) are not noticed; call
+invalidate_references to clear them by hand.
+
+For getters called with many different arguments (e.g. looking up
+experiments by plate and well), pass maxsize to keep only that many of
+the most recently used results.
+
+Cached results are shared, so callers should not modify them.
+"""
+
+import functools
+from collections import OrderedDict
+
+from django.db.models.signals import post_delete, post_save
+
+_references = {}
+
+
+class _CachedReference(object):
+    """Cached results, plus hit and miss counters, for one getter."""
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        if maxsize:
+            self.values = OrderedDict()
+        else:
+            self.values = {}
+        self.hits = 0
+        self.misses = 0
+
+        # Labels ('app_label.Model') of the models whose changes
+        # invalidate the cached results
+        self.models = set()
+
+    def invalidate(self, **kwargs):
+        self.values.clear()
+
+
+def cached_reference(*models, **kwargs):
+    """
+    Decorate a getter to cache its results per process.
+
+    Results are cached per combination of arguments, which must therefore
+    be hashable. models should be the model classes (or 'app_label.Model'
+    strings) whose changes invalidate the cached results.
+
+    Optionally supply maxsize to keep only the maxsize most recently used
+    results. Exceptions raised by the getter are not cached.
+
+    To cache a classmethod, apply this decorator before classmethod, i.e.:
+
+        @classmethod
+        @cached_reference('clones.Clone')
+        def get_l4440(cls):
+            ...
+    """
+    maxsize = kwargs.pop('maxsize', None)
+    if kwargs:
+        raise TypeError('Unexpected keyword arguments: {}'
+                        .format(', '.join(kwargs)))
+
+    def decorator(getter):
+        name = '{}.{}'.format(getter.__module__, getter.__name__)
+        reference = _references.setdefault(name, _CachedReference(maxsize))
+
+        for model in models:
+            reference.models.add(_get_label(model))
+
+            for signal in (post_save, post_delete):
+                signal.connect(reference.invalidate, sender=model,
+                               weak=False, dispatch_uid=name)
+
+        @functools.wraps(getter)
+        def wrapper(*args):
+            values = reference.values
+
+            try:
+                value = values[args]
+            except KeyError:
+                reference.misses += 1
+                value = values[args] = getter(*args)
+                if reference.maxsize and len(values) > reference.maxsize:
+                    values.popitem(last=False)
+            else:
+                reference.hits += 1
+                if reference.maxsize:
+                    # Move to the most recently used end
+                    del values[args]
+                    values[args] = value
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate_references(*models):
+    """
+    Clear the cached results of cached_reference getters.
+
+    Optionally supply models (classes or 'app_label.Model' strings) to
+    clear only the getters invalidated by changes to those models
+    (defaults to all getters).
+    """
+    labels = set(_get_label(model) for model in models)
+
+    for reference in _references.values():
+        if not labels or labels & reference.models:
+            reference.invalidate()
+
+
+def get_reference_stats():
+    """
+    Get the hit and miss counts of all cached_reference getters.
+
+    Returns a dictionary mapping each getter's name to a (hits, misses)
+    tuple. Each hit is a query saved.
+    """
+    return {name: (reference.hits, reference.misses)
+            for name, reference in _references.items()}
+
+
+def _get_label(model):
+    if isinstance(model, basestring):
+        return model
+    return model._meta.label
@@ -1,25 +1,93 @@
 """Utility module with SQL database querying helpers."""
 
+from django.db import connections, router
+from django.db.models import Case, Value, When
 
-def get_field_dictionary(cursor, table, fieldnames):
+
+def get_field_dictionary(cursor, table, fieldnames, key_length=1):
     """
     Get a dictionary capturing fields of a table.
 
     Assumes fieldnames[0] is the primary key of table.
     The dictionary returned is keyed on this primary key.
 
+    Alternatively, set key_length to key the dictionary on the first
+    key_length fieldnames, as a tuple (e.g. for a table whose rows are
+    identified by several fields).
+
     The value of the dictionary returned is a nested dictionary.
-    This nested dictionary is keyed on fieldnames [1:],
+    This nested dictionary is keyed on the remaining fieldnames,
     the values being the corresponding values from the table.
     """
     fieldnames_as_string = ', '.join(fieldnames)
     query = 'SELECT {} FROM {}'.format(fieldnames_as_string, table)
     cursor.execute(query)
-    rows = cursor.fetchall()
+    return _get_row_dictionary(cursor.fetchall(), fieldnames, key_length)
+
+
+def get_queryset_field_dictionary(queryset, fieldnames, key_length=1):
+    """
+    Get a dictionary capturing fields of the rows of a queryset.
+
+    Like get_field_dictionary, but fieldnames are model field names
+    (foreign keys giving the related pk), and the values are converted
+    to Python as for model instances (e.g. dates, aware datetimes). So
+    the values can be compared to those of unsaved instances.
+    """
+    rows = queryset.values_list(*fieldnames).iterator()
+    return _get_row_dictionary(rows, fieldnames, key_length)
+
+
+def _get_row_dictionary(rows, fieldnames, key_length):
+    value_fieldnames = fieldnames[key_length:]
     d = {}
     for row in rows:
-        pk = row[0]
-        d[pk] = {}
-        for k, v in zip(fieldnames[1:], row[1:]):
-            d[pk][k] = v
+        if key_length == 1:
+            key = row[0]
+        else:
+            key = tuple(row[:key_length])
+        d[key] = dict(zip(value_fieldnames, row[key_length:]))
     return d
+
+
+def bulk_update(instances, fields, batch_size=1000):
+    """
+    Save fields of many model instances, in few queries.
+
+    This Django version has no bulk update, and saving instances one by
+    one takes a query each. This instead updates batch_size instances per
+    query, setting each field with a CASE expression on primary key.
+
+    instances must all be saved instances of the same model. Returns the
+    number of instances updated.
+    """
+    if not instances:
+        return 0
+
+    model = type(instances[0])
+    model_fields = [model._meta.get_field(name) for name in fields]
+
+    # Each instance takes one parameter per field, plus one for its pk
+    connection = connections[router.db_for_write(model)]
+    batch_size = min(batch_size, connection.ops.bulk_batch_size(
+        [None] * (2 * len(fields) + 1), instances))
+    batch_size = max(batch_size, 1)
+
+    num_updated = 0
+
+    for i in range(0, len(instances), batch_size):
+        batch = instances[i:i + batch_size]
+        updates = {}
+
+        for field in model_fields:
+            updates[field.attname] = Case(
+                *[When(pk=instance.pk,
+                       then=Value(getattr(instance, field.attname)))
+                  for instance in batch],
+                output_field=field)
+
+        num_updated += (model.objects
+                        .filter(pk__in=[instance.pk for instance in batch])
+                        .update(**updates))
+
+    return num_updated
@@ -0,0 +1,97 @@
+import errno
+import socket
+import sys
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Respond according to the path.
+
+    Paths starting with /ok respond 200 (with BODY, to GET), paths
+    starting with /slow respond 200 after a delay, and all other paths
+    respond 404. To GET, paths starting with /error respond 500, and
+    paths starting with /flaky respond 503 the first time, then like
+    /ok. Every request is recorded in the server's requests list.
+    """
+
+    DELAY = 1
+
+    BODY = 'BM stub image'
+
+    def do_HEAD(self):
+        self.server.requests.append((self.command, self.path))
+
+        if self.path.startswith('/slow'):
+            time.sleep(self.DELAY)
+
+        if self.path.startswith('/ok'):
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(self.BODY)))
+        elif self.path.startswith('/slow'):
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+
+        self.end_headers()
+
+    def do_GET(self):
+        self.server.requests.append((self.command, self.path))
+
+        if self.path.startswith('/flaky'):
+            num_gets = self.server.requests.count(('GET', self.path))
+            status = 503 if num_gets == 1 else 200
+        elif self.path.startswith('/error'):
+            status = 500
+        elif self.path.startswith('/ok'):
+            status = 200
+        else:
+            status = 404
+
+        body = self.BODY if status == 200 else ''
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubHTTPServer(HTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients testing timeouts disconnect before the response is
+        # written, which is expected rather than worth a traceback
+        error = sys.exc_info()[1]
+        if (isinstance(error, socket.error) and
+                error.errno in (errno.EPIPE, errno.ECONNRESET)):
+            return
+
+        HTTPServer.handle_error(self, request, client_address)
+
+
+class StubServer(object):
+    """Local HTTP server, run in a background thread, for tests."""
+
+    def __enter__(self):
+        self.server = StubHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def get_url(self, path):
+        return 'http://127.0.0.1:{}{}'.format(self.server.server_port, path)
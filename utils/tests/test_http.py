@@ -0,0 +1,31 @@
+from django.test import SimpleTestCase
+
+from utils.http import http_head_ok, http_head_status
+from utils.tests.stub_server import StubServer
+
+
+class HttpHeadTestCase(SimpleTestCase):
+    def setUp(self):
+        self.server = StubServer().__enter__()
+
+    def tearDown(self):
+        self.server.__exit__()
+
+    def test_ok(self):
+        url = self.server.get_url('/ok/1.bmp')
+        self.assertEqual(http_head_status(url), 200)
+        self.assertEqual(self.server.requests, [('HEAD', '/ok/1.bmp')])
+        self.assertTrue(http_head_ok(url))
+
+    def test_not_found(self):
+        url = self.server.get_url('/missing/1.bmp')
+        self.assertEqual(http_head_status(url), 404)
+        self.assertFalse(http_head_ok(url))
+
+    def test_timeout(self):
+        url = self.server.get_url('/slow/1.bmp')
+        self.assertIsNone(http_head_status(url, timeout=0.1))
+        self.assertFalse(http_head_ok(url, timeout=0.1))
+
+    def test_unreachable(self):
+        self.assertIsNone(http_head_status('http://127.0.0.1:1/ok'))
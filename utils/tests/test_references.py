@@ -0,0 +1,80 @@
+from django.test import TestCase
+
+from utils.references import (cached_reference, get_reference_stats,
+                              invalidate_references)
+from worms.models import WormStrain
+
+
+class CachedReferenceTestCase(TestCase):
+    def setUp(self):
+        invalidate_references()
+        self.n2 = WormStrain.objects.create(id='N2')
+        self.name = 'worms.models.get_n2'
+
+    def test_queries_once(self):
+        self.assertEqual(WormStrain.get_n2(), self.n2)
+        hits, misses = get_reference_stats()[self.name]
+
+        with self.assertNumQueries(0):
+            self.assertEqual(WormStrain.get_n2(), self.n2)
+            self.assertEqual(WormStrain.get_n2(), self.n2)
+
+        self.assertEqual(get_reference_stats()[self.name],
+                         (hits + 2, misses))
+
+    def test_save_invalidates(self):
+        WormStrain.get_n2()
+        self.n2.genotype = 'wild type'
+        self.n2.save()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(WormStrain.get_n2().genotype, 'wild type')
+
+    def test_delete_invalidates(self):
+        WormStrain.get_n2()
+        self.n2.delete()
+
+        with self.assertRaises(WormStrain.DoesNotExist):
+            WormStrain.get_n2()
+
+
+@cached_reference(WormStrain, maxsize=2)
+def get_worm_strain(pk):
+    return WormStrain.objects.get(pk=pk)
+
+
+class CachedReferenceMaxsizeTestCase(TestCase):
+    def setUp(self):
+        invalidate_references()
+        for pk in ('N2', 'EU552', 'EU1006'):
+            WormStrain.objects.create(id=pk)
+
+    def test_keeps_most_recently_used(self):
+        get_worm_strain('N2')
+        get_worm_strain('EU552')
+        get_worm_strain('N2')
+        get_worm_strain('EU1006')
+
+        with self.assertNumQueries(0):
+            get_worm_strain('N2')
+            get_worm_strain('EU1006')
+
+        with self.assertNumQueries(1):
+            get_worm_strain('EU552')
+
+    def test_does_not_cache_exceptions(self):
+        with self.assertNumQueries(2):
+            for i in range(2):
+                with self.assertRaises(WormStrain.DoesNotExist):
+                    get_worm_strain('missing')
+
+    def test_invalidate_by_model(self):
+        get_worm_strain('N2')
+
+        invalidate_references('clones.Clone')
+        with self.assertNumQueries(0):
+            get_worm_strain('N2')
+
+        invalidate_references(WormStrain)
+        with self.assertNumQueries(1):
+            get_worm_strain('N2')
@@ -0,0 +1,66 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from utils.sql import bulk_update, get_queryset_field_dictionary
+from worms.models import WormStrain
+
+
+class BulkUpdateTestCase(TestCase):
+    def setUp(self):
+        for i in range(10):
+            WormStrain.objects.create(id='W{}'.format(i), gene='g{}'.format(i),
+                                      permissive_temperature=15)
+
+    def test_updates_each_instance(self):
+        worms = list(WormStrain.objects.order_by('id'))
+        for i, worm in enumerate(worms):
+            worm.gene = 'new-{}'.format(i)
+            worm.permissive_temperature = None if i % 2 else 20 + i
+
+        with self.assertNumQueries(3):
+            self.assertEqual(bulk_update(
+                worms, ['gene', 'permissive_temperature'], batch_size=4), 10)
+
+        for i, worm in enumerate(WormStrain.objects.order_by('id')):
+            self.assertEqual(worm.gene, 'new-{}'.format(i))
+            self.assertEqual(worm.permissive_temperature,
+                             None if i % 2 else 20 + i)
+
+    def test_leaves_other_fields(self):
+        worms = list(WormStrain.objects.all())
+        for worm in worms:
+            worm.gene = 'changed'
+            worm.allele = 'not saved'
+
+        bulk_update(worms, ['gene'])
+
+        self.assertEqual(WormStrain.objects.filter(gene='changed').count(),
+                         10)
+        self.assertFalse(WormStrain.objects.filter(allele='not saved'))
+
+    def test_no_instances(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(bulk_update([], ['gene']), 0)
+
+
+class GetQuerysetFieldDictionaryTestCase(TestCase):
+    def setUp(self):
+        WormStrain.objects.create(id='N2', permissive_temperature=22.5)
+        WormStrain.objects.create(id='EU1006', gene='dnc-1', allele='or404')
+
+    def test_keyed_on_first_field(self):
+        self.assertEqual(
+            get_queryset_field_dictionary(
+                WormStrain.objects.all(),
+                ('id', 'gene', 'permissive_temperature')),
+            {'N2': {'gene': '', 'permissive_temperature': Decimal('22.5')},
+             'EU1006': {'gene': 'dnc-1', 'permissive_temperature': None}})
+
+    def test_key_length(self):
+        self.assertEqual(
+            get_queryset_field_dictionary(
+                WormStrain.objects.all(), ('gene', 'allele', 'id'),
+                key_length=2),
+            {('', ''): {'id': 'N2'},
+             ('dnc-1', 'or404'): {'id': 'EU1006'}})
@@ -128,14 +128,15 @@ def get_screen_type(worm, temperature):
 
 
 @register.simple_tag
-def get_image_url(experiment, mode=None):
+def get_image_url(experiment, mode=None, width=None):
     """
     Get the url for an experiment's image.
 
     Set mode to 'thumbnail' or 'devstar' for either of those image
-    types. Otherwise, returns the normal full-size image.
+    types, or to 'pyramid' for the smallest thumbnail at least width
+    pixels wide. Otherwise, returns the normal full-size image.
     """
-    return experiment.get_image_url(mode=mode)
+    return experiment.get_image_url(mode=mode, width=width)
 
 
 @register.filter
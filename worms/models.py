@@ -3,6 +3,7 @@ from decimal import Decimal
 from django.db import models
 
 from library.models import LibraryStock
+from utils.references import cached_reference
 
 
 class WormStrain(models.Model):
@@ -92,8 +93,23 @@ class WormStrain(models.Model):
         else:
             return None
 
+    def get_screen_temperature(self, screen_type):
+        """
+        Get this strain's screening temperature for screen_type.
+
+        Returns the permissive temperature for 'ENH', the restrictive
+        temperature for 'SUP', and None otherwise.
+        """
+        if screen_type == 'ENH':
+            return self.permissive_temperature
+        elif screen_type == 'SUP':
+            return self.restrictive_temperature
+        else:
+            return None
+
     def get_organized_scores(self, screen_type, screen_stage,
-                             most_relevant_only=False, **filters):
+                             most_relevant_only=False, use_summaries=False,
+                             **filters):
         """
         Get all scores for this worm in a particular screen.
 
@@ -105,9 +121,23 @@ class WormStrain(models.Model):
 
         Or, if most_relevant_only is set to True:
             data[library_stock][experiment] = most_relevant_score
+
+        Set use_summaries=True (along with most_relevant_only=True) to read
+        the most relevant scores from the ManualScoreSummary table,
+        rather than regrouping all scores. Since the summaries are across
+        all scorers, this cannot be combined with filters.
         """
         # Import here to avoid creating a circular dependency
         from experiments.models import ManualScore
+
+        if use_summaries:
+            if not most_relevant_only:
+                raise ValueError('use_summaries requires most_relevant_only')
+            if filters:
+                raise ValueError('use_summaries cannot be combined with '
+                                 'filters')
+            filters['manualscoresummary__isnull'] = False
+
         scores = ManualScore.objects.filter(
             experiment__worm_strain=self,
             experiment__is_junk=False,
@@ -146,17 +176,10 @@ class WormStrain(models.Model):
         The screen is defined by both screen_type ('ENH' or 'SUP')
         and screen_stage (1 for primary, 2 for secondary).
         """
-        s = self.get_organized_scores(screen_type, screen_stage,
-                                      most_relevant_only=True)
-
-        positives = set()
-
-        for library_stock, experiments in s.iteritems():
-            scores = experiments.values()
-            if criteria(scores, **kwargs):
-                positives.add(library_stock)
-
-        return positives
+        from experiments.helpers.scores import get_positives_by_worm
+        positives = get_positives_by_worm(screen_type, screen_stage, criteria,
+                                          worms=[self], **kwargs)
+        return positives[self]
 
     def get_experiments_by_screen(self, screen_type, screen_stage):
         """
@@ -202,8 +225,13 @@ class WormStrain(models.Model):
         return set(singles)
 
     @classmethod
+    @cached_reference('worms.WormStrain')
     def get_n2(cls):
-        """Get the N2 control worm strain."""
+        """
+        Get the N2 control worm strain.
+
+        The worm strain is cached per process (see utils.references).
+        """
         return cls.objects.get(pk='N2')
 
     @classmethod
@@ -273,3 +301,35 @@ class WormStrain(models.Model):
                 to_temperature[worm] = worm.restrictive_temperature
 
         return to_temperature
+
+    @classmethod
+    def get_screen_type_q(cls, screen_type, worms=None, prefix=''):
+        """
+        Get a Q object limiting experiments to a particular screen type.
+
+        The Q object matches experiments done at their worm's screen_type
+        temperature (see get_screen_temperature). Since N2 does not have
+        a SUP or ENH temperature, N2 is never matched.
+
+        Optionally supply worms to limit the Q object to those worm
+        strains (defaults to all worms in screen_type).
+
+        Optionally supply prefix to apply the Q object to a model related
+        to Experiment, e.g. prefix='experiment__' for ManualScore.
+        """
+        if worms is None:
+            worms = cls.get_worms_for_screen_type(screen_type)
+
+        q = models.Q(**{prefix + 'pk__in': []})
+
+        for worm in worms:
+            temperature = worm.get_screen_temperature(screen_type)
+            if temperature is None:
+                continue
+
+            q |= models.Q(**{
+                prefix + 'worm_strain': worm.pk,
+                prefix + 'plate__temperature': temperature,
+            })
+
+        return q